@@ -0,0 +1,20 @@
+"""
+API エンドポイントの負荷ベンチマーク。
+
+テスト用 DB を作って決まった seed でデータを入れ（seed.py）、scenarios.py の各エンドポイントを
+Django のテストクライアントと実際の WSGI サーバー（スレッド版 wsgiref）の両方から叩いて、
+スループット・p50 / p99 レイテンシ・1 リクエストあたりの SQL 件数を測る。
+
+    python -m benchmarks                                           # SQL 件数の上限だけを確かめる
+    python -m benchmarks --output results.json                     # 結果を JSON で書き出す
+    python -m benchmarks --baseline local.json --update-baseline   # 今回の結果をこのマシンの基準として保存する
+    python -m benchmarks --baseline local.json                     # 保存した基準とも比べる
+
+次の場合に終了コード 1 で終わる:
+- SQL 件数がシナリオで宣言した上限（max_queries）を超えた
+- 想定外のステータスコードが返った
+- --baseline を指定した場合、SQL 件数か p99 が基準（p99 × --latency-tolerance + --latency-slack ミリ秒）を超えた
+
+SQL 件数の上限は環境によらないので scenarios.py に持つ。レイテンシはマシンに依存するので、
+基準はリポジトリに含めず、同じ環境（CI なら同じランナー）で保存したものとだけ比べる。
+"""
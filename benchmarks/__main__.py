@@ -0,0 +1,131 @@
+"""
+python -m benchmarks [--transport client|wsgi] [--requests N] [--output results.json] [--baseline local.json [--update-baseline]]
+"""
+import argparse
+import json
+import os
+import platform
+import secrets
+import sys
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="API エンドポイントの負荷ベンチマーク")
+    parser.add_argument("--transport", action="append", choices=["client", "wsgi"],
+                        help="計測する経路（複数指定可。省略時は両方）")
+    parser.add_argument("--scenario", action="append", help="実行するシナリオ名（前方一致・複数指定可）")
+    parser.add_argument("--requests", type=int, default=200, help="シナリオごとのリクエスト数")
+    parser.add_argument("--warmup", type=int, default=5, help="計測前に捨てるリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=1, help="wsgi で同時に投げるリクエスト数")
+    parser.add_argument("--seed", type=int, default=0, help="データ生成の乱数 seed")
+    parser.add_argument("--output", help="結果の JSON を書き出すパス")
+    parser.add_argument(
+        "--baseline",
+        help="比べる基準の JSON（このマシンで --update-baseline したもの）。指定したときだけレイテンシも比べる",
+    )
+    parser.add_argument("--update-baseline", action="store_true", help="今回の結果を --baseline に保存する")
+    parser.add_argument("--latency-tolerance", type=float, default=2.0, help="p99 が基準の何倍までなら許すか")
+    parser.add_argument("--latency-slack", type=float, default=5.0, help="p99 の許容に足すミリ秒")
+    args = parser.parse_args(argv)
+    if args.update_baseline and not args.baseline:
+        parser.error("--update-baseline には --baseline で保存先を指定してください")
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    from .runner import TRANSPORTS, check, run_scenario
+    from .scenarios import SCENARIOS
+    from .seed import seed
+
+    # SQL 件数は Server-Timing から読むので計測は常に有効にし、ヘッダーも返してもらう
+    settings.METRICS_ENABLED = True
+    settings.METRICS_TOKEN = settings.METRICS_TOKEN or secrets.token_hex(16)
+    # Campaign インデックスのバージョン確認（1 秒に 1 回の SQL）はタイミング次第でどのリクエストにも
+    # 乗るので、SQL 件数が決まった値になるよう計測中は確認しない（インデックスはウォームアップで作られる）
+    from tracking import campaign_index
+
+    campaign_index.VERSION_CHECK_INTERVAL = float("inf")
+    if settings.DATABASES["default"]["ENGINE"].endswith("sqlite3"):
+        # WSGI サーバーのスレッドからも同じ DB が見えるよう、インメモリではなくファイルにする
+        settings.DATABASES["default"].setdefault("TEST", {}).setdefault("NAME", "benchmark.sqlite3")
+
+    scenarios = [
+        s for s in SCENARIOS
+        if not args.scenario or any(s.name.startswith(prefix) for prefix in args.scenario)
+    ]
+    transports = args.transport or list(TRANSPORTS)
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+    try:
+        from django.db import connection
+
+        print(f"seeding (seed={args.seed}) ...", file=sys.stderr)
+        data = seed(args.seed)
+
+        results = {}
+        for name in transports:
+            transport = TRANSPORTS[name]()
+            try:
+                results[name] = {}
+                for scenario in scenarios:
+                    result = run_scenario(
+                        transport, scenario, data, args.requests, args.warmup,
+                        args.concurrency if name == "wsgi" else 1,
+                    )
+                    results[name][scenario.name] = result
+                    print(
+                        f"{name:6} {scenario.name:32} {result['throughput_rps']:8.1f} req/s  "
+                        f"p50 {result['p50_ms']:7.2f}ms  p99 {result['p99_ms']:7.2f}ms  "
+                        f"queries {result['queries_max']}",
+                        file=sys.stderr,
+                    )
+            finally:
+                transport.close()
+        vendor = connection.vendor
+    finally:
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+    baseline = None
+    if args.baseline and not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    failures = check(results, scenarios, baseline, args.latency_tolerance, args.latency_slack)
+    output = {
+        "meta": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": vendor,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "baseline": None if baseline is None else args.baseline,
+        },
+        "results": results,
+        "failures": failures,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": output["meta"], "results": results}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}", file=sys.stderr)
+
+    for failure in failures:
+        print(f"FAIL {failure['transport']} {failure['scenario']}: {failure['reason']}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
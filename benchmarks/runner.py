@@ -0,0 +1,192 @@
+"""
+シナリオを実行して計測し、基準と比べる。
+
+SQL 件数はレスポンスの Server-Timing ヘッダー（config/metrics.py）の db の desc から読む（X-Metrics-Token を送って返してもらう）。
+テストクライアントでも WSGI サーバー越しでも同じ方法で数えられる。
+"""
+import json
+import math
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def _queries(server_timing):
+    match = _QUERIES.search(server_timing or "")
+    return int(match.group(1)) if match else None
+
+
+def _headers(user):
+    """認証のヘッダーと、Server-Timing を返してもらうための X-Metrics-Token"""
+    from django.conf import settings
+
+    headers = {"X-Metrics-Token": settings.METRICS_TOKEN} if settings.METRICS_TOKEN else {}
+    if user is None:
+        return headers
+    from rest_framework.authtoken.models import Token
+
+    token, _ = Token.objects.get_or_create(user=user)
+    headers["Authorization"] = f"Token {token.key}"
+    return headers
+
+
+class ClientTransport:
+    """Django のテストクライアント（ネットワークを通らない）"""
+
+    name = "client"
+
+    def __init__(self):
+        from rest_framework.test import APIClient
+
+        self.client = APIClient()
+
+    def request(self, method, path, payload, user):
+        headers = _headers(user)
+        if method == "GET":
+            response = self.client.get(path, payload, headers=headers)
+        else:
+            response = self.client.post(path, payload, format="json", headers=headers)
+        return response.status_code, response.get("Server-Timing")
+
+    def close(self):
+        pass
+
+
+class _ThreadedWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class WSGITransport:
+    """config.wsgi.application をスレッド版の wsgiref サーバーで立て、HTTP で叩く"""
+
+    name = "wsgi"
+
+    def __init__(self):
+        from django.core.wsgi import get_wsgi_application
+
+        self.server = make_server(
+            "127.0.0.1", 0, get_wsgi_application(),
+            server_class=_ThreadedWSGIServer, handler_class=_QuietHandler,
+        )
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def request(self, method, path, payload, user):
+        headers = _headers(user)
+        url = self.base_url + path
+        body = None
+        if method == "GET":
+            if payload:
+                url += "?" + urllib.parse.urlencode(payload)
+        else:
+            body = json.dumps(payload).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                response.read()
+                return response.status, response.headers.get("Server-Timing")
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get("Server-Timing")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+TRANSPORTS = {
+    "client": ClientTransport,
+    "wsgi": WSGITransport,
+}
+
+
+def _percentile(ordered, q):
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def run_scenario(transport, scenario, data, requests, warmup=5, concurrency=1):
+    """scenario を requests 回実行して集計した dict を返す"""
+    # 認証トークンの作成などを計測に含めないよう、先に組み立てておく
+    calls = [scenario.build(data, i) for i in range(warmup + requests)]
+    for path, payload, user in calls[:warmup]:
+        transport.request(scenario.method, path, payload, user)
+
+    def call(args):
+        path, payload, user = args
+        start = time.perf_counter()
+        status, server_timing = transport.request(scenario.method, path, payload, user)
+        return time.perf_counter() - start, status, _queries(server_timing)
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(call, calls[warmup:]))
+    else:
+        samples = [call(args) for args in calls[warmup:]]
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [n for _, _, n in samples if n is not None]
+    unexpected = sorted({status for _, status, _ in samples if status not in scenario.statuses})
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "queries_max": max(queries) if queries else None,
+        "queries_mean": round(sum(queries) / len(queries), 2) if queries else None,
+        "unexpected_statuses": unexpected,
+    }
+
+
+def check(results, scenarios, baseline=None, latency_tolerance=2.0, latency_slack_ms=5.0):
+    """
+    予算を超えたものを [{"transport", "scenario", "reason"}] で返す。
+    baseline は以前の結果（results と同じ形の dict）
+    """
+    declared = {s.name: s for s in scenarios}
+    failures = []
+
+    def fail(transport, name, reason):
+        failures.append({"transport": transport, "scenario": name, "reason": reason})
+
+    for transport, by_scenario in results.items():
+        for name, result in by_scenario.items():
+            scenario = declared[name]
+            if result["unexpected_statuses"]:
+                fail(transport, name, f"unexpected status {result['unexpected_statuses']}")
+            if result["queries_max"] is None:
+                fail(transport, name, "no Server-Timing header (METRICS_ENABLED is off?)")
+            elif result["queries_max"] > scenario.max_queries:
+                fail(transport, name, f"{result['queries_max']} queries > budget {scenario.max_queries}")
+
+            previous = (baseline or {}).get(transport, {}).get(name)
+            if previous is None:
+                continue
+            if (
+                result["queries_max"] is not None
+                and previous.get("queries_max") is not None
+                and result["queries_max"] > previous["queries_max"]
+            ):
+                fail(transport, name, f"{result['queries_max']} queries > baseline {previous['queries_max']}")
+            limit = previous["p99_ms"] * latency_tolerance + latency_slack_ms
+            if result["p99_ms"] > limit:
+                fail(transport, name, f"p99 {result['p99_ms']:.1f}ms > {limit:.1f}ms (baseline {previous['p99_ms']:.1f}ms)")
+    return failures
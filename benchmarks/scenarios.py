@@ -0,0 +1,135 @@
+"""
+ベンチマークするエンドポイント。
+
+build(data, i) は i 回目のリクエストの (パス, クエリ or ボディ, 認証する User or None) を返す。
+max_queries は 1 リクエストあたりの SQL 件数の上限（これを超えたら失敗）。
+"""
+from collections import namedtuple
+
+Scenario = namedtuple("Scenario", ["name", "method", "build", "max_queries", "statuses"])
+
+
+def _client(data, i):
+    return data.client_ids[i % len(data.client_ids)]
+
+
+def _user(data, i):
+    return data.users[i % len(data.users)]
+
+
+def _quote(data, i):
+    return data.quote_ids[(i * 7) % len(data.quote_ids)]
+
+
+def _date(data, i):
+    return data.dates[(i * 3) % len(data.dates)].isoformat()
+
+
+SCENARIOS = [
+    # quotes
+    Scenario(
+        "quotes.today", "GET",
+        lambda data, i: ("/api/quotes/today/", {"client_id": _client(data, i)}, None),
+        max_queries=1, statuses={200},
+    ),
+    Scenario(
+        "quotes.by_date", "GET",
+        lambda data, i: ("/api/quotes/by-date/", {"date": _date(data, i), "client_id": _client(data, i)}, None),
+        max_queries=3, statuses={200},
+    ),
+    Scenario(
+        "quotes.toggle_favorite", "POST",
+        lambda data, i: (f"/api/quotes/{_quote(data, i)}/toggle-favorite/", {"client_id": _client(data, i)}, None),
+        max_queries=8, statuses={200},
+    ),
+    Scenario(
+        "quotes.toggle_favorite.user", "POST",
+        lambda data, i: (f"/api/quotes/{_quote(data, i)}/toggle-favorite/", {}, _user(data, i)),
+        max_queries=9, statuses={200},
+    ),
+    Scenario(
+        "quotes.favorites", "GET",
+        lambda data, i: ("/api/quotes/favorites/", {"client_id": _client(data, i)}, None),
+        max_queries=3, statuses={200},
+    ),
+    Scenario(
+        "quotes.favorites.user", "GET",
+        lambda data, i: ("/api/quotes/favorites/", {}, _user(data, i)),
+        max_queries=4, statuses={200},
+    ),
+    # tracking
+    Scenario(
+        "tracking.campaigns_active", "GET",
+        lambda data, i: ("/api/tracking/campaigns/active/", {}, None),
+        max_queries=0, statuses={200},
+    ),
+    Scenario(
+        "tracking.campaign_view", "POST",
+        lambda data, i: (
+            "/api/tracking/campaigns/view/",
+            {"campaign_id": data.active_campaign_id, "client_id": _client(data, i)},
+            None,
+        ),
+        max_queries=2, statuses={201, 202},
+    ),
+    Scenario(
+        "tracking.campaign_click", "POST",
+        lambda data, i: (
+            "/api/tracking/campaigns/click/",
+            {"campaign_id": data.active_campaign_id, "client_id": _client(data, i), "action": "sns"},
+            None,
+        ),
+        max_queries=2, statuses={201, 202},
+    ),
+    Scenario(
+        "tracking.quote_view", "POST",
+        lambda data, i: ("/api/tracking/quotes/view/", {"quote_id": _quote(data, i), "client_id": _client(data, i)}, None),
+        max_queries=2, statuses={201, 202},
+    ),
+    Scenario(
+        "tracking.quote_click", "POST",
+        lambda data, i: (
+            "/api/tracking/quotes/click/",
+            {"quote_id": _quote(data, i), "client_id": _client(data, i), "action": "wiki"},
+            None,
+        ),
+        max_queries=2, statuses={201, 202},
+    ),
+    Scenario(
+        "tracking.events_batch", "POST",
+        lambda data, i: (
+            "/api/tracking/events/batch/",
+            {
+                "client_id": _client(data, i),
+                "events": [
+                    {"type": "quote_view", "quote_id": _quote(data, i + n)} for n in range(20)
+                ] + [
+                    {"type": "campaign_click", "campaign_id": data.active_campaign_id, "action": "official"},
+                ],
+            },
+            None,
+        ),
+        max_queries=5, statuses={201, 202},
+    ),
+    Scenario(
+        "tracking.stats_overview", "GET",
+        # 確定前の日は生ログを 4 テーブル数える（確定済みの日は 2）
+        lambda data, i: ("/api/tracking/stats/overview/", {"date": _date(data, i)}, None),
+        max_queries=5, statuses={200},
+    ),
+    Scenario(
+        "tracking.stats_range", "GET",
+        lambda data, i: (
+            "/api/tracking/stats/range/",
+            {"start": data.dates[29].isoformat(), "end": data.dates[0].isoformat(), "group_by": "action"},
+            None,
+        ),
+        # 確定状態 1 + DailyStat 1 + 確定前の日の生ログ 4
+        max_queries=6, statuses={200},
+    ),
+    Scenario(
+        "tracking.stats_buffer", "GET",
+        lambda data, i: ("/api/tracking/stats/buffer/", {}, data.staff),
+        max_queries=1, statuses={200},
+    ),
+]
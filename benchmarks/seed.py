@@ -0,0 +1,122 @@
+"""
+ベンチマーク用のデータ。seed が同じなら同じデータになる。
+"""
+import datetime
+import random
+
+from django.utils import timezone
+
+QUOTES = 400
+CAMPAIGNS = 8
+CLIENTS = 200
+USERS = 20
+FAVORITES = 3000
+VIEWS = 20000
+CLICKS = 4000
+
+
+class SeedData:
+    """シナリオがリクエストを組み立てるのに使う ID など"""
+
+    def __init__(self, quote_ids, campaign_ids, active_campaign_id, dates, client_ids, users, staff):
+        self.quote_ids = quote_ids
+        self.campaign_ids = campaign_ids
+        self.active_campaign_id = active_campaign_id
+        self.dates = dates
+        self.client_ids = client_ids
+        self.users = users
+        self.staff = staff
+
+
+def seed(seed=0):
+    from quotes.models import Favorite, Quote, User
+    from quotes.indexes import update_quote_indexes
+    from tracking.models import Campaign, CampaignClick, CampaignView, QuoteClick, QuoteView
+
+    rng = random.Random(seed)
+    today = timezone.localdate()
+
+    # 今日を含む過去 QUOTES 日分に 1 日 1 本
+    dates = [today - datetime.timedelta(days=i) for i in range(QUOTES)]
+    quotes = Quote.objects.bulk_create([
+        Quote(
+            text=f"ベンチマークの台詞 {i} " + "あいうえお" * rng.randint(1, 8),
+            author_name=f"作者 {i % 37}",
+            source=f"作品 {i % 53}",
+            original_text=f"Benchmark line {i}",
+            tags=",".join(rng.sample(["悲劇", "喜劇", "愛", "復讐", "旅", "家族"], 2)),
+            publish_date=day,
+        )
+        for i, day in enumerate(dates)
+    ])
+    if quotes[0].pk is None:
+        quotes = list(Quote.objects.filter(publish_date__in=dates))
+    update_quote_indexes(quotes)
+    quote_ids = [q.pk for q in quotes]
+
+    # 1 本は今日を含み、残りは過去の 1 週間ずつ
+    campaigns = [
+        Campaign(
+            name=f"bench-{i}",
+            client_name=f"クライアント {i}",
+            text=f"キャンペーン {i}",
+            url="https://example.com/",
+            start_date=today - datetime.timedelta(days=30 * i + 3),
+            end_date=today - datetime.timedelta(days=30 * i - 3),
+        )
+        for i in range(CAMPAIGNS)
+    ]
+    Campaign.objects.bulk_create(campaigns)
+    campaigns = list(Campaign.objects.filter(name__startswith="bench-").order_by("-start_date"))
+    campaign_ids = [c.pk for c in campaigns]
+
+    client_ids = [f"bench-client-{i}" for i in range(CLIENTS)]
+    users = [User.objects.create(username=f"bench-user-{i}") for i in range(USERS)]
+    staff = User.objects.create(username="bench-staff", is_staff=True)
+
+    # いいね・閲覧は新しい台詞と一部の端末に偏らせる
+    def pick(values):
+        return values[min(len(values) - 1, int(rng.paretovariate(1.2)) - 1)]
+
+    favorites = {}
+    while len(favorites) < FAVORITES:
+        if rng.random() < 0.2:
+            owner = {"user_id": rng.choice(users).pk, "client_id": None}
+        else:
+            owner = {"user_id": None, "client_id": pick(client_ids)}
+        if rng.random() < 0.1:
+            target = {"campaign_id": rng.choice(campaign_ids)}
+        else:
+            target = {"quote_id": pick(quote_ids)}
+        favorites[tuple(sorted({**owner, **target}.items()))] = Favorite(**owner, **target)
+    Favorite.objects.bulk_create(list(favorites.values()), batch_size=1000)
+
+    from quotes.favorites import recount_campaign_likes, recount_quote_likes
+
+    recount_quote_likes()
+    recount_campaign_likes()
+
+    QuoteView.objects.bulk_create(
+        [QuoteView(quote_id=pick(quote_ids), client_id=pick(client_ids)) for _ in range(VIEWS)],
+        batch_size=2000,
+    )
+    QuoteClick.objects.bulk_create(
+        [
+            QuoteClick(quote_id=pick(quote_ids), client_id=pick(client_ids), action=rng.choice(["wiki", "amazon", "share"]))
+            for _ in range(CLICKS)
+        ],
+        batch_size=2000,
+    )
+    CampaignView.objects.bulk_create(
+        [CampaignView(campaign_id=rng.choice(campaign_ids), client_id=pick(client_ids)) for _ in range(VIEWS // 10)],
+        batch_size=2000,
+    )
+    CampaignClick.objects.bulk_create(
+        [
+            CampaignClick(campaign_id=rng.choice(campaign_ids), client_id=pick(client_ids), action=rng.choice(["official", "sns", "share"]))
+            for _ in range(CLICKS // 10)
+        ],
+        batch_size=2000,
+    )
+
+    return SeedData(quote_ids, campaign_ids, campaign_ids[0], dates, client_ids, users, staff)
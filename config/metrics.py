@@ -0,0 +1,210 @@
+"""
+リクエストごとの SQL 件数・DB 時間・レンダリング時間・全体時間の計測。
+
+- MetricsMiddleware が connection.execute_wrapper で SQL を数えて時間を測り、
+  Server-Timing ヘッダー（db / render / total）を付ける。
+  ヘッダーは DEBUG の時か、X-Metrics-Token ヘッダーで METRICS_TOKEN を送ってきたリクエストにだけ付ける
+  （計測と /metrics/ への記録は常に行う）
+- レンダリング時間は DRF の Response を JSON にするのにかかった時間。
+  REST_FRAMEWORK の DEFAULT_RENDERER_CLASSES に TimedJSONRenderer を指定して測る
+  （シリアライザの .data はビューの中で評価されるので total に含まれる）
+- ルート（URL パターン）とメソッドごとに直近 METRICS_WINDOW 件をリングバッファに持ち、
+  /metrics/ で p50 / p95 / p99 を Prometheus のテキスト形式で返す
+
+常時有効にしておけるよう、リクエストあたりの処理は perf_counter と足し算と
+deque への追加だけにして、並べ替え（パーセンタイルの計算）は /metrics/ を読んだ時に行う。
+
+注意:
+- 値はプロセス（gunicorn のワーカー）ごと。/metrics/ は応答したワーカーの分だけを返す
+- StreamingHttpResponse の本体を書き出している間の SQL は数えない（誤解を招くので Server-Timing も付けない）
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework.renderers import JSONRenderer
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 記録する値: (名前, Prometheus のメトリクス名, HELP)
+SERIES = (
+    ("total", "makumark_request_duration_seconds", "Total time spent handling the request."),
+    ("db", "makumark_request_db_duration_seconds", "Time spent executing SQL queries."),
+    ("render", "makumark_request_render_duration_seconds", "Time spent rendering DRF responses."),
+    ("queries", "makumark_request_queries", "Number of SQL queries executed."),
+)
+
+# URL パターンに当たらなかったリクエスト（404 など）はひとまとめにする
+UNMATCHED_ROUTE = "<unmatched>"
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """1 リクエスト分の計測値。execute_wrapper としてそのまま渡せる"""
+
+    __slots__ = ("queries", "db", "render")
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries", '
+            f"render;dur={self.render * 1000:.1f}, "
+            f"total;dur={total * 1000:.1f}"
+        )
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer と同じ出力で、かかった時間を今のリクエストの render に足す"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics.render += time.perf_counter() - start
+
+
+class _RouteStats:
+    def __init__(self, window):
+        self.samples = {name: deque(maxlen=window) for name, _, _ in SERIES}
+        self.sums = dict.fromkeys(self.samples, 0.0)
+        self.count = 0
+
+
+def _quantile(ordered, q):
+    """並べ替え済みのリストの q 分位点（nearest-rank）"""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """(メソッド, ルート) ごとの直近の計測値（スレッドセーフ）"""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, route, values):
+        key = (method, route)
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = _RouteStats(self.window)
+            for name, value in values.items():
+                stats.samples[name].append(value)
+                stats.sums[name] += value
+            stats.count += 1
+
+    def snapshot(self):
+        """{(メソッド, ルート): (件数, {名前: 合計}, {名前: 直近の値のリスト})}"""
+        with self._lock:
+            return {
+                key: (stats.count, dict(stats.sums), {name: list(s) for name, s in stats.samples.items()})
+                for key, stats in self._routes.items()
+            }
+
+    def render(self):
+        """Prometheus のテキスト形式（summary）"""
+        snapshot = sorted(self.snapshot().items())
+        lines = []
+        for name, metric, help_text in SERIES:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for (method, route), (count, sums, samples) in snapshot:
+                labels = f'method="{_label(method)}",route="{_label(route)}"'
+                ordered = sorted(samples[name])
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{{labels},quantile="{q}"}} {_quantile(ordered, q):.6g}')
+                lines.append(f"{metric}_sum{{{labels}}} {sums[name]:.6g}")
+                lines.append(f"{metric}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+registry = MetricsRegistry(getattr(settings, "METRICS_WINDOW", 1024))
+
+
+def _may_expose(request):
+    """Server-Timing を返してよいリクエストか（DEBUG か、X-Metrics-Token が METRICS_TOKEN と一致）"""
+    if settings.DEBUG:
+        return True
+    token = getattr(settings, "METRICS_TOKEN", "")
+    return bool(token) and constant_time_compare(request.headers.get("X-Metrics-Token", ""), token)
+
+
+class MetricsMiddleware:
+    """MIDDLEWARE の先頭に置く（全体時間に他のミドルウェアの分も含めるため）"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        if not response.streaming and _may_expose(request):
+            response["Server-Timing"] = metrics.server_timing(total)
+
+        match = getattr(request, "resolver_match", None)
+        if match is not None and match.url_name == "metrics":
+            return response
+        registry.record(
+            request.method,
+            f"/{match.route}" if match is not None else UNMATCHED_ROUTE,
+            {"total": total, "db": metrics.db, "render": metrics.render, "queries": metrics.queries},
+        )
+        return response
+
+
+def metrics_view(request):
+    """
+    GET /metrics/（Prometheus のスクレイプ用）
+    METRICS_TOKEN を設定した場合は Authorization: Bearer <token> が必要。
+    設定していなければ DEBUG の時だけ返す
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            raise Http404
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -27,6 +27,9 @@ else:
     CORS_ALLOW_ALL_ORIGINS = False
     CORS_ALLOWED_ORIGINS = [o for o in origins.split(",") if o]
 
+# いいね一覧のページネーション用ヘッダーをブラウザから読めるようにする
+CORS_EXPOSE_HEADERS = ["X-Next-Cursor", "Link"]
+
 # CSRF
 csrf_origins = os.environ.get("CSRF_TRUSTED_ORIGINS", "")
 CSRF_TRUSTED_ORIGINS = [o for o in csrf_origins.split(",") if o]
@@ -51,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -102,6 +106,54 @@ if "DATABASE_URL" in os.environ and not DEBUG:
         ssl_require=True,
     )
 
+# Cache（REDIS_URL があればワーカー間で共有、なければプロセス内メモリ）
+# gunicorn など複数ワーカーで動かす場合は REDIS_URL を設定すること
+if "REDIS_URL" in os.environ:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# 日付ごとの台詞レスポンス本体のキャッシュ秒数（quotes/cache.py）
+QUOTE_PAYLOAD_CACHE_TIMEOUT = int(os.environ.get("QUOTE_PAYLOAD_CACHE_TIMEOUT", "300"))
+# プロセス内メモリでは無効化が他ワーカーに届かないので、古い内容を返すのは数秒までにする
+QUOTE_PAYLOAD_LOCAL_CACHE_TIMEOUT = int(os.environ.get("QUOTE_PAYLOAD_LOCAL_CACHE_TIMEOUT", "5"))
+if "REDIS_URL" not in os.environ:
+    QUOTE_PAYLOAD_CACHE_TIMEOUT = min(QUOTE_PAYLOAD_CACHE_TIMEOUT, QUOTE_PAYLOAD_LOCAL_CACHE_TIMEOUT)
+
+# トラッキングイベントの書き込みバッファ（tracking/buffer.py）
+TRACKING_BUFFER_ENABLED = os.environ.get("TRACKING_BUFFER_ENABLED", "0") == "1"
+TRACKING_BUFFER_MAX_SIZE = int(os.environ.get("TRACKING_BUFFER_MAX_SIZE", "10000"))
+TRACKING_BUFFER_FLUSH_SIZE = int(os.environ.get("TRACKING_BUFFER_FLUSH_SIZE", "500"))
+TRACKING_BUFFER_FLUSH_INTERVAL = float(os.environ.get("TRACKING_BUFFER_FLUSH_INTERVAL", "2.0"))
+
+# 古い生ログの書き出し先（archive_tracking_events / restore_tracking_archive）
+TRACKING_ARCHIVE_DIR = os.environ.get("TRACKING_ARCHIVE_DIR", str(BASE_DIR / "archive" / "tracking"))
+
+# generate_month_quotes の API レスポンスキャッシュ（quotes/generation.py）
+QUOTE_GENERATION_CACHE_DIR = os.environ.get(
+    "QUOTE_GENERATION_CACHE_DIR", str(BASE_DIR / ".cache" / "quote_generation")
+)
+QUOTE_GENERATION_CACHE_TTL = int(os.environ.get("QUOTE_GENERATION_CACHE_TTL", str(30 * 24 * 3600)))
+QUOTE_GENERATION_CACHE_MAX_BYTES = int(os.environ.get("QUOTE_GENERATION_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# 台詞検索のインデックス（quotes/search.py）。auto なら PostgreSQL は pg_trgm、それ以外は bigram
+QUOTE_SEARCH_BACKEND = os.environ.get("QUOTE_SEARCH_BACKEND", "auto")
+
+# リクエストごとの SQL 件数・処理時間の計測と /metrics/（config/metrics.py）
+# METRICS_TOKEN: /metrics/ の Bearer トークン。X-Metrics-Token で送ると DEBUG でなくても Server-Timing を返す
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_WINDOW = int(os.environ.get("METRICS_WINDOW", "1024"))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -144,6 +196,11 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
+    # JSONRenderer と同じ。レンダリング時間を Server-Timing / /metrics/ に記録する（config/metrics.py）
+    "DEFAULT_RENDERER_CLASSES": [
+        "config.metrics.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 # ========== 開発環境 ========== #
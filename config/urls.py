@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
+from config.metrics import metrics_view
 from quotes.views import MeView, SubscriptionVerifyView, AppleSignInView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics/", metrics_view, name="metrics"),
     path("api/auth/signin/", AppleSignInView.as_view(), name="apple-signin"),
     path("api/me/", MeView.as_view(), name="me"),
     path("api/subscription/verify/", SubscriptionVerifyView.as_view(), name="subscription-verify"),
@@ -100,6 +100,18 @@ export async function toggleFavorite(quoteId, isCampaign = false) {
   return syncPromise.then(res => res?.data || {});
 }
 
+// オフライン中に溜めたいいね操作をまとめて送る
+// changes: [{ kind: "quote" | "campaign", id, liked, ts: ISO 文字列 }]
+// → { added, removed, ignored, favorites: { quotes: [...], campaigns: [...] } }（反映後のいいね済み一覧）
+export async function syncFavorites(changes) {
+  const data = { changes };
+  if (!getAuthToken()) {
+    data.client_id = getClientId();
+  }
+  const res = await api.post("/quotes/favorites/sync/", data);
+  return res.data;
+}
+
 // 指定日付の台詞を取得
 export async function fetchQuoteByDate(dateStr) {
   const params = { date: dateStr };
@@ -142,6 +154,53 @@ export async function fetchQuoteByDate(dateStr) {
   }
 }
 
+// 期間内の各日の台詞をまとめて取得（カレンダー用）
+// 取得した日は fetchQuoteByDate と同じキーでキャッシュしておく
+export async function fetchQuoteRange(startStr, endStr) {
+  const params = { start: startStr, end: endStr };
+  // Token がない場合のみ client_id を送る
+  if (!getAuthToken()) {
+    params.client_id = getClientId();
+  }
+
+  const res = await api.get("/quotes/range/", { params });
+  const cachedAt = new Date().toISOString();
+  for (const { date, quote } of res.data.days) {
+    if (quote) {
+      localStorage.setItem(
+        `makumark_quote_${date}`,
+        JSON.stringify({ data: quote, cachedAt, date })
+      );
+    }
+  }
+  return res.data.days; // [{ date, quote }]
+}
+
+// タグの付いた台詞を新しい順に取得（続きは X-Next-Cursor のカーソルで）
+export async function fetchQuotesByTag(tag, cursor = null) {
+  const params = { tag };
+  // Token がない場合のみ client_id を送る
+  if (!getAuthToken()) {
+    params.client_id = getClientId();
+  }
+  if (cursor) {
+    params.cursor = cursor;
+  }
+  const res = await api.get("/quotes/", { params });
+  return { quotes: res.data, nextCursor: res.headers["x-next-cursor"] || null };
+}
+
+// 台詞を検索（空白区切りの語をすべて含むものをスコア順に）
+export async function searchQuotes(query, { limit = 20, offset = 0 } = {}) {
+  const params = { q: query, limit, offset };
+  // Token がない場合のみ client_id を送る
+  if (!getAuthToken()) {
+    params.client_id = getClientId();
+  }
+  const res = await api.get("/quotes/search/", { params });
+  return res.data; // { query, count, next_offset, results: [Quote + score, highlights] }
+}
+
 // いいね一覧を取得
 export async function fetchFavorites() {
   const params = {};
@@ -149,8 +208,17 @@ export async function fetchFavorites() {
   if (!getAuthToken()) {
     params.client_id = getClientId();
   }
-  const res = await api.get("/quotes/favorites/", { params });
-  return res.data; // [Quote...]
+  // サーバーはカーソルで分割して返すので、X-Next-Cursor が無くなるまで続けて取得
+  const favorites = [];
+  let cursor = null;
+  do {
+    const res = await api.get("/quotes/favorites/", {
+      params: cursor ? { ...params, cursor } : params,
+    });
+    favorites.push(...res.data);
+    cursor = res.headers["x-next-cursor"] || null;
+  } while (cursor);
+  return favorites; // [Quote...]
 }
 
 // Wikipedia 検索→サマリー取得
@@ -1,6 +1,7 @@
 import { ref, computed } from 'vue';
 import { Capacitor } from '@capacitor/core';
 import { hideBanner } from '@/admob';
+import { getClientId } from '@/api';
 
 // グローバル User 状態管理
 export const currentUser = ref(null);
@@ -93,6 +94,8 @@ export async function signInWithApple() {
         apple_id: appleUserId,
         id_token: identityToken,
         email: email || '',
+        // この端末で匿名で付けたいいねを引き継いでもらう
+        client_id: getClientId(),
       }),
     });
 
@@ -128,6 +131,7 @@ async function signInDemo() {
     body: JSON.stringify({
       apple_id: demoAppleId,
       email: 'demo@example.com',
+      client_id: getClientId(),
     }),
   });
 
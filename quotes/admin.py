@@ -1,7 +1,9 @@
 from django.contrib import admin
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
-from .models import Quote, Favorite
+from .models import Quote, Favorite, UserClient
+from .search import parse_terms, search_filter
+from .similarity import find_similar
 
 
 class QuoteResource(resources.ModelResource):
@@ -43,19 +45,39 @@ class QuoteResource(resources.ModelResource):
         )
         import_id_fields = ['id']  # idで既存レコードを識別（新規作成時は空欄可）
 
+    def validate_instance(self, instance, import_validation_errors=None, validate_unique=True):
+        # 新しく追加する行が既存の台詞（同じファイル内で先に取り込んだ行を含む）の言い換えなら、
+        # 理由付きのエラーにする（既存の行の更新は対象にしない）
+        errors = dict(import_validation_errors or {})
+        if not instance.pk:
+            similar = find_similar(instance.text, instance.original_text)
+            if similar:
+                quote_id, score = similar[0]
+                errors.setdefault("text", []).append(
+                    f"既存の台詞（ID {quote_id}）と近似重複しています（類似度 {score:.2f}）"
+                )
+        super().validate_instance(instance, errors, validate_unique)
+
 
 @admin.register(Quote)
 class QuoteAdmin(ImportExportModelAdmin):
     resource_class = QuoteResource
     list_display = ("publish_date", "short_text", "author_name", "source", "category", "like_count", "is_public_domain")
     list_filter = ("category", "is_public_domain", "publish_date")
-    search_fields = ("text", "author_name", "source", "tags")
+    search_fields = ("text", "author_name", "source", "tags")  # 検索ボックスの表示用（絞り込みは get_search_results）
     date_hierarchy = "publish_date"
     ordering = ("-publish_date",)
     
     # CSV import/exportの設定
     import_export_change_list_template = "admin/import_export/change_list_import_export.html"
 
+    def get_search_results(self, request, queryset, search_term):
+        # /api/quotes/search/ と同じ条件・インデックスで絞り込む
+        terms = parse_terms(search_term)
+        if not terms:
+            return queryset, False
+        return queryset.filter(search_filter(terms)), False
+
     def short_text(self, obj):
         return (obj.text[:40] + "…") if len(obj.text) > 40 else obj.text
 
@@ -66,4 +88,11 @@ class QuoteAdmin(ImportExportModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ("quote", "client_id", "created_at")
     list_filter = ("created_at",)
-    search_fields = ("client_id",)
\ No newline at end of file
+    search_fields = ("client_id",)
+
+
+@admin.register(UserClient)
+class UserClientAdmin(admin.ModelAdmin):
+    list_display = ("client_id", "user", "created_at", "merged_at")
+    search_fields = ("client_id",)
+    raw_id_fields = ("user",)
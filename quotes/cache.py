@@ -0,0 +1,178 @@
+"""
+TodayQuoteView / QuoteByDateView のレスポンス本体キャッシュ。
+
+本体（台詞 or キャンペーン）は同じ日付なら全ユーザー共通で、ユーザーごとに
+違うのは liked だけ。そこで
+
+    日付 → 表示対象 (kind, pk)      … Quote / Campaign の変更で世代ごと無効化
+    表示対象 → レスポンス本体       … 対象の更新・いいね数の変化で個別に削除
+
+の2段でキャッシュし、liked はビュー側で上乗せする。
+無効化は quotes/signals.py から行う。
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Quote
+from .serializers import QuoteSerializer
+
+QUOTE = "quote"
+CAMPAIGN = "campaign"
+
+GENERATION_KEY = "quotes:payload:gen"
+
+
+def _timeout():
+    return getattr(settings, "QUOTE_PAYLOAD_CACHE_TIMEOUT", 300)
+
+
+def _generation():
+    gen = cache.get(GENERATION_KEY)
+    if gen is None:
+        # 追い出された場合も過去の世代番号を再利用しないよう時刻ベースにする
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        gen = cache.get(GENERATION_KEY)
+    return gen
+
+
+def _date_key(target_date, fallback, index):
+    # 他ワーカーの古い Campaign インデックスで引いた対応表を読まないよう、そのバージョンもキーに含める
+    return (
+        f"quotes:payload:{_generation()}:{index.version}:"
+        f"date:{target_date.isoformat()}:{int(fallback)}"
+    )
+
+
+def _body_key(kind, pk):
+    return f"quotes:payload:body:{kind}:{pk}"
+
+
+def quote_body(data):
+    """QuoteSerializer の出力から本体を作る"""
+    data = dict(data)
+    data["liked"] = False
+    data["is_campaign"] = False
+    return data
+
+
+def campaign_body(campaign):
+    """Campaign を Quote の形にした本体（campaign.like_count をそのまま使う）"""
+    return {
+        "id": None,
+        "campaign_id": campaign.id,
+        "text": campaign.text,
+        "client_name": campaign.client_name,
+        "url": campaign.url,
+        "sns_url": campaign.sns_url,
+        "is_campaign": True,
+        "liked": False,
+        "like_count": campaign.like_count,
+    }
+
+
+def build_quote_body(quote):
+    return quote_body(QuoteSerializer(quote).data)
+
+
+def build_campaign_body(campaign):
+    from tracking.models import Campaign
+
+    body = campaign_body(campaign)
+    # インデックス上のインスタンスは like_count が古いことがあるので、ここだけ DB から読む
+    like_count = Campaign.objects.filter(pk=campaign.pk).values_list("like_count", flat=True).first()
+    body["like_count"] = like_count or 0
+    return body
+
+
+def _resolve(target_date, fallback, index):
+    """その日に表示する (kind, pk) と実体を引く"""
+    campaign = index.campaign_for(target_date)
+    if campaign:
+        return (CAMPAIGN, campaign.pk), campaign
+
+    try:
+        quote = Quote.objects.get(publish_date=target_date)
+    except Quote.DoesNotExist:
+        if not fallback:
+            return (None, None), None
+        # なければ一番近い過去 or ランダム
+        quote = (
+            Quote.objects.filter(publish_date__lte=target_date).order_by("-publish_date").first()
+            or Quote.objects.order_by("?").first()
+        )
+        if not quote:
+            return (None, None), None
+    return (QUOTE, quote.pk), quote
+
+
+def _load(kind, pk, index):
+    if kind == CAMPAIGN:
+        return index.by_id.get(pk)
+    return Quote.objects.filter(pk=pk).first()
+
+
+class Payload(namedtuple("Payload", ["body", "version", "last_modified"])):
+    """
+    body: liked=False の状態の本体
+    version: 本体の内容を決める値（対象の updated_at と like_count）。ETag の元にする
+    last_modified: 対象の updated_at
+    """
+
+
+def _build(kind, obj):
+    body = build_campaign_body(obj) if kind == CAMPAIGN else build_quote_body(obj)
+    version = f"{kind}:{obj.pk}:{obj.updated_at.isoformat()}:{body['like_count']}"
+    return Payload(body, version, obj.updated_at)
+
+
+def get_payload_for_date(target_date, fallback=False):
+    """
+    target_date に表示する Payload を返す。表示対象が無ければ None。
+    fallback=True なら当日分が無いとき直近の過去 or ランダムの Quote を使う（今日の1本用）。
+    """
+    from tracking import campaign_index
+
+    index = campaign_index.get_index()
+    date_key = _date_key(target_date, fallback, index)
+    target = cache.get(date_key)
+    obj = None
+    if target is None:
+        target, obj = _resolve(target_date, fallback, index)
+        cache.set(date_key, target, _timeout())
+
+    kind, pk = target
+    if kind is None:
+        return None
+
+    body_key = _body_key(kind, pk)
+    payload = cache.get(body_key)
+    if payload is not None:
+        return payload
+
+    if obj is None:
+        obj = _load(kind, pk, index)
+        if obj is None:
+            # 他ワーカーで削除済みなど、対応表が古い場合は引き直す
+            target, obj = _resolve(target_date, fallback, index)
+            cache.set(date_key, target, _timeout())
+            kind, pk = target
+            if kind is None:
+                return None
+            body_key = _body_key(kind, pk)
+
+    payload = _build(kind, obj)
+    cache.set(body_key, payload, _timeout())
+    return payload
+
+
+def invalidate_dates():
+    """日付 → 表示対象の対応表を世代ごと捨てる（Quote / Campaign の追加・変更・削除時）"""
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate_body(kind, pk):
+    """表示対象ひとつ分の本体を捨てる（内容やいいね数が変わった時）"""
+    cache.delete(_body_key(kind, pk))
@@ -0,0 +1,41 @@
+"""
+ETag による条件付き GET。
+If-None-Match が一致すれば、本体を組み立てずに 304 を返す。
+"""
+import hashlib
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """parts から強い ETag を作る"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    """If-None-Match に etag が含まれるか（弱い比較）"""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if "*" in etags:
+        return True
+    return any(e.removeprefix("W/") == etag for e in etags)
+
+
+def set_validators(response, etag, last_modified=None):
+    """ETag / Last-Modified を付ける。liked がユーザーごとに違うので共有キャッシュさせない"""
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Authorization", "X-Client-Id"])
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
@@ -0,0 +1,294 @@
+"""
+いいね（Favorite）まわりの集合処理。
+Quote.like_count / Campaign.like_count は Favorite の件数を非正規化して持っているので、
+ずれた場合はここの関数でまとめて数え直す。
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import cache as payload_cache
+from .models import Favorite, Quote, UserClient
+
+
+def _favorite_counts(field):
+    """OuterRef('pk') に対応する Favorite 件数のサブクエリ"""
+    return Coalesce(
+        Subquery(
+            Favorite.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(n=Count('id'))
+            .values('n')
+        ),
+        0,
+    )
+
+
+def _recount(model, field, kind, ids=None, dry_run=False):
+    """
+    like_count が Favorite の件数とずれている行を探し、UPDATE 1 回で直す。
+    戻り値は直した（dry_run なら直すべき）行の ID のリスト
+    """
+    qs = model.objects.all()
+    if ids is not None:
+        qs = qs.filter(pk__in=ids)
+
+    drifted = list(
+        qs.annotate(actual=_favorite_counts(field))
+        .exclude(like_count=F('actual'))
+        .values_list('pk', flat=True)
+    )
+    if dry_run or not drifted:
+        return drifted
+
+    model.objects.filter(pk__in=drifted).update(like_count=_favorite_counts(field))
+
+    def _invalidate():
+        for pk in drifted:
+            payload_cache.invalidate_body(kind, pk)
+
+    transaction.on_commit(_invalidate)
+    return drifted
+
+
+def recount_quote_likes(quote_ids=None, dry_run=False):
+    return _recount(Quote, 'quote_id', payload_cache.QUOTE, quote_ids, dry_run)
+
+
+def recount_campaign_likes(campaign_ids=None, dry_run=False):
+    from tracking.models import Campaign
+
+    return _recount(Campaign, 'campaign_id', payload_cache.CAMPAIGN, campaign_ids, dry_run)
+
+
+def link_client(user, client_id):
+    """client_id を user の端末として記録する（別のユーザーに紐づいていれば付け替える）"""
+    UserClient.objects.update_or_create(client_id=client_id, defaults={"user": user})
+
+
+def _linked_user():
+    """OuterRef('client_id') の端末が紐づいている User の ID"""
+    return Subquery(UserClient.objects.filter(client_id=OuterRef("client_id")).values("user_id")[:1])
+
+
+def merge_client_favorites(client_ids):
+    """
+    client_ids の匿名のいいねを、UserClient で紐づいた User に引き継ぐ。
+    行ごとのループはせず、次の数文の SQL で済ませる:
+
+    1. 引き継ぎ先の User が既に同じ対象をいいねしているもの、
+       同じ User に引き継ぐ匿名のいいね同士で重複しているもの（古い方を残す）を消す
+    2. 残りの user を紐づいた User にまとめて付け替える
+    3. 1 で消した分の like_count を数え直す
+
+    戻り値: (付け替えた件数, 重複として消した件数)
+    """
+    linked = UserClient.objects.filter(client_id__in=client_ids).values("client_id")
+    anonymous = Favorite.objects.filter(user=None, client_id__in=linked)
+
+    duplicate = Q()
+    annotated = anonymous.annotate(target_user=_linked_user())
+    for field in ("quote_id", "campaign_id"):
+        owned = Favorite.objects.filter(user_id=OuterRef("target_user"), **{field: OuterRef(field)})
+        earlier = (
+            Favorite.objects
+            # 今回引き継ぐ端末のいいねだけと比べる（同じ User の別の端末の分は対象外）
+            .filter(user=None, client_id__in=client_ids, id__lt=OuterRef("id"), **{field: OuterRef(field)})
+            .annotate(target_user=_linked_user())
+            .filter(target_user=OuterRef("target_user"))
+        )
+        duplicate |= Q(**{f"{field}__isnull": False}) & (Q(Exists(owned)) | Q(Exists(earlier)))
+    duplicates = annotated.filter(duplicate)
+
+    with transaction.atomic():
+        targets = list(duplicates.values_list("quote_id", "campaign_id").distinct())
+        removed, _ = Favorite.objects.filter(pk__in=duplicates.values("pk")).delete()
+        merged = anonymous.update(user_id=_linked_user())
+
+        quote_ids = {quote_id for quote_id, _ in targets if quote_id}
+        campaign_ids = {campaign_id for _, campaign_id in targets if campaign_id}
+        if quote_ids:
+            recount_quote_likes(quote_ids)
+        if campaign_ids:
+            recount_campaign_likes(campaign_ids)
+
+        UserClient.objects.filter(client_id__in=client_ids).update(merged_at=timezone.now())
+
+    return merged, removed
+
+
+def _toggle_postgres(model, target_field, target_id, owner):
+    """
+    DELETE ... RETURNING / INSERT ... ON CONFLICT DO NOTHING / UPDATE ... RETURNING を
+    1 文の CTE にまとめる。消せなければ（= まだ無ければ）作る。
+    同時に押されて INSERT が衝突した場合も、結果は「いいね済み」として返す
+    """
+    favorites = Favorite._meta.db_table
+    targets = model._meta.db_table
+    if owner["user"] is not None:
+        owner_column, owner_value, owner_cond = "user_id", owner["user"].pk, "user_id = %s"
+    else:
+        owner_column, owner_value, owner_cond = "client_id", owner["client_id"], "client_id = %s AND user_id IS NULL"
+
+    sql = f"""
+        WITH target AS (
+            SELECT id FROM {targets} WHERE id = %s
+        ), deleted AS (
+            DELETE FROM {favorites} WHERE {target_field} = %s AND {owner_cond}
+            RETURNING id
+        ), inserted AS (
+            INSERT INTO {favorites} ({target_field}, {owner_column}, created_at)
+            SELECT id, %s, now() FROM target WHERE NOT EXISTS (SELECT 1 FROM deleted)
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        ), counted AS (
+            UPDATE {targets}
+            SET like_count = GREATEST(
+                like_count + (SELECT count(*) FROM inserted) - (SELECT count(*) FROM deleted), 0
+            )
+            WHERE id IN (SELECT id FROM target)
+            RETURNING like_count
+        )
+        SELECT NOT EXISTS (SELECT 1 FROM deleted), (SELECT like_count FROM counted)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [target_id, target_id, owner_value, owner_value])
+        liked, like_count = cursor.fetchone()
+    if like_count is None:
+        return None
+    return liked, like_count
+
+
+def _toggle_stepwise(model, target_field, target_id, owner):
+    """PostgreSQL 以外: 同じことをトランザクション内で順に行う"""
+    targets = model.objects.filter(pk=target_id)
+    deleted, _ = Favorite.objects.filter(**{target_field: target_id}, **owner).delete()
+    liked = not deleted
+    if liked:
+        if not targets.exists():
+            return None
+        try:
+            with transaction.atomic():
+                Favorite.objects.create(**{target_field: target_id}, **owner)
+        except IntegrityError:
+            # 同時に押された別のリクエストが先に作った
+            return liked, targets.values_list("like_count", flat=True).first()
+    targets.update(like_count=Greatest(F("like_count") + (1 if liked else -deleted), 0))
+    return liked, targets.values_list("like_count", flat=True).first()
+
+
+def toggle_favorite(kind, target_id, user=None, client_id=None):
+    """
+    いいねを切り替える（user があれば user、無ければ client_id の主体として）。
+    戻り値: (liked, like_count)。対象が存在しなければ None
+    """
+    if kind == payload_cache.CAMPAIGN:
+        from tracking.models import Campaign
+
+        model, target_field = Campaign, "campaign_id"
+    else:
+        model, target_field = Quote, "quote_id"
+    owner = {"user": user} if user is not None else {"client_id": client_id, "user": None}
+
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            result = _toggle_postgres(model, target_field, target_id, owner)
+            # 生の SQL なので Favorite のシグナルが飛ばない。本体キャッシュはここで捨てる
+            if result is not None:
+                transaction.on_commit(lambda: payload_cache.invalidate_body(kind, target_id))
+        else:
+            result = _toggle_stepwise(model, target_field, target_id, owner)
+    return result
+
+
+def latest_states(changes):
+    """
+    [{"kind", "id", "liked", "ts"}] を対象ごとの最終状態 {(kind, id): liked} にまとめる。
+    ts が同じなら後に並んでいる方を採る
+    """
+    latest = {}
+    for order, change in enumerate(changes):
+        key = (change["kind"], change["id"])
+        stamp = (change["ts"], order)
+        if key not in latest or stamp >= latest[key][0]:
+            latest[key] = (stamp, change["liked"])
+    return {key: liked for key, (_, liked) in latest.items()}
+
+
+def favorite_ids(owner):
+    """owner のいいね済みの {"quotes": [...], "campaigns": [...]}"""
+    rows = Favorite.objects.filter(**owner).values_list("quote_id", "campaign_id")
+    quotes, campaigns = set(), set()
+    for quote_id, campaign_id in rows:
+        if campaign_id:
+            campaigns.add(campaign_id)
+        elif quote_id:
+            quotes.add(quote_id)
+    return {"quotes": sorted(quotes), "campaigns": sorted(campaigns)}
+
+
+def sync_favorites(changes, user=None, client_id=None):
+    """
+    オフライン中に溜めた「いいね / いいね解除」をまとめて反映する。
+    対象ごとに ts が最後の状態だけを採り、1 トランザクションで
+    bulk_create（衝突は無視）と DELETE 1 回ずつで揃え、like_count は触った対象だけ数え直す。
+
+    戻り値: {"added", "removed", "ignored"（存在しない対象）, "favorites"（反映後の全件）}
+    """
+    from tracking import campaign_index
+    from tracking.models import Campaign
+
+    owner = {"user": user} if user is not None else {"client_id": client_id, "user": None}
+    states = latest_states(changes)
+
+    wanted = {payload_cache.QUOTE: {}, payload_cache.CAMPAIGN: {}}
+    for (kind, target_id), liked in states.items():
+        wanted[kind][target_id] = liked
+
+    # 存在する対象だけに絞る（Campaign はインデックスで、Quote は 1 クエリで）
+    campaigns = campaign_index.get_index().by_id
+    existing_quotes = set(
+        Quote.objects.filter(pk__in=list(wanted[payload_cache.QUOTE])).values_list("pk", flat=True)
+    )
+    exists = {
+        payload_cache.QUOTE: existing_quotes,
+        payload_cache.CAMPAIGN: {pk for pk in wanted[payload_cache.CAMPAIGN] if pk in campaigns},
+    }
+    ignored = sorted(
+        ({"kind": kind, "id": pk} for kind, targets in wanted.items() for pk in targets if pk not in exists[kind]),
+        key=lambda item: (item["kind"], item["id"]),
+    )
+
+    fields = {payload_cache.QUOTE: "quote_id", payload_cache.CAMPAIGN: "campaign_id"}
+    added = removed = 0
+    with transaction.atomic():
+        for kind, field in fields.items():
+            like = [pk for pk, liked in wanted[kind].items() if liked and pk in exists[kind]]
+            unlike = [pk for pk, liked in wanted[kind].items() if not liked and pk in exists[kind]]
+            if not like and not unlike:
+                continue
+
+            mine = Favorite.objects.filter(**owner)
+            already = set(mine.filter(**{f"{field}__in": like}).values_list(field, flat=True))
+            Favorite.objects.bulk_create(
+                [Favorite(**{field: pk}, **owner) for pk in like if pk not in already],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts だと衝突して入らなかった行も戻り値に含まれるので、前後の件数の差を数える
+            if like:
+                added += mine.filter(**{f"{field}__in": like}).count() - len(already)
+            deleted, _ = mine.filter(**{f"{field}__in": unlike}).delete() if unlike else (0, None)
+            removed += deleted
+
+            # 同時に別のリクエストが同じ対象を切り替えていてもずれないよう、差分ではなく数え直す
+            if kind == payload_cache.CAMPAIGN:
+                _recount(Campaign, field, kind, like + unlike)
+            else:
+                _recount(Quote, field, kind, like + unlike)
+
+        favorites = favorite_ids(owner)
+
+    return {"added": added, "removed": removed, "ignored": ignored, "favorites": favorites}
@@ -0,0 +1,310 @@
+"""
+generate_month_quotes 用の部品。
+"""
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    スレッドセーフなトークンバケット。
+    rate 回/秒 のペースでトークンが溜まり（最大 capacity 個）、acquire() で 1 個使う。
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンが取れるまで待つ"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def text_key(text):
+    """重複判定用のテキストのハッシュ（全件をメモリに持つので本文ではなく digest を使う）"""
+    return hashlib.sha1(text.strip().encode()).digest()
+
+
+class Checkpoint:
+    """
+    生成済みの結果を 1 日 1 行の JSONL に追記していくファイル。
+    途中で落ちても、次回は書かれている日の API 呼び出しを省いて再開できる。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """{publish_date: 生成結果} を返す（ファイルが無ければ空）"""
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    publish_date = datetime.date.fromisoformat(entry.pop("publish_date"))
+                except (ValueError, KeyError):
+                    # 書き込み途中で落ちた最終行など
+                    continue
+                entries[publish_date] = entry
+        return entries
+
+    def append(self, publish_date, quote_obj):
+        line = json.dumps({"publish_date": publish_date.isoformat(), **quote_obj}, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ---------------------------------------------------------------------------
+# 生成バックエンド
+#
+# どれも complete(system_msg, user_msg) で JSON 文字列を返す。
+# 同じプロンプトでも毎回違う台詞が欲しいので、プロンプトごとに「何回目の呼び出しか」を
+# 数えて、キャッシュ・再生・フェイクのキーに含める。
+# ---------------------------------------------------------------------------
+
+
+class BackendError(Exception):
+    pass
+
+
+def prompt_key(model, system_msg, user_msg):
+    """モデルとプロンプトから決まるキー"""
+    payload = json.dumps([model, system_msg, user_msg], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def sample_key(key, sample):
+    """同じプロンプトの sample 回目の呼び出しを表すキー"""
+    return hashlib.sha256(f"{key}:{sample}".encode()).hexdigest()
+
+
+class _SampleCounter:
+    """プロンプトごとの呼び出し回数（スレッドセーフ）"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def next(self, key):
+        with self._lock:
+            n = self._counts.get(key, 0)
+            self._counts[key] = n + 1
+            return n
+
+
+class OpenAIBackend:
+    """OpenAI（互換）API を呼ぶ。rate_limiter があれば呼び出し前にトークンを取る"""
+
+    def __init__(self, client, model, rate_limiter=None):
+        self.client = client
+        self.model = model
+        self.rate_limiter = rate_limiter
+
+    def complete(self, system_msg, user_msg):
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        resp = self.client.chat.completions.create(
+            model=self.model,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_msg},
+                {"role": "user", "content": user_msg},
+            ],
+        )
+        return resp.choices[0].message.content
+
+
+class ReplayBackend:
+    """
+    RecordingBackend が書いた JSONL を再生する（ネットワーク不要）。
+    同じプロンプトの記録が複数あれば記録順に返し、使い切ったら BackendError
+    """
+
+    def __init__(self, path, model):
+        self.model = model
+        self._records = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                self._records.setdefault(record["key"], []).append(record["content"])
+        self._counter = _SampleCounter()
+
+    def complete(self, system_msg, user_msg):
+        key = prompt_key(self.model, system_msg, user_msg)
+        n = self._counter.next(key)
+        contents = self._records.get(key, [])
+        if n >= len(contents):
+            raise BackendError(f"記録済みのレスポンスがありません（{n + 1} 回目）")
+        return contents[n]
+
+
+class FakeBackend:
+    """プロンプトと seed だけから決まるレスポンスを返す（CI・ベンチマーク用）"""
+
+    def __init__(self, model, seed=0):
+        self.model = model
+        self.seed = seed
+        self._counter = _SampleCounter()
+
+    def complete(self, system_msg, user_msg):
+        key = prompt_key(self.model, system_msg, user_msg)
+        digest = sample_key(f"{self.seed}:{key}", self._counter.next(key))
+        return json.dumps({
+            "text_ja": f"フェイクの台詞 {digest[:12]}",
+            "text_original": f"Fake line {digest[:12]}",
+            "source_ja": f"フェイク作品 {digest[12:16]}",
+            "source_original": f"Fake Play {digest[12:16]}",
+            "wiki_url": "",
+        }, ensure_ascii=False)
+
+
+class RecordingBackend:
+    """backend のレスポンスを ReplayBackend で読める JSONL に追記する"""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.model = backend.model
+        self.path = path
+        self._lock = threading.Lock()
+
+    def complete(self, system_msg, user_msg):
+        content = self.backend.complete(system_msg, user_msg)
+        line = json.dumps({
+            "key": prompt_key(self.model, system_msg, user_msg),
+            "model": self.model,
+            "system": system_msg,
+            "user": user_msg,
+            "content": content,
+        }, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        return content
+
+
+class ResponseCache:
+    """
+    レスポンスをキーごとに 1 ファイルで保存するディスクキャッシュ。
+    ttl 秒より古いものは使わず、合計が max_bytes を超えたら古いものから消す。
+    """
+
+    def __init__(self, directory, ttl, max_bytes):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None  # 初回の書き込み時に数える
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._entries())
+            try:
+                self._total -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp, path)
+            self._total += os.path.getsize(path)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """(mtime, size, path) を列挙する"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def _evict(self):
+        # 上限ぴったりまで消すと毎回走るので、9 割まで減らす
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries())
+        self._total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total -= size
+
+
+class CachedBackend:
+    """backend の前に ResponseCache を置く。ヒットしたときは backend（と流量制限）を通らない"""
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.model = backend.model
+        self.cache = cache
+        self._counter = _SampleCounter()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def complete(self, system_msg, user_msg):
+        key = prompt_key(self.model, system_msg, user_msg)
+        cache_key = sample_key(key, self._counter.next(key))
+        content = self.cache.get(cache_key)
+        with self._stats_lock:
+            if content is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if content is not None:
+            return content
+        content = self.backend.complete(system_msg, user_msg)
+        self.cache.set(cache_key, content)
+        return content
@@ -0,0 +1,20 @@
+"""
+Quote から作る派生データ（近似重複のシグネチャ・検索用 bigram・正規化したタグ）の更新。
+保存時は quotes/signals.py から、bulk_create した場合は呼び出し側から使う。
+"""
+from . import search, similarity, tags
+
+
+def update_quote_indexes(quotes):
+    """保存済みの quotes の派生データをまとめて作り直す（bulk_create の後など）"""
+    quotes = list(quotes)
+    similarity.index_quotes(quotes)
+    search.index_quotes(quotes)
+    tags.sync_tags(quotes)
+
+
+def update_quote_index(quote):
+    """1 件分を更新する（変わっていないものは触らない）"""
+    similarity.index_quote(quote)
+    search.index_quote(quote)
+    tags.sync_quote_tags(quote)
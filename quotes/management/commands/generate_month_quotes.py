@@ -4,15 +4,31 @@ import calendar
 import datetime
 import json
 import random
-import time
+import threading
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connection, transaction
 
 from openai import OpenAI
 
+from quotes import cache as payload_cache
+from quotes.generation import (
+    CachedBackend,
+    Checkpoint,
+    FakeBackend,
+    OpenAIBackend,
+    RecordingBackend,
+    ReplayBackend,
+    ResponseCache,
+    TokenBucket,
+    text_key,
+)
+from quotes.indexes import update_quote_indexes
 from quotes.models import Quote
+from quotes.similarity import DEFAULT_THRESHOLD, SimilarityIndex
 
 
 # パブリックドメインの劇作家たち
@@ -51,6 +67,9 @@ PLAYWRIGHTS = [
 
 MODEL_NAME = "gpt-4o-mini"  # gpt-5.1-miniが利用できない場合はこちらを使用
 
+# API 呼び出しの既定の上限（回/秒）。以前の「1日ごとに 1.2 秒待つ」と同程度
+DEFAULT_RATE = 0.8
+
 
 class Command(BaseCommand):
     help = "指定した年月の『今日の名台詞』を、パブリックドメインの劇作家から自動生成する。"
@@ -68,158 +87,391 @@ class Command(BaseCommand):
             nargs="?",
             help="生成対象の月 (1〜12)。省略時は今月。",
         )
+        parser.add_argument(
+            "--whole-year",
+            action="store_true",
+            help="month を無視して 1〜12 月をまとめて生成する",
+        )
         parser.add_argument(
             "--dry-run",
             action="store_true",
             help="DBに保存せず、生成内容だけコンソールに表示する",
         )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="同時に生成する日数（既定: 1 = 1日ずつ）",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=DEFAULT_RATE,
+            help=f"API 呼び出しの上限（回/秒、既定: {DEFAULT_RATE}）",
+        )
+        parser.add_argument(
+            "--burst",
+            type=int,
+            default=1,
+            help="--rate を超えて連続で呼べる回数（既定: 1）",
+        )
+        parser.add_argument(
+            "--base-url",
+            default=os.environ.get("OPENAI_BASE_URL"),
+            help="OpenAI 互換 API の URL（ローカルのスタブサーバーで試す場合など）",
+        )
+        parser.add_argument(
+            "--backend",
+            choices=["openai", "replay", "fake"],
+            default="openai",
+            help="生成に使うバックエンド（既定: openai）。replay は --replay の記録を再生、fake は API を呼ばない決まった出力",
+        )
+        parser.add_argument(
+            "--replay",
+            help="--backend replay で再生する JSONL（--record で書いたもの）",
+        )
+        parser.add_argument(
+            "--record",
+            help="バックエンドのレスポンスをこの JSONL に追記する（--backend replay で再生できる）",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="劇作家の選択と fake バックエンドの出力を固定する乱数シード",
+        )
+        parser.add_argument(
+            "--cache",
+            action="store_true",
+            help=(
+                "API レスポンスをディスクにキャッシュして再利用する（--dry-run の試行や中断後のやり直し用）。"
+                "採用済みの台詞も同じ順に返るので、登録まで行う通常の実行では付けない"
+            ),
+        )
+        parser.add_argument(
+            "--cache-dir",
+            default=settings.QUOTE_GENERATION_CACHE_DIR,
+            help="API レスポンスのディスクキャッシュの置き場所",
+        )
+        parser.add_argument(
+            "--similarity-threshold",
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help=f"既存・生成済みの台詞とこの類似度以上なら近似重複として再生成する（既定: {DEFAULT_THRESHOLD}）",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="生成結果を逐次書き出す JSONL ファイル。既にあれば書かれている日は API を呼ばずに再利用する",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="bulk_create の batch_size（既定: 500）",
+        )
+        parser.add_argument(
+            "--flush-every",
+            type=int,
+            default=10,
+            help="採用した台詞をこの件数ごとに DB へ保存する（途中で落ちても保存済みの分は残る。既定: 10）",
+        )
 
     def handle(self, *args, **options):
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            raise CommandError("環境変数 OPENAI_API_KEY が設定されていません。")
-
-        client = OpenAI(api_key=api_key)
-
         today = datetime.date.today()
         year = options["year"] or today.year
         month = options["month"] or today.month
         dry_run = options["dry_run"]
+        concurrency = options["concurrency"]
 
         if not (1 <= month <= 12):
             raise CommandError("month は 1〜12 で指定してください。")
-
-        _, num_days = calendar.monthrange(year, month)
+        if concurrency < 1:
+            raise CommandError("--concurrency は 1 以上で指定してください。")
+        if options["rate"] <= 0:
+            raise CommandError("--rate は 0 より大きい値で指定してください。")
+        if options["flush_every"] < 1:
+            raise CommandError("--flush-every は 1 以上で指定してください。")
+
+        self._seed = options["seed"]
+        self._backend = self._make_backend(options)
+
+        months = range(1, 13) if options["whole_year"] else [month]
+        all_dates = [
+            datetime.date(year, m, day)
+            for m in months
+            for day in range(1, calendar.monthrange(year, m)[1] + 1)
+        ]
+        label = f"{year}年" if options["whole_year"] else f"{year}-{month:02d}"
 
         self.stdout.write(
             self.style.NOTICE(
-                f"=== {year}-{month:02d} の名台詞を自動生成します（{num_days}日分） dry_run={dry_run} ==="
+                f"=== {label} の名台詞を自動生成します（{len(all_dates)}日分） "
+                f"dry_run={dry_run} backend={options['backend']} "
+                f"concurrency={concurrency} rate={options['rate']}/s ==="
             )
         )
 
-        created_count = 0
+        self._dry_run = dry_run
+        self._output_lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+
+        # 登録済みの日付と既存テキストは最初に一度だけ読み、以降はメモリ上で判定する（dry-runモードでは読まない）
+        occupied_dates = set()
+        # 既存・生成中（未保存）のものも含めて、採用済みの日本語テキストのハッシュと近似重複の検索用インデックス
+        self._claimed_texts = set()
+        self._similar_index = SimilarityIndex()
+        self._similarity_threshold = options["similarity_threshold"]
+        if not dry_run:
+            try:
+                occupied_dates = set(
+                    Quote.objects
+                    .filter(publish_date__range=(all_dates[0], all_dates[-1]))
+                    .values_list("publish_date", flat=True)
+                )
+                self._claimed_texts = {
+                    text_key(text)
+                    for text in Quote.objects.values_list("text", flat=True).iterator(chunk_size=2000)
+                }
+                self._similar_index = SimilarityIndex.from_db()
+            except Exception as e:
+                self._write(self.style.WARNING(f"[DB接続エラー] {e} - dry-runモードで続行します"))
+                occupied_dates = set()
+                self._claimed_texts = set()
+                self._similar_index = SimilarityIndex()
+
+        checkpoint = Checkpoint(options["checkpoint"]) if options["checkpoint"] else None
+        resumed = checkpoint.load() if checkpoint else {}
+
+        dates = []
+        # (publish_date, 生成結果) のうち、API を呼ばずに済むもの
+        reused = []
+        for publish_date in all_dates:
+            # すでにその日のQuoteがあるならスキップ
+            if publish_date in occupied_dates:
+                self._write(self.style.WARNING(f"[SKIP] {publish_date} は既に登録済み"))
+                continue
+            quote_obj = resumed.get(publish_date)
+            if quote_obj and self._claim_text(quote_obj["text_ja"], quote_obj["text_original"]) is None:
+                self._write(self.style.NOTICE(f"[RESUME] {publish_date} はチェックポイントから再利用"))
+                reused.append((publish_date, quote_obj))
+                continue
+            dates.append(publish_date)
+
+        if concurrency == 1:
+            generated = ((d, self._generate_for_date(d)) for d in dates)
+        else:
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="generate")
+            futures = {executor.submit(self._generate_in_thread, d): d for d in dates}
+            generated = ((futures[f], f.result()) for f in as_completed(futures))
+
+        # 最後にまとめて保存すると途中で落ちたときに全部失うので、--flush-every 件ごとに保存する
+        pending = []
+        saved = 0
+        try:
+            for publish_date, quote_obj in reused:
+                if self._accept(publish_date, quote_obj):
+                    pending.append(self._build_quote(publish_date, quote_obj))
+            for publish_date, quote_obj in generated:
+                if quote_obj and checkpoint:
+                    checkpoint.append(publish_date, quote_obj)
+                if self._accept(publish_date, quote_obj):
+                    pending.append(self._build_quote(publish_date, quote_obj))
+                if len(pending) >= options["flush_every"]:
+                    saved += self._save(pending, options["batch_size"])
+                    pending = []
+        finally:
+            if concurrency > 1:
+                executor.shutdown(wait=True, cancel_futures=True)
+        if pending:
+            saved += self._save(pending, options["batch_size"])
+
+        if isinstance(self._backend, CachedBackend):
+            self.stdout.write(
+                f"キャッシュ: ヒット {self._backend.hits} 件 / API 呼び出し {self._backend.misses} 件"
+            )
 
-        for day in range(1, num_days + 1):
-            publish_date = datetime.date(year, month, day)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"=== 完了: {label} に {saved} 件の名台詞を生成しました ==="
+            )
+        )
 
-            # すでにその日のQuoteがあるならスキップ（dry-runモードではスキップ）
-            if not dry_run:
-                try:
-                    if Quote.objects.filter(publish_date=publish_date).exists():
-                        self.stdout.write(
-                            self.style.WARNING(f"[SKIP] {publish_date} は既に登録済み")
-                        )
-                        continue
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.WARNING(f"[DB接続エラー] {e} - dry-runモードで続行します")
-                    )
+    def _save(self, quotes, batch_size):
+        """採用した台詞を保存して件数を返す"""
+        quotes.sort(key=lambda q: q.publish_date)
+        with transaction.atomic():
+            Quote.objects.bulk_create(quotes, batch_size=batch_size)
+            # post_save が飛ばないので近似重複のシグネチャ・検索用 bigram・タグもここで作る
+            update_quote_indexes(quotes)
+            # bulk_create では post_save が飛ばないので、日付 → 表示対象のキャッシュはここで捨てる
+            transaction.on_commit(payload_cache.invalidate_dates)
+        return len(quotes)
+
+    def _make_backend(self, options):
+        kind = options["backend"]
+        if kind == "fake":
+            backend = FakeBackend(MODEL_NAME, seed=options["seed"] or 0)
+        elif kind == "replay":
+            if not options["replay"]:
+                raise CommandError("--backend replay には --replay で JSONL を指定してください。")
+            try:
+                backend = ReplayBackend(options["replay"], MODEL_NAME)
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"--replay を読み込めません: {e}")
+        else:
+            api_key = os.environ.get("OPENAI_API_KEY")
+            if not api_key:
+                raise CommandError("環境変数 OPENAI_API_KEY が設定されていません。")
+            client = OpenAI(api_key=api_key, base_url=options["base_url"])
+            rate_limiter = TokenBucket(options["rate"], options["burst"])
+            backend = OpenAIBackend(client, MODEL_NAME, rate_limiter)
+            if options["cache"]:
+                cache = ResponseCache(
+                    options["cache_dir"],
+                    ttl=settings.QUOTE_GENERATION_CACHE_TTL,
+                    max_bytes=settings.QUOTE_GENERATION_CACHE_MAX_BYTES,
+                )
+                backend = CachedBackend(backend, cache)
 
-            # 重複回避のため、何度か試行
-            quote_obj = None
-            for attempt in range(5):
-                playwright = random.choice(PLAYWRIGHTS)
-                try:
-                    data = self._fetch_quote_from_openai(client, playwright)
-                    # dry-runモードでは取得したJSONを表示
-                    if dry_run:
-                        self.stdout.write(
-                            self.style.NOTICE(
-                                f"[JSON取得] {playwright['name_ja']}:\n{json.dumps(data, ensure_ascii=False, indent=2)}"
-                            )
-                        )
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f"[ERROR] {publish_date} {playwright['name_ja']} 取得失敗: {e}"
-                        )
-                    )
-                    time.sleep(2)
-                    continue
-
-                text_ja = data.get("text_ja", "").strip()
-                source_ja = data.get("source_ja", "").strip()
-                text_original = data.get("text_original", "").strip()
-                source_original = data.get("source_original", "").strip()
-                wiki_url = data.get("wiki_url", "").strip()
-
-                if not text_ja or not source_ja:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"[RETRY] {publish_date} {playwright['name_ja']} 不完全なデータのため再試行"
+        if options["record"]:
+            backend = RecordingBackend(backend, options["record"])
+        return backend
+
+    def _write(self, message):
+        # ワーカースレッドからも呼ばれるので行単位で排他する
+        with self._output_lock:
+            self.stdout.write(message)
+
+    def _claim_text(self, text_ja, text_original=""):
+        """
+        既存・生成中のどれとも（近似）重複していなければ text_ja を確保して None を返す。
+        重複していればその理由を返す。
+        並行して生成していても同じテキストを 2 日に採用しないよう、確認と確保を同時に行う
+        """
+        key = text_key(text_ja)
+        with self._claim_lock:
+            if key in self._claimed_texts:
+                return "重複テキスト検知"
+            similar = self._similar_index.similar(text_ja, text_original, self._similarity_threshold)
+            if similar:
+                return f"近似重複検知（類似度 {similar[0][1]:.2f}）"
+            self._claimed_texts.add(key)
+            self._similar_index.add(key, text_ja, text_original)
+            return None
+
+    def _generate_in_thread(self, publish_date):
+        try:
+            return self._generate_for_date(publish_date)
+        finally:
+            # ワーカースレッドの DB 接続を残さない
+            connection.close()
+
+    def _random_for(self, publish_date):
+        """
+        日ごとの乱数。ワーカースレッド間で 1 つの Random を共有しないよう、日ごとに作る。
+        --seed があれば日付と組み合わせるので、並列数や完了順によらず同じ劇作家の並びになる
+        """
+        if self._seed is None:
+            return random.Random()
+        return random.Random(f"{self._seed}:{publish_date.isoformat()}")
+
+    def _generate_for_date(self, publish_date):
+        """1日分を生成する（重複回避のため最大5回試行）。失敗したら None"""
+        rng = self._random_for(publish_date)
+        for attempt in range(5):
+            playwright = rng.choice(PLAYWRIGHTS)
+            try:
+                data = self._fetch_quote(playwright)
+                # dry-runモードでは取得したJSONを表示
+                if self._dry_run:
+                    self._write(
+                        self.style.NOTICE(
+                            f"[JSON取得] {playwright['name_ja']}:\n{json.dumps(data, ensure_ascii=False, indent=2)}"
                         )
                     )
-                    continue
-
-                # 既存と同じ日本語テキストなら再試行（dry-runモードではスキップ）
-                if not dry_run:
-                    try:
-                        if Quote.objects.filter(text=text_ja).exists():
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f"[RETRY] {publish_date} 重複テキスト検知 → 再生成"
-                                )
-                            )
-                            continue
-                    except Exception:
-                        pass  # DB接続エラー時はスキップ
-
-                # ここまで来たらOK
-                quote_obj = {
-                    "playwright": playwright,
-                    "text_ja": text_ja,
-                    "source_ja": source_ja,
-                    "text_original": text_original,
-                    "source_original": source_original,
-                    "wiki_url": wiki_url,
-                }
-                break
-
-            if not quote_obj:
-                self.stdout.write(
+            except Exception as e:
+                self._write(
                     self.style.ERROR(
-                        f"[FAIL] {publish_date} 分の生成に5回失敗しました。手動で対応してください。"
+                        f"[ERROR] {publish_date} {playwright['name_ja']} 取得失敗: {e}"
                     )
                 )
                 continue
 
-            pw = quote_obj["playwright"]
-            msg = f"{publish_date} | {pw['name_ja']} / {quote_obj['source_ja']} | {quote_obj['text_ja'][:40]}..."
-
-            if dry_run:
-                self.stdout.write(self.style.NOTICE(f"[DRY-RUN] {msg}"))
-            else:
-                with transaction.atomic():
-                    Quote.objects.create(
-                        text=quote_obj["text_ja"],
-                        original_text=quote_obj["text_original"],
-                        author_name=pw["name_ja"],
-                        source=quote_obj["source_ja"],
-                        original_source=quote_obj["source_original"],
-                        category="classic",
-                        tags=f"戯曲,{pw['name_ja']}",
-                        publish_date=publish_date,
-                        is_public_domain=True,
-                        amazon_key="青空文庫",
-                        wiki_key=quote_obj["wiki_url"],
-                        bg_image_url="",
-                        like_count=0,
+            text_ja = data.get("text_ja", "").strip()
+            source_ja = data.get("source_ja", "").strip()
+            text_original = data.get("text_original", "").strip()
+            source_original = data.get("source_original", "").strip()
+            wiki_url = data.get("wiki_url", "").strip()
+
+            if not text_ja or not source_ja:
+                self._write(
+                    self.style.WARNING(
+                        f"[RETRY] {publish_date} {playwright['name_ja']} 不完全なデータのため再試行"
                     )
-                self.stdout.write(self.style.SUCCESS(f"[OK] {msg}"))
-                created_count += 1
+                )
+                continue
 
-            # API叩きすぎ防止のためちょっとだけ待つ
-            time.sleep(1.2)
+            conflict = self._claim_text(text_ja, text_original)
+            if conflict:
+                self._write(
+                    self.style.WARNING(
+                        f"[RETRY] {publish_date} {conflict} → 再生成"
+                    )
+                )
+                continue
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"=== 完了: {year}-{month:02d} に {created_count} 件の名台詞を生成しました ==="
+            # ここまで来たらOK
+            return {
+                "playwright": playwright,
+                "text_ja": text_ja,
+                "source_ja": source_ja,
+                "text_original": text_original,
+                "source_original": source_original,
+                "wiki_url": wiki_url,
+            }
+
+        return None
+
+    def _accept(self, publish_date, quote_obj):
+        """生成結果を採用するか判定して表示する（メインスレッドから呼ぶ）。保存対象なら True"""
+        if not quote_obj:
+            self._write(
+                self.style.ERROR(
+                    f"[FAIL] {publish_date} 分の生成に5回失敗しました。手動で対応してください。"
+                )
             )
+            return False
+
+        pw = quote_obj["playwright"]
+        msg = f"{publish_date} | {pw['name_ja']} / {quote_obj['source_ja']} | {quote_obj['text_ja'][:40]}..."
+
+        if self._dry_run:
+            self._write(self.style.NOTICE(f"[DRY-RUN] {msg}"))
+            return False
+
+        self._write(self.style.SUCCESS(f"[OK] {msg}"))
+        return True
+
+    def _build_quote(self, publish_date, quote_obj):
+        pw = quote_obj["playwright"]
+        return Quote(
+            text=quote_obj["text_ja"],
+            original_text=quote_obj["text_original"],
+            author_name=pw["name_ja"],
+            source=quote_obj["source_ja"],
+            original_source=quote_obj["source_original"],
+            category="classic",
+            tags=f"戯曲,{pw['name_ja']}",
+            publish_date=publish_date,
+            is_public_domain=True,
+            amazon_key="青空文庫",
+            wiki_key=quote_obj["wiki_url"],
+            bg_image_url="",
+            like_count=0,
         )
 
-    def _fetch_quote_from_openai(self, client: OpenAI, playwright: dict) -> dict:
+    def _fetch_quote(self, playwright: dict) -> dict:
         """
-        OpenAI から JSON 形式で 1件の名台詞データを取得する。
+        バックエンド（既定は OpenAI）から JSON 形式で 1件の名台詞データを取得する。
         戻り値の例:
         {
           "text_ja": "（原文の意味を噛み砕いた日本語の意訳・解釈文）",
@@ -271,16 +523,7 @@ class Command(BaseCommand):
 }}
         """.strip()
 
-        resp = client.chat.completions.create(
-            model=MODEL_NAME,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg},
-            ],
-        )
-
-        content = resp.choices[0].message.content
+        content = self._backend.complete(system_msg, user_msg)
         data = json.loads(content)
         return {
             "text_ja": data.get("text_ja", ""),
@@ -0,0 +1,115 @@
+#management/commands/merge_client_favorites.py
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+
+from quotes.favorites import merge_client_favorites
+from quotes.models import Favorite, User, UserClient
+
+
+class Command(BaseCommand):
+    help = (
+        "UserClient で User に紐づいた端末の匿名（client_id）のいいねを User に引き継ぐ。"
+        "サインイン時の引き継ぎより前のデータ用に、端末をまとめて少しずつ処理する。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mapping",
+            help="client_id,user_id の CSV（ヘッダー行あり）。先に UserClient として取り込んでから引き継ぐ",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="1 トランザクションで処理する端末数（既定: 500）",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="引き継がず、対象の端末数と匿名のいいね数だけ表示する",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size は 1 以上で指定してください。")
+
+        if options["mapping"]:
+            self._import_mapping(options["mapping"], options["dry_run"])
+
+        pending = (
+            UserClient.objects
+            .filter(Exists(Favorite.objects.filter(user=None, client_id=OuterRef("client_id"))))
+            .order_by("pk")
+        )
+
+        if options["dry_run"]:
+            favorites = Favorite.objects.filter(user=None, client_id__in=pending.values("client_id"))
+            self.stdout.write(
+                self.style.NOTICE(
+                    f"[DRY-RUN] 対象の端末 {pending.count()} 件 / 匿名のいいね {favorites.count()} 件"
+                )
+            )
+            return
+
+        total_merged = total_removed = clients = 0
+        last_pk = 0
+        while True:
+            chunk = list(pending.filter(pk__gt=last_pk).values_list("pk", "client_id")[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            merged, removed = merge_client_favorites([client_id for _, client_id in chunk])
+            clients += len(chunk)
+            total_merged += merged
+            total_removed += removed
+            self.stdout.write(f"  端末 {clients} 件まで処理（付け替え {total_merged} / 重複削除 {total_removed}）")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"=== 完了: 端末 {clients} 件、いいね {total_merged} 件を引き継ぎ、重複 {total_removed} 件を削除 ==="
+            )
+        )
+
+    def _import_mapping(self, path, dry_run):
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = [
+                    (row["client_id"].strip(), int(row["user_id"]))
+                    for row in csv.DictReader(f)
+                    if row.get("client_id", "").strip()
+                ]
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"--mapping を読み込めません: {e}")
+
+        # 同じ client_id が複数行あると ON CONFLICT DO UPDATE が同じ行を 2 回更新しようとして失敗するので、
+        # 最後の行だけ残す
+        latest = dict(rows)
+        duplicated = len(rows) - len(latest)
+
+        user_ids = set(User.objects.filter(pk__in=set(latest.values())).values_list("pk", flat=True))
+        links = [
+            UserClient(client_id=client_id, user_id=user_id)
+            for client_id, user_id in latest.items()
+            if user_id in user_ids
+        ]
+        skipped = len(latest) - len(links)
+
+        if not dry_run:
+            UserClient.objects.bulk_create(
+                links,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=["client_id"],
+                update_fields=["user"],
+            )
+        label = "取り込み対象" if dry_run else "取り込み"
+        self.stdout.write(
+            self.style.NOTICE(
+                f"[MAPPING] {len(links)} 件の端末を{label}"
+                f"（存在しないユーザー {skipped} 件はスキップ、重複した client_id {duplicated} 行は最後の行を採用）"
+            )
+        )
@@ -0,0 +1,28 @@
+#management/commands/reconcile_like_counts.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from quotes.favorites import recount_campaign_likes, recount_quote_likes
+
+
+class Command(BaseCommand):
+    help = "Quote / Campaign の like_count を Favorite の件数から数え直し、ずれている行だけまとめて直す。"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="更新せず、ずれている件数だけ表示する",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+
+        with transaction.atomic():
+            quote_ids = recount_quote_likes(dry_run=dry_run)
+            campaign_ids = recount_campaign_likes(dry_run=dry_run)
+
+        label = "ずれ検出" if dry_run else "修正"
+        self.stdout.write(self.style.SUCCESS(f"[{label}] Quote: {len(quote_ids)} 件"))
+        self.stdout.write(self.style.SUCCESS(f"[{label}] Campaign: {len(campaign_ids)} 件"))
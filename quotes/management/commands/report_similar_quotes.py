@@ -0,0 +1,74 @@
+#management/commands/report_similar_quotes.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from quotes.models import Quote
+from quotes.similarity import DEFAULT_THRESHOLD, find_clusters, index_quotes
+
+
+class Command(BaseCommand):
+    help = "登録済みの Quote のうち、本文・原文が近似重複しているもののまとまりを表示する。"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help=f"この類似度以上を近似重複とみなす（既定: {DEFAULT_THRESHOLD}）",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="先に全 Quote のシグネチャを作り直す",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="--rebuild で一度に作り直す件数（既定: 500）",
+        )
+
+    def handle(self, *args, **options):
+        threshold = options["threshold"]
+        if not (0 < threshold <= 1):
+            raise CommandError("--threshold は 0 より大きく 1 以下で指定してください。")
+
+        if options["rebuild"]:
+            self._rebuild(options["chunk_size"])
+
+        clusters = find_clusters(threshold)
+        quote_ids = {pk for cluster in clusters for pk in cluster["quote_ids"]}
+        quotes = Quote.objects.only("publish_date", "author_name", "text").in_bulk(quote_ids)
+
+        for cluster in clusters:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"--- {len(cluster['quote_ids'])} 件（最大類似度 {cluster['score']:.2f}） ---"
+                )
+            )
+            for pk in cluster["quote_ids"]:
+                quote = quotes.get(pk)
+                if quote:
+                    self.stdout.write(f"  #{pk} {quote.publish_date} {quote.author_name} | {quote.text[:40]}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"=== 近似重複のまとまり {len(clusters)} 件（{len(quote_ids)} 件の Quote） ===")
+        )
+
+    def _rebuild(self, chunk_size):
+        done = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                Quote.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .only("text", "original_text")[:chunk_size]
+            )
+            if not chunk:
+                break
+            with transaction.atomic():
+                index_quotes(chunk)
+            done += len(chunk)
+            last_pk = chunk[-1].pk
+        self.stdout.write(self.style.NOTICE(f"[REBUILD] {done} 件のシグネチャを作り直しました"))
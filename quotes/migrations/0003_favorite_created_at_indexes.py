@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0002_favorite_campaign_id_alter_favorite_quote_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='quotes_favo_user_id_5f8c04_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['client_id', '-created_at', '-id'], name='quotes_favo_client__362a88_idx'),
+        ),
+    ]
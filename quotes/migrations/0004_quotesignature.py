@@ -0,0 +1,116 @@
+# Generated by Django 5.2 on 2026-10-18 15:03
+
+import hashlib
+import random
+import struct
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# quotes/similarity.py のこの時点の実装（アプリ側を変えても、このマイグレーションの結果は変わらないようにする）
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+FIELDS = ('text', 'original_text')
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+del _rng
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ''.join(ch for ch in text if unicodedata.category(ch)[0] in 'LN')
+
+
+def shingles(text):
+    text = normalize(text)
+    if not text:
+        return set()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def signature(text):
+    hashes = [_hash64(s) for s in shingles(text)]
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def buckets(sig, field):
+    result = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            f"{field}:{band}:{','.join(map(str, rows))}".encode(), digest_size=8
+        ).digest()
+        result.append(struct.unpack('>q', digest)[0])
+    return result
+
+
+def pack(sig):
+    return struct.pack(f'>{NUM_PERM}Q', *sig)
+
+
+def signatures_for(text, original_text):
+    sigs = {}
+    for field, value in zip(FIELDS, (text, original_text)):
+        sig = signature(value)
+        if sig is not None:
+            sigs[field] = sig
+    return sigs
+
+
+def backfill_signatures(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    QuoteSignature = apps.get_model('quotes', 'QuoteSignature')
+    QuoteSignatureBand = apps.get_model('quotes', 'QuoteSignatureBand')
+
+    rows = Quote.objects.order_by('pk').values_list('pk', 'text', 'original_text')
+    for pk, text, original_text in rows.iterator(chunk_size=500):
+        for field, sig in signatures_for(text, original_text).items():
+            signature = QuoteSignature.objects.create(quote_id=pk, field=field, minhash=pack(sig))
+            QuoteSignatureBand.objects.bulk_create(
+                [QuoteSignatureBand(signature_id=signature.pk, bucket=b) for b in buckets(sig, field)]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0003_favorite_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuoteSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('text', '台詞本文'), ('original_text', '原文の台詞')], max_length=20, verbose_name='対象フィールド')),
+                ('minhash', models.BinaryField(verbose_name='MinHash シグネチャ')),
+                ('quote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signatures', to='quotes.quote', verbose_name='台詞')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuoteSignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True)),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='quotes.quotesignature')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='quotesignature',
+            constraint=models.UniqueConstraint(fields=('quote', 'field'), name='quotes_signature_unique_field'),
+        ),
+        migrations.RunPython(backfill_signatures, migrations.RunPython.noop),
+    ]
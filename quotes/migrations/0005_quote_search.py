@@ -0,0 +1,73 @@
+# Generated by Django 5.2 on 2026-10-18 15:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 検索対象の列と bigram の取り方（この時点の quotes/search.py の複製。後で検索側を変えても影響しない）
+FIELDS = ('text', 'author_name', 'source', 'tags', 'original_text', 'original_source')
+_SEPARATOR = '\n'
+
+
+def bigrams(value):
+    value = value.lower()
+    return {value[i:i + 2] for i in range(len(value) - 1)}
+
+
+def document_grams(quote):
+    grams = set()
+    for field in FIELDS:
+        grams |= bigrams((getattr(quote, field) or '') + _SEPARATOR)
+    return grams
+
+
+TRIGRAM_INDEX = 'quotes_quote_{}_trgm'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # icontains が生成する UPPER("列"::text) LIKE UPPER(...) に効く式インデックス
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for field in FIELDS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX.format(field)} '
+                f'ON quotes_quote USING gin ((UPPER("{field}"::text)) gin_trgm_ops)'
+            )
+        return
+
+    Quote = apps.get_model('quotes', 'Quote')
+    QuoteSearchGram = apps.get_model('quotes', 'QuoteSearchGram')
+    grams = []
+    for quote in Quote.objects.only(*FIELDS).iterator(chunk_size=500):
+        grams.extend(QuoteSearchGram(quote_id=quote.pk, gram=gram) for gram in document_grams(quote))
+        if len(grams) >= 5000:
+            QuoteSearchGram.objects.bulk_create(grams)
+            grams = []
+    QuoteSearchGram.objects.bulk_create(grams)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for field in FIELDS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX.format(field)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0004_quotesignature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuoteSearchGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=2)),
+                ('quote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_grams', to='quotes.quote')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('gram', 'quote'), name='quotes_search_gram_unique')],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
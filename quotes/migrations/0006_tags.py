@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-18 15:07
+
+import django.db.models.deletion
+
+from django.db import migrations, models
+
+
+def split_tags(value):
+    names = []
+    for name in (value or '').split(','):
+        name = name.strip()[:50]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def backfill_tags(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    Tag = apps.get_model('quotes', 'Tag')
+    QuoteTag = apps.get_model('quotes', 'QuoteTag')
+
+    wanted = {pk: split_tags(tags) for pk, tags in Quote.objects.exclude(tags='').values_list('pk', 'tags')}
+    names = {name for names in wanted.values() for name in names}
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.values_list('name', 'id'))
+    QuoteTag.objects.bulk_create(
+        [
+            QuoteTag(quote_id=pk, tag_id=tag_ids[name], position=position)
+            for pk, names in wanted.items()
+            for position, name in enumerate(names)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0005_quote_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='タグ名')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'タグ',
+                'verbose_name_plural': 'タグ',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuoteTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('quote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quote_tags', to='quotes.quote')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quote_tags', to='quotes.tag')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='quote',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='quotes', through='quotes.QuoteTag', to='quotes.tag', verbose_name='タグ'),
+        ),
+        migrations.AddConstraint(
+            model_name='quotetag',
+            constraint=models.UniqueConstraint(fields=('tag', 'quote'), name='quotes_quotetag_unique'),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 15:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0006_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserClient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_id', models.CharField(max_length=64, unique=True, verbose_name='クライアントID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('merged_at', models.DateTimeField(blank=True, null=True, verbose_name='いいねを引き継いだ日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clients', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'ユーザーの端末',
+                'verbose_name_plural': 'ユーザーの端末',
+            },
+        ),
+    ]
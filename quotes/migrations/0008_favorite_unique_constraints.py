@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 15:11
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    """制約を付ける前に、同じ主体・同じ対象の重複を消す（古い方を残す）"""
+    Favorite = apps.get_model('quotes', 'Favorite')
+    Quote = apps.get_model('quotes', 'Quote')
+    Campaign = apps.get_model('tracking', 'Campaign')
+
+    for target in ('quote_id', 'campaign_id'):
+        for owner, owned in (('user_id', {'user__isnull': False}), ('client_id', {'user__isnull': True})):
+            earlier = Favorite.objects.filter(
+                id__lt=OuterRef('id'),
+                **{target: OuterRef(target), owner: OuterRef(owner)},
+                **owned,
+            )
+            Favorite.objects.filter(**{f'{target}__isnull': False}, **owned).filter(Exists(earlier)).delete()
+
+    # 消した分を含めて like_count を数え直す
+    for model, field in ((Quote, 'quote_id'), (Campaign, 'campaign_id')):
+        counts = (
+            Favorite.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(n=Count('id'))
+            .values('n')
+        )
+        model.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0007_userclient'),
+        ('tracking', '0003_campaign_like_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(condition=models.Q(('quote__isnull', False), ('user__isnull', False)), fields=('quote', 'user'), name='quotes_favorite_unique_user_quote'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(condition=models.Q(('quote__isnull', False), ('user__isnull', True)), fields=('quote', 'client_id'), name='quotes_favorite_unique_client_quote'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(condition=models.Q(('campaign_id__isnull', False), ('user__isnull', False)), fields=('campaign_id', 'user'), name='quotes_favorite_unique_user_campaign'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(condition=models.Q(('campaign_id__isnull', False), ('user__isnull', True)), fields=('campaign_id', 'client_id'), name='quotes_favorite_unique_client_campaign'),
+        ),
+    ]
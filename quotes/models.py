@@ -77,6 +77,14 @@ class Quote(models.Model):
         verbose_name="タグ（カンマ区切り）",
         help_text="例: 愛, 家族, 雨",
     )
+    # tags を正規化したもの（保存時に同期する。quotes/tags.py）
+    tag_set = models.ManyToManyField(
+        "Tag",
+        through="QuoteTag",
+        related_name="quotes",
+        blank=True,
+        verbose_name="タグ",
+    )
     publish_date = models.DateField(
         verbose_name="配信日（今日の1本になる日）",
         help_text="この日付の quote が『今日の1本』として扱われる",
@@ -115,6 +123,22 @@ class Quote(models.Model):
     def __str__(self) -> str:
         return f"{self.publish_date}: {self.text[:30]}"
 
+    @property
+    def tag_names(self):
+        """
+        分割済みのタグ名（tags の並び順）。
+        quotes.tags.TAGS_PREFETCH で先読みしていればクエリを発行しない
+        """
+        if not self.pk:
+            from .tags import split_tags
+
+            return split_tags(self.tags)
+        if "quote_tags" in getattr(self, "_prefetched_objects_cache", {}):
+            quote_tags = self.quote_tags.all()
+        else:
+            quote_tags = self.quote_tags.select_related("tag").order_by("position")
+        return [qt.tag.name for qt in quote_tags]
+
 
 class Favorite(models.Model):
     """
@@ -161,6 +185,32 @@ class Favorite(models.Model):
             models.Index(fields=["user"]),
             models.Index(fields=["client_id"]),
             models.Index(fields=["campaign_id"]),
+            # いいね一覧のカーソルページネーション用
+            models.Index(fields=["user", "-created_at", "-id"]),
+            models.Index(fields=["client_id", "-created_at", "-id"]),
+        ]
+        # 同じ主体（user / 未ログインの client_id）が同じ対象に付けられるいいねは 1 つだけ
+        constraints = [
+            models.UniqueConstraint(
+                fields=["quote", "user"],
+                condition=models.Q(quote__isnull=False, user__isnull=False),
+                name="quotes_favorite_unique_user_quote",
+            ),
+            models.UniqueConstraint(
+                fields=["quote", "client_id"],
+                condition=models.Q(quote__isnull=False, user__isnull=True),
+                name="quotes_favorite_unique_client_quote",
+            ),
+            models.UniqueConstraint(
+                fields=["campaign_id", "user"],
+                condition=models.Q(campaign_id__isnull=False, user__isnull=False),
+                name="quotes_favorite_unique_user_campaign",
+            ),
+            models.UniqueConstraint(
+                fields=["campaign_id", "client_id"],
+                condition=models.Q(campaign_id__isnull=False, user__isnull=True),
+                name="quotes_favorite_unique_client_campaign",
+            ),
         ]
 
     def __str__(self) -> str:
@@ -171,4 +221,120 @@ class Favorite(models.Model):
         
         if self.user:
             return f"{self.user.username} ❤ {target}"
-        return f"{self.client_id} ❤ {target}"
\ No newline at end of file
+        return f"{self.client_id} ❤ {target}"
+
+class QuoteSignature(models.Model):
+    """
+    Quote の本文・原文の MinHash シグネチャ（近似重複の検出用、quotes/similarity.py）。
+    Quote の保存時に作り直す。
+    """
+
+    FIELD_CHOICES = [
+        ("text", "台詞本文"),
+        ("original_text", "原文の台詞"),
+    ]
+
+    quote = models.ForeignKey(
+        Quote,
+        on_delete=models.CASCADE,
+        related_name="signatures",
+        verbose_name="台詞",
+    )
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES, verbose_name="対象フィールド")
+    minhash = models.BinaryField(verbose_name="MinHash シグネチャ")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["quote", "field"], name="quotes_signature_unique_field"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Quote#{self.quote_id} {self.field}"
+
+
+class QuoteSignatureBand(models.Model):
+    """シグネチャの LSH バケット（帯ごとに 1 行）。バケットが一致したものだけを候補にする"""
+
+    signature = models.ForeignKey(
+        QuoteSignature,
+        on_delete=models.CASCADE,
+        related_name="bands",
+    )
+    bucket = models.BigIntegerField(db_index=True)
+
+
+class QuoteSearchGram(models.Model):
+    """
+    台詞検索用の文字 bigram の転置インデックス（quotes/search.py）。
+    pg_trgm を使わない DB（SQLite など）でだけ作る。
+    """
+
+    quote = models.ForeignKey(
+        Quote,
+        on_delete=models.CASCADE,
+        related_name="search_grams",
+    )
+    gram = models.CharField(max_length=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["gram", "quote"], name="quotes_search_gram_unique"),
+        ]
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True, verbose_name="タグ名")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+
+    class Meta:
+        verbose_name = "タグ"
+        verbose_name_plural = "タグ"
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class QuoteTag(models.Model):
+    """Quote と Tag の中間テーブル。position は tags の文字列での並び順"""
+
+    quote = models.ForeignKey(Quote, on_delete=models.CASCADE, related_name="quote_tags")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="quote_tags")
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # タグでの絞り込みはこのインデックス（tag, quote）を引く
+            models.UniqueConstraint(fields=["tag", "quote"], name="quotes_quotetag_unique"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Quote#{self.quote_id} {self.tag_id}"
+
+
+class UserClient(models.Model):
+    """
+    サインインした端末の client_id と User の対応。
+    匿名（client_id）のいいねを User に引き継ぐときに使う（quotes/favorites.py）。
+    同じ端末で別のアカウントにサインインし直した場合は新しい方に付け替える。
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="clients",
+        verbose_name="ユーザー",
+    )
+    client_id = models.CharField(max_length=64, unique=True, verbose_name="クライアントID")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+    merged_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="いいねを引き継いだ日時",
+    )
+
+    class Meta:
+        verbose_name = "ユーザーの端末"
+        verbose_name_plural = "ユーザーの端末"
+
+    def __str__(self) -> str:
+        return f"{self.client_id} → User {self.user_id}"
@@ -0,0 +1,54 @@
+"""
+(created_at, id) などの (並び順の列, id) によるキーセット（カーソル）ページネーション。
+OFFSET を使わないので、何ページ目でもインデックスを辿るだけで済む。
+"""
+import base64
+import binascii
+import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    raw = f"{value.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        # 日付だけのカーソル（publish_date など）と日時のカーソルの両方を受け付ける
+        if len(value) == 10:
+            return datetime.date.fromisoformat(value), int(pk)
+        return datetime.datetime.fromisoformat(value), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(str(e))
+
+
+def _get(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def keyset_page(queryset, cursor=None, limit=50, field="created_at"):
+    """
+    field, id の降順で limit 件を返す。queryset が values() 済みなら
+    field と id を含むこと（モデルのインスタンスでもよい）。
+    戻り値: (行のリスト, 次ページのカーソル or None)
+    """
+    queryset = queryset.order_by(f"-{field}", "-id")
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f"{field}__lt": value}) | Q(**{field: value, "id__lt": pk}))
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(_get(last, field), _get(last, "id"))
@@ -0,0 +1,199 @@
+"""
+Quote の全文検索（/api/quotes/search/ と管理画面で共通）。
+
+検索語（空白区切り、AND）ごとに「どれかの列に部分一致」を icontains で判定する。
+全件を舐めないよう、候補の絞り込みにインデックスを使う。
+
+- PostgreSQL: pg_trgm の GIN インデックス（UPPER(列::text) gin_trgm_ops）。
+  icontains が生成する UPPER(列::text) LIKE UPPER(...) にそのまま効く
+  （日本語のトライグラムを取るには DB のロケールが UTF-8 である必要がある）
+- それ以外（SQLite など）: 文字 bigram の転置インデックス QuoteSearchGram。
+  検索語の bigram をすべて含む Quote だけを候補にする。Quote の保存時に更新する（quotes/signals.py）
+
+スコアは DB で計算して並べ替え、そのページの分だけを取り出す（一致した件数が多くても、
+古い台詞の良い一致が順位から漏れない）。ハイライト位置は取り出したページに対して Python で計算する。
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, Q, Value, When
+from django.db.models.functions import Length, Lower, Replace
+
+# 検索対象の列と、スコアの重み
+FIELD_WEIGHTS = {
+    "text": 3,
+    "author_name": 2,
+    "source": 2,
+    "tags": 2,
+    "original_text": 1,
+    "original_source": 1,
+}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+MAX_TERMS = 5
+MAX_TERM_LENGTH = 50
+
+# bigram を取るときの列の区切り（列をまたいだ bigram を作らない・1 文字検索で末尾の文字も拾う）
+_SEPARATOR = "\n"
+
+
+def use_trigram():
+    backend = getattr(settings, "QUOTE_SEARCH_BACKEND", "auto")
+    if backend == "auto":
+        return connection.vendor == "postgresql"
+    return backend == "trigram"
+
+
+def parse_terms(query):
+    """検索語のリスト（小文字・重複なし・最大 MAX_TERMS 個）"""
+    terms = []
+    for term in (query or "").lower().split():
+        term = term[:MAX_TERM_LENGTH]
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def bigrams(value):
+    value = value.lower()
+    return {value[i:i + 2] for i in range(len(value) - 1)}
+
+
+def document_grams(quote):
+    grams = set()
+    for field in FIELDS:
+        grams |= bigrams((getattr(quote, field) or "") + _SEPARATOR)
+    return grams
+
+
+def _gram_candidates(term):
+    """term の bigram をすべて含む Quote の id（サブクエリ）"""
+    from .models import QuoteSearchGram
+
+    if len(term) == 1:
+        # 区切りを付けて索引しているので、どの位置の文字も何かの bigram の先頭にある。
+        # LIKE ではなく範囲で引いて (gram, quote) のインデックスを使う
+        return (
+            QuoteSearchGram.objects
+            .filter(gram__gte=term, gram__lt=term + "\U0010ffff")
+            .values("quote_id")
+        )
+
+    grams = bigrams(term)
+    return (
+        QuoteSearchGram.objects
+        .filter(gram__in=grams)
+        .values("quote_id")
+        .annotate(n=Count("gram"))
+        .filter(n=len(grams))
+        .values("quote_id")
+    )
+
+
+def search_filter(terms):
+    """terms をすべて含む Quote を選ぶ Q（terms が空なら全件）"""
+    condition = Q()
+    trigram = use_trigram()
+    for term in terms:
+        matches_term = Q()
+        for field in FIELDS:
+            matches_term |= Q(**{f"{field}__icontains": term})
+        if not trigram:
+            condition &= Q(pk__in=_gram_candidates(term))
+        condition &= matches_term
+    return condition
+
+
+def _occurrences(value, term):
+    """value の中の term の位置 [(start, end)]（大文字小文字は区別しない）"""
+    lowered = value.lower()
+    if len(lowered) != len(value):
+        # 小文字にすると長さが変わる文字を含む場合は位置を出さない
+        return [(-1, -1)] if term in lowered else []
+    spans = []
+    start = lowered.find(term)
+    while start != -1:
+        spans.append((start, start + len(term)))
+        start = lowered.find(term, start + len(term))
+    return spans
+
+
+def score_expression(terms):
+    """
+    スコアを計算する式（列の重み × 出現回数、列の先頭一致は加点）。
+    出現回数は (LENGTH(列) - LENGTH(REPLACE(列, 語, ''))) / 語の長さ で数える
+    """
+    score = Value(0)
+    for field, weight in FIELD_WEIGHTS.items():
+        value = Lower(field)
+        for term in terms:
+            occurrences = (Length(value) - Length(Replace(value, Value(term), Value("")))) / len(term)
+            prefix = Case(When(**{f"{field}__istartswith": term}, then=Value(weight)), default=Value(0))
+            score = score + occurrences * weight + prefix
+    return score
+
+
+def highlight_quote(quote, terms):
+    """{列: [[start, end], ...]}（一致位置。重なりはまとめる）"""
+    highlights = {}
+    for field in FIELDS:
+        value = getattr(quote, field) or ""
+        spans = []
+        for term in terms:
+            spans.extend(span for span in _occurrences(value, term) if span[0] >= 0)
+        if spans:
+            highlights[field] = [list(span) for span in _merge(spans)]
+    return highlights
+
+
+def _merge(spans):
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def search_quotes(terms, offset=0, limit=20):
+    """
+    terms をすべて含む Quote のうち、スコアの高い順（同点は新しい順）に offset から limit 件を
+    [(quote, スコア, ハイライト)] で返す。2 つめの戻り値は一致した件数
+    """
+    from .models import Quote
+
+    queryset = Quote.objects.filter(search_filter(terms))
+    count = queryset.count()
+    page = list(
+        queryset
+        .annotate(score=score_expression(terms))
+        .order_by("-score", "-publish_date", "-id")[offset:offset + limit]
+    )
+    return [(quote, quote.score, highlight_quote(quote, terms)) for quote in page], count
+
+
+def index_quotes(quotes):
+    """quotes の bigram を作り直す（bigram インデックスを使う DB のみ）"""
+    from .models import QuoteSearchGram
+
+    if use_trigram():
+        return
+    quotes = [q for q in quotes if q.pk]
+    if not quotes:
+        return
+    QuoteSearchGram.objects.filter(quote_id__in=[q.pk for q in quotes]).delete()
+    QuoteSearchGram.objects.bulk_create(
+        [QuoteSearchGram(quote_id=q.pk, gram=gram) for q in quotes for gram in document_grams(q)],
+        batch_size=2000,
+    )
+
+
+def index_quote(quote):
+    """1 件分の bigram を更新する。変わっていなければ何もしない"""
+    from .models import QuoteSearchGram
+
+    if use_trigram():
+        return
+    current = set(QuoteSearchGram.objects.filter(quote_id=quote.pk).values_list("gram", flat=True))
+    if current != document_grams(quote):
+        index_quotes([quote])
@@ -26,32 +26,38 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
 
+def fill_author_fields(data):
+    """
+    author_name / source の補完。QuoteSerializer と FavoriteRowSerializer で共通。
+    """
+    # author_nameとsourceが空の場合、tagsから作者名を取得
+    if not data.get('author_name') and not data.get('source'):
+        # 分割済みのタグ（tag_list）を使う
+        tag_list = data.get('tag_list') or []
+        if tag_list:
+            # tagsが「シェイクスピア」のような形式の場合、最初のタグをauthor_nameとして使用
+            data['author_name'] = tag_list[0]
+    
+    # データベースにauthor_nameとsourceが存在することを確認
+    # 空文字列の場合はNoneにしない（フロントエンドで扱いやすくするため）
+    if data.get('author_name') == '':
+        data['author_name'] = None
+    if data.get('source') == '':
+        data['source'] = None
+    
+    return data
+
+
 class QuoteSerializer(serializers.ModelSerializer):
     liked = serializers.BooleanField(read_only=True)
+    # 分割済みのタグ（QuoteTag から。一覧では quotes.tags.TAGS_PREFETCH で先読みする）
+    tag_list = serializers.ListField(source="tag_names", child=serializers.CharField(), read_only=True)
     # frontend で使いやすいように、Amazonリンクを組み立てて渡してもOK
     
     # レスポンスをカスタマイズして、author_nameとsourceを確実に返す
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        
-        # author_nameとsourceが空の場合、tagsから作者名を取得
-        if not data.get('author_name') and not data.get('source'):
-            tags = data.get('tags', '')
-            if tags:
-                # tagsが「シェイクスピア」のような形式の場合、author_nameに設定
-                tag_list = [t.strip() for t in tags.split(',')]
-                if tag_list:
-                    # 最初のタグをauthor_nameとして使用
-                    data['author_name'] = tag_list[0]
-        
-        # データベースにauthor_nameとsourceが存在することを確認
-        # 空文字列の場合はNoneにしない（フロントエンドで扱いやすくするため）
-        if data.get('author_name') == '':
-            data['author_name'] = None
-        if data.get('source') == '':
-            data['source'] = None
-        
-        return data
+        return fill_author_fields(data)
 
     class Meta:
         model = Quote
@@ -64,6 +70,7 @@ class QuoteSerializer(serializers.ModelSerializer):
             "original_source",
             "category",
             "tags",
+            "tag_list",
             "publish_date",
             "is_public_domain",
             "amazon_key",
@@ -71,4 +78,56 @@ class QuoteSerializer(serializers.ModelSerializer):
             "bg_image_url",
             "like_count",
             "liked",
-        ]
\ No newline at end of file
+        ]
+
+
+# FavoriteRowSerializer が values() で取る Quote の列（QuoteSerializer の fields と同じ並び）
+FAVORITE_QUOTE_FIELDS = [f for f in QuoteSerializer.Meta.fields if f not in ("liked", "tag_list")]
+
+
+class FavoriteRowSerializer(serializers.BaseSerializer):
+    """
+    いいね一覧の 1 行（Favorite.values() の dict）を、TodayQuoteView と同じ形にする。
+    many=True で使うと ListSerializer が 1 つの子インスタンスを使い回すので、
+    行ごとに ModelSerializer を組み立てるコストがかからない。
+    Campaign の行は context["campaigns"]（id → Campaign）から本文を、
+    Quote の分割済みタグは context["tags"]（quote_id → タグ名のリスト）から引く。
+    """
+
+    def to_representation(self, row):
+        if row["campaign_id"]:
+            campaign = self.context["campaigns"][row["campaign_id"]]
+            return {
+                "id": None,
+                "campaign_id": campaign.id,
+                "text": campaign.text,
+                "client_name": campaign.client_name,
+                "url": campaign.url,
+                "sns_url": campaign.sns_url,
+                "is_campaign": True,
+                "liked": True,
+                "like_count": row["campaign_like_count"] or 0,
+            }
+
+        data = {}
+        for field in FAVORITE_QUOTE_FIELDS:
+            data[field] = row[f"quote__{field}"]
+            if field == "tags":
+                data["tag_list"] = self.context["tags"].get(row["quote__id"], [])
+        publish_date = data["publish_date"]
+        data["publish_date"] = publish_date.isoformat() if publish_date else None
+        fill_author_fields(data)
+        data["liked"] = True
+        data["is_campaign"] = False
+        return data
+
+
+class FavoriteChangeSerializer(serializers.Serializer):
+    """
+    /api/quotes/favorites/sync/ の 1 件分（オフライン中に溜めた操作）。
+    kind: "quote" / "campaign"、liked: 操作後の状態、ts: 操作した時刻（ISO 8601）
+    """
+    kind = serializers.ChoiceField(choices=["quote", "campaign"])
+    id = serializers.IntegerField(min_value=1)
+    liked = serializers.BooleanField()
+    ts = serializers.DateTimeField()
@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache as payload_cache
+from . import indexes
+from .models import Favorite, Quote
+
+
+# 無効化はコミット後に行う（コミット前に消すと、別リクエストが古い値で詰め直してしまう）
+
+@receiver([post_save, post_delete], sender=Quote)
+def invalidate_quote_payload(sender, instance, **kwargs):
+    def _invalidate():
+        payload_cache.invalidate_dates()
+        payload_cache.invalidate_body(payload_cache.QUOTE, instance.pk)
+
+    transaction.on_commit(_invalidate)
+
+
+@receiver(post_save, sender=Quote)
+def update_quote_indexes(sender, instance, raw=False, **kwargs):
+    # 近似重複のシグネチャ・検索用 bigram・タグ。保存と同じトランザクションで更新する（削除は CASCADE）
+    if raw:
+        return
+    indexes.update_quote_index(instance)
+
+
+@receiver([post_save, post_delete], sender="tracking.Campaign")
+def invalidate_campaign_payload(sender, instance, **kwargs):
+    def _invalidate():
+        payload_cache.invalidate_dates()
+        payload_cache.invalidate_body(payload_cache.CAMPAIGN, instance.pk)
+
+    transaction.on_commit(_invalidate)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+def invalidate_favorite_target_payload(sender, instance, **kwargs):
+    if instance.campaign_id:
+        kind, pk = payload_cache.CAMPAIGN, instance.campaign_id
+    elif instance.quote_id:
+        kind, pk = payload_cache.QUOTE, instance.quote_id
+    else:
+        return
+
+    transaction.on_commit(lambda: payload_cache.invalidate_body(kind, pk))
@@ -0,0 +1,280 @@
+"""
+Quote の近似重複（言い回しを変えただけの同じ台詞）の検出。
+
+本文・原文を文字 n-gram の集合にして MinHash シグネチャを取り、
+LSH（シグネチャを BANDS 個の帯に分けて帯ごとにハッシュ）でバケットに振り分ける。
+どれかのバケットが一致したものだけを候補として比べるので、全件比較をせずに済む。
+
+- シグネチャとバケットは QuoteSignature / QuoteSignatureBand に保存し、
+  Quote の保存時に更新する（quotes/signals.py）
+- bulk_create した場合は index_quotes() を呼ぶ
+- 類似度は MinHash の一致率（= 文字 n-gram の Jaccard 係数の推定値）
+"""
+import hashlib
+import random
+import struct
+import unicodedata
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# この類似度以上を「近似重複」とみなす（BANDS=16, ROWS=4 だと 0.5 前後から候補に上がる）
+DEFAULT_THRESHOLD = 0.6
+
+# シグネチャを取る Quote のフィールド
+FIELDS = ("text", "original_text")
+
+_PRIME = (1 << 61) - 1
+
+# 置換に使う (a, b)。シグネチャを保存するので、プロセスをまたいで固定の値にする
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+del _rng
+
+
+def normalize(text):
+    """全角半角・大文字小文字・空白・記号の違いを無視する"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] in "LN")
+
+
+def shingles(text):
+    text = normalize(text)
+    if not text:
+        return set()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def signature(text):
+    """MinHash シグネチャ（NUM_PERM 個の int のタプル）。比べる文字が無ければ None"""
+    hashes = [_hash64(s) for s in shingles(text)]
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def buckets(sig, field):
+    """LSH のバケット（帯ごとに 1 つ、符号付き 64bit）。フィールドと帯の番号もハッシュに含める"""
+    result = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            f"{field}:{band}:{','.join(map(str, rows))}".encode(), digest_size=8
+        ).digest()
+        result.append(struct.unpack(">q", digest)[0])
+    return result
+
+
+def pack(sig):
+    return struct.pack(f">{NUM_PERM}Q", *sig)
+
+
+def unpack(data):
+    return struct.unpack(f">{NUM_PERM}Q", bytes(data))
+
+
+def signatures_for(text, original_text):
+    """{フィールド名: シグネチャ}（シグネチャが取れないフィールドは含めない）"""
+    sigs = {}
+    for field, value in zip(FIELDS, (text, original_text)):
+        sig = signature(value)
+        if sig is not None:
+            sigs[field] = sig
+    return sigs
+
+
+class SimilarityIndex:
+    """
+    プロセス内の LSH インデックス。
+    生成コマンドのように、まだ保存していない候補同士も比べたいときに使う。
+    """
+
+    def __init__(self):
+        self._signatures = {}  # (key, field) -> シグネチャ
+        self._buckets = {}  # バケット -> {(key, field), ...}
+
+    @classmethod
+    def from_db(cls):
+        """保存済みのシグネチャを読み込む（バケットはシグネチャから計算し直す）"""
+        from .models import QuoteSignature
+
+        index = cls()
+        rows = QuoteSignature.objects.values_list("quote_id", "field", "minhash")
+        for quote_id, field, minhash in rows.iterator(chunk_size=2000):
+            index._add_signature(quote_id, field, unpack(minhash))
+        return index
+
+    def _add_signature(self, key, field, sig):
+        self._signatures[(key, field)] = sig
+        for bucket in buckets(sig, field):
+            self._buckets.setdefault(bucket, set()).add((key, field))
+
+    def add(self, key, text, original_text=""):
+        for field, sig in signatures_for(text, original_text).items():
+            self._add_signature(key, field, sig)
+
+    def similar(self, text, original_text="", threshold=DEFAULT_THRESHOLD):
+        """類似度が threshold 以上のものを [(key, 類似度)] で類似度の高い順に返す"""
+        best = {}
+        for field, sig in signatures_for(text, original_text).items():
+            candidates = set()
+            for bucket in buckets(sig, field):
+                candidates |= self._buckets.get(bucket, set())
+            for key, _ in candidates:
+                score = similarity(sig, self._signatures[(key, field)])
+                if score >= threshold and score > best.get(key, 0):
+                    best[key] = score
+        return sorted(best.items(), key=lambda item: -item[1])
+
+    def __len__(self):
+        return len({key for key, _ in self._signatures})
+
+
+def find_similar(text, original_text="", threshold=DEFAULT_THRESHOLD, exclude_pk=None):
+    """
+    保存済みの Quote から近似重複を探す。[(quote_id, 類似度)] を類似度の高い順に返す。
+    候補はバケットのインデックスで絞るので、件数が増えても全件は読まない
+    """
+    from .models import QuoteSignature
+
+    best = {}
+    for field, sig in signatures_for(text, original_text).items():
+        candidates = (
+            QuoteSignature.objects
+            .filter(field=field, bands__bucket__in=buckets(sig, field))
+            .exclude(quote_id=exclude_pk)
+            .values_list("quote_id", "minhash")
+            .distinct()
+        )
+        for quote_id, minhash in candidates:
+            score = similarity(sig, unpack(minhash))
+            if score >= threshold and score > best.get(quote_id, 0):
+                best[quote_id] = score
+    return sorted(best.items(), key=lambda item: -item[1])
+
+
+def index_quotes(quotes):
+    """quotes のシグネチャとバケットを作り直す（保存済みの Quote を渡す）"""
+    from .models import QuoteSignature, QuoteSignatureBand
+
+    quotes = [q for q in quotes if q.pk]
+    if not quotes:
+        return
+
+    QuoteSignature.objects.filter(quote_id__in=[q.pk for q in quotes]).delete()
+
+    signatures = []
+    for quote in quotes:
+        for field, sig in signatures_for(quote.text, quote.original_text).items():
+            signatures.append((QuoteSignature(quote_id=quote.pk, field=field, minhash=pack(sig)), sig))
+    QuoteSignature.objects.bulk_create([obj for obj, _ in signatures], batch_size=500)
+
+    if signatures and signatures[0][0].pk is None:
+        # bulk_create で主キーが返らない DB 向け
+        lookup = {
+            (quote_id, field): pk
+            for pk, quote_id, field in QuoteSignature.objects
+            .filter(quote_id__in=[q.pk for q in quotes])
+            .values_list("pk", "quote_id", "field")
+        }
+        for obj, _ in signatures:
+            obj.pk = lookup[(obj.quote_id, obj.field)]
+
+    QuoteSignatureBand.objects.bulk_create(
+        [
+            QuoteSignatureBand(signature_id=obj.pk, bucket=bucket)
+            for obj, sig in signatures
+            for bucket in buckets(sig, obj.field)
+        ],
+        batch_size=2000,
+    )
+
+
+def index_quote(quote):
+    """1 件分のシグネチャを更新する。本文・原文が変わっていなければ何もしない"""
+    from .models import QuoteSignature
+
+    current = dict(QuoteSignature.objects.filter(quote_id=quote.pk).values_list("field", "minhash"))
+    sigs = signatures_for(quote.text, quote.original_text)
+    if {field: unpack(minhash) for field, minhash in current.items()} == sigs:
+        return
+    index_quotes([quote])
+
+
+def find_clusters(threshold=DEFAULT_THRESHOLD):
+    """
+    保存済みの Quote の近似重複のまとまりを返す。
+    [{"quote_ids": [...], "score": まとまり内の最大の類似度}] を大きいまとまり順に返す
+    """
+    from django.db.models import Count
+
+    from .models import QuoteSignature, QuoteSignatureBand
+
+    shared = (
+        QuoteSignatureBand.objects
+        .values("bucket")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values("bucket")
+    )
+    members = {}
+    for bucket, signature_id in (
+        QuoteSignatureBand.objects.filter(bucket__in=shared).values_list("bucket", "signature_id")
+    ):
+        members.setdefault(bucket, set()).add(signature_id)
+
+    signature_ids = set().union(*members.values()) if members else set()
+    sigs = {
+        pk: (quote_id, unpack(minhash))
+        for pk, quote_id, minhash in QuoteSignature.objects
+        .filter(pk__in=signature_ids)
+        .values_list("pk", "quote_id", "minhash")
+    }
+
+    parent = {}
+
+    def find(x):
+        while parent.get(x, x) != x:
+            x = parent[x]
+        return x
+
+    scores = {}
+    checked = set()
+    for ids in members.values():
+        ids = sorted(ids)
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                if (a, b) in checked:
+                    continue
+                checked.add((a, b))
+                (quote_a, sig_a), (quote_b, sig_b) = sigs[a], sigs[b]
+                if quote_a == quote_b:
+                    continue
+                score = similarity(sig_a, sig_b)
+                if score < threshold:
+                    continue
+                root_a, root_b = find(quote_a), find(quote_b)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+                    scores[root_a] = max(scores.get(root_a, 0), scores.pop(root_b, 0))
+                scores[root_a] = max(scores.get(root_a, 0), score)
+
+    clusters = {}
+    for quote_id in parent.keys() | set(parent.values()):
+        clusters.setdefault(find(quote_id), []).append(quote_id)
+    return sorted(
+        ({"quote_ids": sorted(ids), "score": scores[root]} for root, ids in clusters.items()),
+        key=lambda c: (-len(c["quote_ids"]), -c["score"], c["quote_ids"][0]),
+    )
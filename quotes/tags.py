@@ -0,0 +1,84 @@
+"""
+Quote.tags（カンマ区切りの文字列）を Tag / QuoteTag に正規化して持つ。
+
+編集・CSV 取り込みは今まで通り tags の文字列で行い、保存時に QuoteTag を同期する
+（quotes/signals.py）。bulk_create した場合は sync_tags() を呼ぶ。
+タグでの絞り込みは QuoteTag の (tag, quote) インデックスを引くだけで済み、
+表示用の分割済みタグは Quote.tag_names（TAGS_PREFETCH で先読みできる）から取る。
+"""
+from django.db.models import Prefetch
+
+from .models import QuoteTag, Tag
+
+TAGS_PREFETCH = Prefetch("quote_tags", queryset=QuoteTag.objects.select_related("tag").order_by("position"))
+
+
+def split_tags(value):
+    """
+    カンマ区切りの文字列をタグ名のリストにする（前後の空白・空のタグ・重複は除く）。
+    区切りは半角カンマだけ（以前の tags.split(",") と同じ。「，」「、」はタグ名の一部）
+    """
+    names = []
+    for name in (value or "").split(","):
+        name = name.strip()[:Tag._meta.get_field("name").max_length]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def sync_tags(quotes):
+    """quotes の QuoteTag を tags の文字列に合わせる（保存済みの Quote を渡す）"""
+    wanted = {q.pk: split_tags(q.tags) for q in quotes if q.pk}
+    if not wanted:
+        return
+
+    names = {name for names in wanted.values() for name in names}
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list("name", "id"))
+
+    desired = {
+        (quote_id, tag_ids[name], position)
+        for quote_id, names in wanted.items()
+        for position, name in enumerate(names)
+    }
+    current = {
+        (quote_id, tag_id, position): pk
+        for pk, quote_id, tag_id, position in QuoteTag.objects
+        .filter(quote_id__in=wanted)
+        .values_list("pk", "quote_id", "tag_id", "position")
+    }
+
+    stale = [pk for key, pk in current.items() if key not in desired]
+    if stale:
+        QuoteTag.objects.filter(pk__in=stale).delete()
+    QuoteTag.objects.bulk_create(
+        [
+            QuoteTag(quote_id=quote_id, tag_id=tag_id, position=position)
+            for quote_id, tag_id, position in desired
+            if (quote_id, tag_id, position) not in current
+        ],
+        batch_size=1000,
+    )
+
+
+def sync_quote_tags(quote):
+    """1 件分を同期する。タグが変わっていなければ何もしない"""
+    current = list(
+        QuoteTag.objects.filter(quote_id=quote.pk).order_by("position").values_list("tag__name", flat=True)
+    )
+    if current != split_tags(quote.tags):
+        sync_tags([quote])
+
+
+def tag_names_for(quote_ids):
+    """{quote_id: [タグ名, ...]} を 1 クエリで引く（values() で Quote を取っている一覧用）"""
+    names = {}
+    rows = (
+        QuoteTag.objects
+        .filter(quote_id__in=quote_ids)
+        .order_by("quote_id", "position")
+        .values_list("quote_id", "tag__name")
+    )
+    for quote_id, name in rows:
+        names.setdefault(quote_id, []).append(name)
+    return names
@@ -1,3 +1,848 @@
-from django.test import TestCase
+import datetime
+import importlib
+import io
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import tablib
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from tracking import campaign_index
+from tracking.models import Campaign
+
+from . import cache as payload_cache
+from . import generation, search
+from .admin import QuoteResource
+from .favorites import _toggle_stepwise, merge_client_favorites, sync_favorites, toggle_favorite
+from .models import Favorite, Quote, QuoteSearchGram, QuoteTag, Tag, User, UserClient
+from .tags import split_tags, sync_tags
+
+
+def make_quote(day=1, **kwargs):
+    fields = {"text": f"台詞 {day}", "author_name": "作者", "publish_date": datetime.date(2025, 1, day)}
+    return Quote.objects.create(**{**fields, **kwargs})
+
+
+def make_campaign(**kwargs):
+    fields = {
+        "name": "campaign",
+        "client_name": "client",
+        "text": "キャンペーン",
+        "url": "https://example.com/",
+        "start_date": datetime.date(2025, 1, 1),
+        "end_date": datetime.date(2025, 1, 7),
+    }
+    return Campaign.objects.create(**{**fields, **kwargs})
+
+
+class ToggleFavoriteTests(TestCase):
+    def setUp(self):
+        self.quote = make_quote()
+        self.user = User.objects.create(username="alice")
+
+    def assertLikeCount(self, obj, expected):
+        obj.refresh_from_db()
+        self.assertEqual(obj.like_count, expected)
+        field = "campaign_id" if isinstance(obj, Campaign) else "quote_id"
+        self.assertEqual(Favorite.objects.filter(**{field: obj.pk}).count(), expected)
+
+    def test_on_off_on_by_client(self):
+        self.assertEqual(toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c1"), (True, 1))
+        self.assertEqual(toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c1"), (False, 0))
+        self.assertEqual(toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c1"), (True, 1))
+        self.assertLikeCount(self.quote, 1)
+
+    def test_on_off_on_by_user(self):
+        for expected in [(True, 1), (False, 0), (True, 1)]:
+            self.assertEqual(toggle_favorite(payload_cache.QUOTE, self.quote.pk, user=self.user), expected)
+        self.assertLikeCount(self.quote, 1)
+        self.assertTrue(Favorite.objects.filter(user=self.user, quote=self.quote).exists())
+
+    def test_user_and_client_are_counted_separately(self):
+        toggle_favorite(payload_cache.QUOTE, self.quote.pk, user=self.user)
+        toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c1")
+        toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c2")
+        self.assertLikeCount(self.quote, 3)
+        toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c1")
+        self.assertLikeCount(self.quote, 2)
+
+    def test_campaign(self):
+        campaign = make_campaign()
+        self.assertEqual(toggle_favorite(payload_cache.CAMPAIGN, campaign.pk, client_id="c1"), (True, 1))
+        self.assertEqual(toggle_favorite(payload_cache.CAMPAIGN, campaign.pk, client_id="c1"), (False, 0))
+        self.assertLikeCount(campaign, 0)
+
+    def test_missing_target(self):
+        self.assertIsNone(toggle_favorite(payload_cache.QUOTE, self.quote.pk + 100, client_id="c1"))
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_unique_constraints(self):
+        Favorite.objects.create(quote=self.quote, user=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Favorite.objects.create(quote=self.quote, user=self.user)
+        Favorite.objects.create(quote=self.quote, client_id="c1")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Favorite.objects.create(quote=self.quote, client_id="c1")
+
+    def test_concurrent_insert_conflict(self):
+        """DELETE の後、INSERT までの間に別のリクエストが同じいいねを作った場合"""
+        if connection.vendor == "postgresql":
+            self.skipTest("PostgreSQL は 1 文の CTE（ON CONFLICT DO NOTHING）で処理する")
+
+        Favorite.objects.create(quote=self.quote, client_id="c1")
+        Quote.objects.filter(pk=self.quote.pk).update(like_count=1)
+        owner = {"client_id": "c1", "user": None}
+
+        # 先に作られていたいいねが DELETE の時点ではまだ見えていなかったことにする
+        with mock.patch("django.db.models.query.QuerySet.delete", return_value=(0, {})):
+            with transaction.atomic():
+                result = _toggle_stepwise(Quote, "quote_id", self.quote.pk, owner)
+
+        self.assertEqual(result, (True, 1))
+        self.assertLikeCount(self.quote, 1)
+
+
+class MergeClientFavoritesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="alice")
+        self.q1, self.q2, self.q3 = make_quote(1), make_quote(2), make_quote(3)
+        self.campaign = make_campaign()
+        UserClient.objects.create(user=self.user, client_id="phone")
+        UserClient.objects.create(user=self.user, client_id="tablet")
+
+    def like(self, target, **owner):
+        field = "campaign_id" if isinstance(target, Campaign) else "quote_id"
+        Favorite.objects.create(**{field: target.pk}, **owner)
+
+    def test_overlaps_are_deduped_and_recounted(self):
+        # q1: User と端末の両方 / q2: 2 台の端末 / q3: 1 台だけ / campaign: User と端末の両方
+        self.like(self.q1, user=self.user)
+        self.like(self.q1, client_id="phone")
+        self.like(self.q2, client_id="phone")
+        self.like(self.q2, client_id="tablet")
+        self.like(self.q3, client_id="tablet")
+        self.like(self.campaign, user=self.user)
+        self.like(self.campaign, client_id="tablet")
+        # 紐づいていない端末のいいねは残る
+        self.like(self.q1, client_id="stranger")
+        for obj in (self.q1, self.q2, self.q3):
+            Quote.objects.filter(pk=obj.pk).update(like_count=Favorite.objects.filter(quote=obj).count())
+        Campaign.objects.filter(pk=self.campaign.pk).update(like_count=2)
+
+        merged, removed = merge_client_favorites(["phone", "tablet"])
+
+        self.assertEqual((merged, removed), (2, 3))
+        self.assertCountEqual(
+            Favorite.objects.filter(user=self.user).values_list("quote_id", "campaign_id"),
+            [(self.q1.pk, None), (self.q2.pk, None), (self.q3.pk, None), (None, self.campaign.pk)],
+        )
+        self.assertFalse(Favorite.objects.filter(user=None, client_id__in=["phone", "tablet"]).exists())
+        self.assertTrue(Favorite.objects.filter(user=None, client_id="stranger", quote=self.q1).exists())
+
+        for obj, expected in ((self.q1, 2), (self.q2, 1), (self.q3, 1), (self.campaign, 1)):
+            obj.refresh_from_db()
+            self.assertEqual(obj.like_count, expected, obj)
+        self.assertEqual(UserClient.objects.filter(merged_at__isnull=False).count(), 2)
+
+    def test_merge_twice_is_noop(self):
+        self.like(self.q1, client_id="phone")
+        merge_client_favorites(["phone"])
+        self.assertEqual(merge_client_favorites(["phone"]), (0, 0))
+        self.assertEqual(Favorite.objects.filter(user=self.user, quote=self.q1).count(), 1)
+
+    def test_other_clients_of_same_user_are_not_duplicates(self):
+        # tablet の方が古いが、今回引き継ぐのは phone だけ
+        self.like(self.q1, client_id="tablet")
+        self.like(self.q1, client_id="phone")
+
+        self.assertEqual(merge_client_favorites(["phone"]), (1, 0))
+        self.assertTrue(Favorite.objects.filter(user=self.user, client_id="phone", quote=self.q1).exists())
+        self.assertTrue(Favorite.objects.filter(user=None, client_id="tablet", quote=self.q1).exists())
+
+    def test_unlinked_client_is_untouched(self):
+        self.like(self.q1, client_id="stranger")
+        self.assertEqual(merge_client_favorites(["stranger"]), (0, 0))
+        self.assertTrue(Favorite.objects.filter(user=None, client_id="stranger").exists())
+
+
+class SyncFavoritesTests(TestCase):
+    def setUp(self):
+        self.q1, self.q2 = make_quote(1), make_quote(2)
+        # Campaign インデックスの作り直しは on_commit で行われるので、ここで実行させる
+        with self.captureOnCommitCallbacks(execute=True):
+            self.campaign = make_campaign()
+        self.base = datetime.datetime(2025, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+    def change(self, target, liked, minutes):
+        kind = payload_cache.CAMPAIGN if isinstance(target, Campaign) else payload_cache.QUOTE
+        return {
+            "kind": kind,
+            "id": target.pk,
+            "liked": liked,
+            "ts": self.base + datetime.timedelta(minutes=minutes),
+        }
+
+    def test_newest_change_wins_regardless_of_order(self):
+        result = sync_favorites(
+            [
+                self.change(self.q1, False, 5),
+                self.change(self.q1, True, 1),  # 古いので無視
+                self.change(self.q2, True, 1),
+                self.change(self.q2, False, 2),
+                self.change(self.q2, True, 3),
+                self.change(self.campaign, True, 1),
+            ],
+            client_id="c1",
+        )
+
+        self.assertEqual((result["added"], result["removed"]), (2, 0))
+        self.assertEqual(result["favorites"], {"quotes": [self.q2.pk], "campaigns": [self.campaign.pk]})
+        self.assertFalse(Favorite.objects.filter(quote=self.q1).exists())
+
+    def test_like_count_is_recomputed(self):
+        Favorite.objects.create(quote=self.q1, client_id="other")
+        Favorite.objects.create(quote=self.q1, client_id="c1")
+        # like_count がずれていても、触った対象は Favorite から数え直す
+        Quote.objects.filter(pk=self.q1.pk).update(like_count=7)
+
+        sync_favorites(
+            [self.change(self.q1, False, 1), self.change(self.q2, True, 1), self.change(self.campaign, True, 1)],
+            client_id="c1",
+        )
+
+        for obj, expected in ((self.q1, 1), (self.q2, 1), (self.campaign, 1)):
+            obj.refresh_from_db()
+            self.assertEqual(obj.like_count, expected, obj)
+
+    def test_replay_is_idempotent(self):
+        user = User.objects.create(username="alice")
+        changes = [self.change(self.q1, True, 1), self.change(self.q2, True, 2), self.change(self.q2, False, 3)]
+
+        first = sync_favorites(changes, user=user)
+        second = sync_favorites(changes, user=user)
+
+        self.assertEqual((first["added"], first["removed"]), (1, 0))
+        self.assertEqual((second["added"], second["removed"]), (0, 0))
+        self.assertEqual(second["favorites"], {"quotes": [self.q1.pk], "campaigns": []})
+        self.q1.refresh_from_db()
+        self.assertEqual(self.q1.like_count, 1)
+
+    def test_added_counts_rows_actually_inserted(self):
+        bulk_create = Favorite.objects.bulk_create
+
+        def conflicting_bulk_create(objs, **kwargs):
+            # ignore_conflicts で 1 件目が衝突して入らなかった場合も、戻り値には全件が含まれる
+            bulk_create(objs[1:], **kwargs)
+            return objs
+
+        with mock.patch.object(Favorite.objects, "bulk_create", side_effect=conflicting_bulk_create):
+            result = sync_favorites([self.change(self.q1, True, 1), self.change(self.q2, True, 1)], client_id="c1")
+
+        self.assertEqual(result["added"], 1)
+        self.assertEqual(len(result["favorites"]["quotes"]), 1)
+
+    def test_missing_targets_are_ignored(self):
+        result = sync_favorites(
+            [self.change(self.q1, True, 1), {**self.change(self.q2, True, 1), "id": self.q2.pk + 100}],
+            client_id="c1",
+        )
+        self.assertEqual(result["added"], 1)
+        self.assertEqual(result["ignored"], [{"kind": payload_cache.QUOTE, "id": self.q2.pk + 100}])
+
+
+class QuoteResourceImportTests(TestCase):
+    TEXT = "生きるべきか、死ぬべきか、それが問題だ"
+
+    def setUp(self):
+        self.existing = make_quote(1, text=self.TEXT)
+        self.other = make_quote(2, text="弱き者よ、汝の名は女なり")
+
+    def dataset(self, *rows):
+        data = tablib.Dataset(headers=["id", "text", "author_name", "publish_date"])
+        for row in rows:
+            data.append(row)
+        return data
+
+    def test_new_near_duplicate_is_reported(self):
+        result = QuoteResource().import_data(
+            self.dataset(["", self.TEXT + "。", "作者", "2025-01-10"]), dry_run=True
+        )
+
+        self.assertTrue(result.has_validation_errors())
+        [invalid] = result.invalid_rows
+        self.assertIn(f"ID {self.existing.pk}", " ".join(invalid.error_dict["text"]))
+        self.assertEqual(Quote.objects.count(), 2)
+
+    def test_update_of_existing_row_is_not_checked(self):
+        # 既存の行を、別の台詞に似た本文へ更新する
+        result = QuoteResource().import_data(
+            self.dataset([self.other.pk, self.TEXT + "！", "作者", "2025-01-02"]), dry_run=False
+        )
+
+        self.assertFalse(result.has_validation_errors())
+        self.assertFalse(result.has_errors())
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.text, self.TEXT + "！")
+
+
+class PayloadCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        campaign_index.invalidate()
+        # Campaign インデックスのバージョン確認（1 秒ごと）でクエリ数が揺れないようにする
+        patch = mock.patch.object(campaign_index, "VERSION_CHECK_INTERVAL", float("inf"))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.day = datetime.date(2025, 1, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quote = make_quote(10)
+
+    def payload(self, day=None, **kwargs):
+        return payload_cache.get_payload_for_date(day or self.day, **kwargs)
+
+    def test_second_lookup_is_a_cache_hit(self):
+        first = self.payload()
+        with self.assertNumQueries(0):
+            second = self.payload()
+        self.assertEqual(second, first)
+        self.assertEqual(second.body["id"], self.quote.pk)
+        self.assertIs(second.body["liked"], False)
+
+    def test_save_invalidates_after_commit(self):
+        self.payload()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.quote.text = "書き換えた台詞"
+            self.quote.save()
+            # コミット前は古い本体のまま（ここで消すと別のリクエストが古い値で詰め直せてしまう）
+            self.assertEqual(self.payload().body["text"], "台詞 10")
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.payload().body["text"], "書き換えた台詞")
+
+    def test_new_quote_bumps_the_date_generation(self):
+        next_day = self.day + datetime.timedelta(days=1)
+        self.assertEqual(self.payload(next_day, fallback=True).body["id"], self.quote.pk)
+        self.assertIsNone(self.payload(next_day))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = make_quote(11)
+        self.assertEqual(self.payload(next_day, fallback=True).body["id"], newer.pk)
+        self.assertEqual(self.payload(next_day).body["id"], newer.pk)
+
+    def test_campaign_save_and_delete(self):
+        self.payload()
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign = make_campaign(start_date=self.day, end_date=self.day)
+        self.assertEqual(self.payload().body["campaign_id"], campaign.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign.text = "新しいキャンペーン"
+            campaign.save()
+        self.assertEqual(self.payload().body["text"], "新しいキャンペーン")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign.delete()
+        self.assertEqual(self.payload().body["id"], self.quote.pk)
+
+    def test_favorite_refreshes_like_count(self):
+        self.assertEqual(self.payload().body["like_count"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c1")
+        self.assertEqual(self.payload().body["like_count"], 1)
+
+    def test_liked_is_merged_per_request(self):
+        user = User.objects.create(username="alice")
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c1")
+            toggle_favorite(payload_cache.QUOTE, self.quote.pk, user=user)
+
+        def get(client, **params):
+            response = client.get("/api/quotes/by-date/", {"date": self.day.isoformat(), **params})
+            self.assertEqual(response.status_code, 200)
+            return response.json()
+
+        client = APIClient()
+        self.assertIs(get(client, client_id="c1")["liked"], True)
+        # 本体はキャッシュから。liked の判定だけ引く
+        with self.assertNumQueries(1):
+            self.assertIs(get(client, client_id="c2")["liked"], False)
+        self.assertIs(get(client)["liked"], False)
+        client.force_authenticate(user)
+        self.assertIs(get(client)["liked"], True)
+        self.assertIs(payload_cache.get_payload_for_date(self.day).body["liked"], False)
+
+
+@override_settings(QUOTE_SEARCH_BACKEND="bigram")
+class TagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        campaign_index.invalidate()
+        self.addCleanup(campaign_index.invalidate)
+
+    def tag_rows(self, quote):
+        return list(QuoteTag.objects.filter(quote=quote).order_by("position").values_list("tag__name", "position"))
+
+    def test_split_tags_uses_comma_only(self):
+        self.assertEqual(split_tags(" 戯曲, シェイクスピア,,戯曲 "), ["戯曲", "シェイクスピア"])
+        # 「、」「，」では分けない（以前の tags.split(",") と同じ）
+        self.assertEqual(split_tags("恋、別れ，旅"), ["恋、別れ，旅"])
+        self.assertEqual(split_tags(""), [])
+
+    def test_save_syncs_quote_tags(self):
+        quote = make_quote(tags="戯曲,恋")
+        self.assertEqual(self.tag_rows(quote), [("戯曲", 0), ("恋", 1)])
+
+        quote.tags = "恋,旅"
+        quote.save()
+        self.assertEqual(self.tag_rows(quote), [("恋", 0), ("旅", 1)])
+
+    def test_sync_tags_after_bulk_update(self):
+        first = make_quote(1, tags="戯曲")
+        second = make_quote(2, tags="戯曲,恋")
+        # update() では signal が飛ばない
+        Quote.objects.filter(pk=first.pk).update(tags="恋,戯曲")
+        Quote.objects.filter(pk=second.pk).update(tags="")
+
+        sync_tags(Quote.objects.filter(pk__in=[first.pk, second.pk]))
+
+        self.assertEqual(self.tag_rows(first), [("恋", 0), ("戯曲", 1)])
+        self.assertEqual(self.tag_rows(second), [])
+        self.assertEqual(Tag.objects.filter(name="戯曲").count(), 1)
+
+    def test_backfill_migration(self):
+        migration = importlib.import_module("quotes.migrations.0006_tags")
+        first = make_quote(1, tags="戯曲, シェイクスピア")
+        second = make_quote(2, tags="シェイクスピア")
+        make_quote(3, tags="")
+        QuoteTag.objects.all().delete()
+        Tag.objects.all().delete()
+
+        migration.backfill_tags(apps, None)
+
+        self.assertEqual(self.tag_rows(first), [("戯曲", 0), ("シェイクスピア", 1)])
+        self.assertEqual(self.tag_rows(second), [("シェイクスピア", 0)])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_author_fallback_uses_whole_first_tag(self):
+        make_quote(tags="シェイクスピア、ハムレット,戯曲", author_name="", source="")
+        response = APIClient().get("/api/quotes/by-date/", {"date": "2025-01-01"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["author_name"], "シェイクスピア、ハムレット")
+
+    def test_list_filters_by_tag(self):
+        for day in range(1, 6):
+            make_quote(day, tags="恋" if day % 2 else "旅")
+        client = APIClient()
+
+        response = client.get("/api/quotes/", {"tag": "恋", "limit": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([q["publish_date"] for q in response.json()], ["2025-01-05", "2025-01-03"])
+        self.assertEqual(response.json()[0]["tag_list"], ["恋"])
+
+        response = client.get("/api/quotes/", {"tag": "恋", "limit": 2, "cursor": response["X-Next-Cursor"]})
+        self.assertEqual([q["publish_date"] for q in response.json()], ["2025-01-01"])
+        self.assertNotIn("X-Next-Cursor", response)
+
+        response = client.get("/api/quotes/", {"tag": "無い"})
+        self.assertEqual(response.json(), [])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        # 古いが本文に 2 回出てくる台詞と、新しいが作者名にだけ出てくる台詞がたくさん
+        self.best = make_quote(1, text="恋は盲目、恋は病")
+        self.newer = [make_quote(day, author_name=f"恋の作者 {day}") for day in range(2, 12)]
+        make_quote(20, text="関係のない台詞")
+
+    def search(self, query, offset=0, limit=20):
+        return search.search_quotes(search.parse_terms(query), offset, limit)
+
+    def test_better_old_match_ranks_first(self):
+        results, count = self.search("恋", limit=3)
+        self.assertEqual(count, 11)
+        quote, score, highlights = results[0]
+        self.assertEqual(quote, self.best)
+        # 本文（重み 3）に 2 回 + 先頭一致
+        self.assertEqual(score, 3 * 2 + 3)
+        self.assertEqual(highlights, {"text": [[0, 1], [5, 6]]})
+        # 同点は新しい順
+        self.assertEqual([q for q, _, _ in results[1:]], [self.newer[-1], self.newer[-2]])
+
+        page, _ = self.search("恋", offset=10, limit=5)
+        self.assertEqual([q for q, _, _ in page], [self.newer[0]])
+
+    def test_all_terms_must_match(self):
+        results, count = self.search("盲目 病")
+        self.assertEqual((count, [q for q, _, _ in results]), (1, [self.best]))
+        self.assertEqual(self.search("盲目 関係")[1], 0)
+        # bigram は揃っていても部分一致しないものは除く
+        self.assertEqual(self.search("病恋")[1], 0)
+
+    def test_index_follows_saves(self):
+        self.best.text = "生きるべきか"
+        self.best.save()
+        self.assertEqual(self.search("盲目")[1], 0)
+        self.assertEqual([q for q, _, _ in self.search("べき")[0]], [self.best])
+        self.assertTrue(QuoteSearchGram.objects.filter(quote=self.best, gram="べき").exists())
+
+    def test_endpoint(self):
+        response = APIClient().get("/api/quotes/search/", {"q": "恋", "limit": 4, "offset": 8})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["count"], data["next_offset"]), (11, None))
+        self.assertEqual([item["id"] for item in data["results"]], [q.pk for q in self.newer[2::-1]])
+        self.assertEqual(data["results"][0]["highlights"], {"author_name": [[0, 1]]})
+        self.assertEqual(APIClient().get("/api/quotes/search/", {"q": " "}).status_code, 400)
+
+
+class FavoriteListTests(TestCase):
+    def setUp(self):
+        campaign_index.invalidate()
+        self.addCleanup(campaign_index.invalidate)
+        patch = mock.patch.object(campaign_index, "VERSION_CHECK_INTERVAL", float("inf"))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.quotes = [make_quote(day) for day in range(1, 6)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.campaign = make_campaign()
+        self.favorites = [Favorite.objects.create(quote=quote, client_id="c1") for quote in self.quotes]
+        self.favorites.insert(2, Favorite.objects.create(campaign_id=self.campaign.pk, client_id="c1"))
+        # 他の端末のいいねは含めない
+        Favorite.objects.create(quote=self.quotes[0], client_id="c2")
+        self.client = APIClient()
+
+    def get(self, **params):
+        return self.client.get("/api/quotes/favorites/", {"client_id": "c1", **params})
+
+    def pages(self, limit):
+        rows, cursor = [], None
+        while True:
+            response = self.get(limit=limit, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            rows.extend(response.json())
+            cursor = response.get("X-Next-Cursor")
+            if not cursor:
+                return rows
+            self.assertIn(f"cursor={cursor}", response["Link"])
+
+    def keys(self, rows):
+        return [("campaign", row["campaign_id"]) if row["is_campaign"] else ("quote", row["id"]) for row in rows]
+
+    def expected(self, favorites):
+        return [("campaign", f.campaign_id) if f.campaign_id else ("quote", f.quote_id) for f in favorites]
+
+    def test_cursor_round_trip_mixes_campaigns(self):
+        newest_first = sorted(self.favorites, key=lambda f: (f.created_at, f.id), reverse=True)
+        rows = self.pages(limit=2)
+        self.assertEqual(self.keys(rows), self.expected(newest_first))
+        campaign_row = next(row for row in rows if row["is_campaign"])
+        self.assertEqual((campaign_row["text"], campaign_row["liked"]), (self.campaign.text, True))
+
+    def test_ties_on_created_at(self):
+        Favorite.objects.update(created_at=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc))
+        for limit in (1, 2, 4):
+            rows = self.pages(limit=limit)
+            self.assertEqual(self.keys(rows), self.expected(sorted(self.favorites, key=lambda f: -f.id)), limit)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.get(cursor="not-a-cursor").status_code, 400)
+        self.assertEqual(self.get(limit="x").status_code, 400)
+        self.assertEqual(self.client.get("/api/quotes/favorites/").status_code, 400)
+
+    def test_not_modified_without_fetching_the_page(self):
+        etag = self.get(limit=2)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/quotes/favorites/", {"client_id": "c1", "limit": 2}, headers={"If-None-Match": etag}
+            )
+        self.assertEqual(response.status_code, 304)
+        # ページが違えば ETag も違う
+        self.assertNotEqual(self.get(limit=3)["ETag"], etag)
+
+        changes = [
+            lambda: Favorite.objects.create(quote=make_quote(6), client_id="c1"),
+            lambda: self.favorites[0].delete(),
+            lambda: Quote.objects.filter(pk=self.quotes[-1].pk).update(like_count=5),
+            lambda: Campaign.objects.filter(pk=self.campaign.pk).update(like_count=3),
+        ]
+        for change in changes:
+            change()
+            response = self.client.get(
+                "/api/quotes/favorites/", {"client_id": "c1", "limit": 2}, headers={"If-None-Match": etag}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+            etag = response["ETag"]
+
+
+class QuoteRangeTests(TestCase):
+    def setUp(self):
+        self.quotes = {day: make_quote(day, tags="悲劇,愛") for day in range(1, 29)}
+        self.campaign = make_campaign(start_date=datetime.date(2025, 1, 5), end_date=datetime.date(2025, 1, 6))
+        Favorite.objects.create(quote=self.quotes[2], client_id="c1")
+        Favorite.objects.create(campaign_id=self.campaign.pk, client_id="c1")
+
+    def get(self, start, end, **params):
+        return APIClient().get("/api/quotes/range/", {"start": start, "end": end, **params})
+
+    def test_query_count_does_not_depend_on_range_length(self):
+        # Campaign・Quote・タグ・Favorite を 1 クエリずつ
+        for end in ("2025-01-01", "2025-01-31", "2025-03-03"):
+            with self.assertNumQueries(4):
+                response = self.get("2025-01-01", end, client_id="c1")
+            self.assertEqual(response.status_code, 200)
+
+    def test_days(self):
+        days = self.get("2025-01-01", "2025-01-31", client_id="c1").json()["days"]
+        self.assertEqual(len(days), 31)
+        by_date = {day["date"]: day["quote"] for day in days}
+        self.assertEqual(by_date["2025-01-01"]["id"], self.quotes[1].pk)
+        self.assertEqual(by_date["2025-01-01"]["tag_list"], ["悲劇", "愛"])
+        self.assertIs(by_date["2025-01-01"]["liked"], False)
+        self.assertIs(by_date["2025-01-02"]["liked"], True)
+        self.assertEqual(by_date["2025-01-05"]["campaign_id"], self.campaign.pk)
+        self.assertIs(by_date["2025-01-05"]["liked"], True)
+        self.assertIsNone(by_date["2025-01-31"])
+
+    def test_invalid_ranges(self):
+        self.assertEqual(self.get("2025-01-01", "").status_code, 400)
+        self.assertEqual(self.get("2025-01-02", "2025-01-01").status_code, 400)
+        # 最大 62 日
+        self.assertEqual(self.get("2025-01-01", "2025-03-04").status_code, 400)
+        self.assertEqual(self.get("2025-01-01", "2025-03-03").status_code, 200)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        campaign_index.invalidate()
+        patch = mock.patch.object(campaign_index, "VERSION_CHECK_INTERVAL", float("inf"))
+        patch.start()
+        self.addCleanup(patch.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quote = make_quote(10)
+        self.client = APIClient()
+
+    def get(self, etag=None, client_id="c1"):
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.get("/api/quotes/by-date/", {"date": "2025-01-10", "client_id": client_id}, headers=headers)
+
+    def test_matching_etag_returns_304(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("Last-Modified", response)
+
+        # 本体はキャッシュから、liked の判定だけ
+        with self.assertNumQueries(1):
+            response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(self.get(f'W/{etag}, "other"').status_code, 304)
+
+    def test_changes_produce_a_new_etag(self):
+        etag = self.get()["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_favorite(payload_cache.QUOTE, self.quote.pk, client_id="c1")
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(response.json()["liked"], True)
+        etag = response["ETag"]
+        # liked は端末ごとに違うので、いいねしていない端末では一致しない
+        self.assertEqual(self.get(etag, client_id="c2").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quote.text = "書き換えた台詞"
+            self.quote.save()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["text"], "書き換えた台詞")
+        self.assertEqual(self.get(response["ETag"]).status_code, 304)
+
+    def test_today(self):
+        response = self.client.get("/api/quotes/today/", {"client_id": "c1"})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/api/quotes/today/", {"client_id": "c1"}, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+
+class FakeClock:
+    """TokenBucket のテスト用。sleep すると時計が進む"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTests(TestCase):
+    def test_burst_then_waits_for_rate(self):
+        clock = FakeClock()
+        with mock.patch.object(generation, "time", clock):
+            bucket = generation.TokenBucket(rate=2, capacity=3)
+            for _ in range(3):
+                bucket.acquire()
+            self.assertEqual(clock.sleeps, [])
+            bucket.acquire()
+        self.assertEqual(clock.sleeps, [0.5])
+
+    def test_tokens_refill_up_to_capacity(self):
+        clock = FakeClock()
+        with mock.patch.object(generation, "time", clock):
+            bucket = generation.TokenBucket(rate=1, capacity=2)
+            bucket.acquire()
+            bucket.acquire()
+            clock.now += 100
+            bucket.acquire()
+            bucket.acquire()
+            self.assertEqual(clock.sleeps, [])
+            bucket.acquire()
+        self.assertEqual(clock.sleeps, [1.0])
+
+    def test_rate_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            generation.TokenBucket(rate=0)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def test_entries_older_than_ttl_are_ignored(self):
+        response_cache = generation.ResponseCache(self.directory, ttl=60, max_bytes=1024)
+        response_cache.set("ab01", "content")
+        self.assertEqual(response_cache.get("ab01"), "content")
+        self.assertIsNone(response_cache.get("ab02"))
+
+        old = os.path.getmtime(response_cache._path("ab01")) - 61
+        os.utime(response_cache._path("ab01"), (old, old))
+        self.assertIsNone(response_cache.get("ab01"))
+
+    def test_evicts_oldest_entries_over_max_bytes(self):
+        response_cache = generation.ResponseCache(self.directory, ttl=10 ** 10, max_bytes=100)
+        keys = [f"{n:02d}key" for n in range(4)]
+        for n, key in enumerate(keys):
+            response_cache.set(key, "x" * 30)
+            # 書き込み順に mtime を並べる
+            os.utime(response_cache._path(key), (n + 1, n + 1))
+
+        # 4 件目で 120 バイトになり、9 割（90 バイト）まで古いものから消える
+        self.assertIsNone(response_cache.get(keys[0]))
+        for key in keys[1:]:
+            self.assertEqual(response_cache.get(key), "x" * 30)
+
+    def test_overwrite_does_not_double_count(self):
+        response_cache = generation.ResponseCache(self.directory, ttl=10 ** 10, max_bytes=100)
+        for _ in range(5):
+            response_cache.set("ab01", "x" * 30)
+        self.assertEqual(response_cache.get("ab01"), "x" * 30)
+
+
+class CheckpointTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "checkpoint.jsonl")
+
+    def test_load_skips_truncated_last_line(self):
+        checkpoint = generation.Checkpoint(self.path)
+        self.assertEqual(checkpoint.load(), {})
+        checkpoint.append(datetime.date(2025, 2, 1), {"text_ja": "一"})
+        checkpoint.append(datetime.date(2025, 2, 2), {"text_ja": "二"})
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"publish_date": "2025-02-03", "text_')
+
+        self.assertEqual(
+            checkpoint.load(),
+            {datetime.date(2025, 2, 1): {"text_ja": "一"}, datetime.date(2025, 2, 2): {"text_ja": "二"}},
+        )
+
+
+class GenerateMonthQuotesTests(TestCase):
+    def generate(self, *args):
+        call_command("generate_month_quotes", "2025", "2", "--backend", "fake", *args, stdout=io.StringIO())
+
+    def count_calls(self, side_effect=generation.FakeBackend.complete):
+        return mock.patch.object(generation.FakeBackend, "complete", autospec=True, side_effect=side_effect)
+
+    def test_generates_every_day_of_month(self):
+        self.generate("--seed", "1")
+        self.assertEqual(Quote.objects.count(), 28)
+        self.assertEqual(Quote.objects.values("text").distinct().count(), 28)
+        self.assertTrue(QuoteSearchGram.objects.exists())
+
+    def test_seed_fixes_playwrights_regardless_of_concurrency(self):
+        self.generate("--seed", "7")
+        sequential = dict(Quote.objects.values_list("publish_date", "author_name"))
+        Quote.objects.all().delete()
+
+        self.generate("--seed", "7", "--concurrency", "4")
+        self.assertEqual(dict(Quote.objects.values_list("publish_date", "author_name")), sequential)
+
+    def test_resumes_from_checkpoint_without_calling_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint.jsonl")
+            resumed = {
+                "playwright": {"name_ja": "世阿弥", "name_original": "Zeami", "region": "JP"},
+                "text_ja": "チェックポイントの台詞",
+                "text_original": "",
+                "source_ja": "風姿花伝",
+                "source_original": "",
+                "wiki_url": "",
+            }
+            generation.Checkpoint(path).append(datetime.date(2025, 2, 10), resumed)
+
+            with self.count_calls() as complete:
+                self.generate("--checkpoint", path)
+            self.assertEqual(complete.call_count, 27)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(len([json.loads(line) for line in f]), 28)
+
+        quote = Quote.objects.get(publish_date=datetime.date(2025, 2, 10))
+        self.assertEqual((quote.text, quote.author_name), ("チェックポイントの台詞", "世阿弥"))
+        self.assertEqual(Quote.objects.count(), 28)
+
+    def test_accepted_quotes_are_saved_before_a_crash(self):
+        calls = []
+        original = generation.FakeBackend.complete
+
+        def complete(backend, system_msg, user_msg):
+            calls.append(user_msg)
+            if len(calls) > 5:
+                raise KeyboardInterrupt
+            return original(backend, system_msg, user_msg)
+
+        with self.count_calls(complete), self.assertRaises(KeyboardInterrupt):
+            self.generate("--flush-every", "2")
+
+        # 5 件採用した時点で落ちても、2 件ずつ保存した 4 件は残る
+        self.assertEqual(
+            list(Quote.objects.order_by("publish_date").values_list("publish_date", flat=True)),
+            [datetime.date(2025, 2, day) for day in range(1, 5)],
+        )
+
+    def test_skips_dates_already_registered(self):
+        make_quote(publish_date=datetime.date(2025, 2, 3))
+        with self.count_calls() as complete:
+            self.generate()
+        self.assertEqual(complete.call_count, 27)
+        self.assertEqual(Quote.objects.count(), 28)
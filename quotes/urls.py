@@ -3,16 +3,26 @@ from .views import (
     TodayQuoteView,
     ToggleFavoriteView,
     FavoriteListView,
+    FavoriteMergeView,
+    FavoriteSyncView,
     QuoteByDateView,
+    QuoteListView,
+    QuoteRangeView,
+    QuoteSearchView,
     MeView,
     SubscriptionVerifyView,
 )
 
 urlpatterns = [
+    path("", QuoteListView.as_view(), name="quote-list"),
     path("today/", TodayQuoteView.as_view(), name="today-quote"),
     path("by-date/", QuoteByDateView.as_view(), name="quote-by-date"),
+    path("range/", QuoteRangeView.as_view(), name="quote-range"),
+    path("search/", QuoteSearchView.as_view(), name="quote-search"),
     path("<int:pk>/toggle-favorite/", ToggleFavoriteView.as_view(), name="toggle-favorite"),
     path("favorites/", FavoriteListView.as_view(), name="favorite-list"),
+    path("favorites/merge/", FavoriteMergeView.as_view(), name="favorite-merge"),
+    path("favorites/sync/", FavoriteSyncView.as_view(), name="favorite-sync"),
     path("me/", MeView.as_view(), name="me"),
     path("subscription/verify/", SubscriptionVerifyView.as_view(), name="subscription-verify"),
 ]
\ No newline at end of file
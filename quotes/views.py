@@ -1,6 +1,8 @@
-from datetime import date
+import logging
+from datetime import date, timedelta
 
-from django.db import transaction
+from django.db import models, transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, prefetch_related_objects
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
@@ -8,15 +10,42 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authtoken.models import Token
 
+from . import cache as payload_cache
+from . import search
+from .favorites import link_client, merge_client_favorites, sync_favorites, toggle_favorite
+from .conditional import etag_matches, make_etag, not_modified, set_validators
 from .models import Quote, Favorite, User
-from .serializers import QuoteSerializer, UserSerializer
-
-from django.db import models, transaction
-import json
-import logging
+from .pagination import InvalidCursor, keyset_page
+from .tags import TAGS_PREFETCH, tag_names_for
+from .serializers import (
+    FAVORITE_QUOTE_FIELDS,
+    FavoriteChangeSerializer,
+    FavoriteRowSerializer,
+    QuoteSerializer,
+    UserSerializer,
+)
 
 logger = logging.getLogger(__name__)
 
+# いいね一覧の 1 ページあたりの件数
+FAVORITES_PAGE_SIZE = 50
+FAVORITES_MAX_PAGE_SIZE = 200
+
+# /range/ で指定できる最大日数
+QUOTE_RANGE_MAX_DAYS = 62
+
+# 台詞一覧（/api/quotes/?tag=）の 1 ページあたりの件数
+QUOTE_LIST_PAGE_SIZE = 50
+QUOTE_LIST_MAX_PAGE_SIZE = 200
+
+# 検索結果の 1 ページあたりの件数
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# /favorites/sync/ で 1 回に受け付ける操作の上限
+FAVORITE_SYNC_MAX_CHANGES = 500
+
+
 def get_client_id_from_request(request):
     """
     端末側で発行した client_id（UUIDなど）をヘッダー or クエリ or ボディから拾う。
@@ -26,11 +55,54 @@ def get_client_id_from_request(request):
     return cid or ""
 
 
+def favorites_for_request(request):
+    """
+    リクエストの主体（user 優先、なければ client_id）の Favorite。どちらも無ければ None
+    """
+    if request.user.is_authenticated:
+        return Favorite.objects.filter(user=request.user)
+
+    client_id = get_client_id_from_request(request)
+    if client_id:
+        return Favorite.objects.filter(client_id=client_id, user=None)
+    return None
+
+
+def is_liked(request, body):
+    """
+    キャッシュ済みの本体に対する liked 判定
+    """
+    favorites = favorites_for_request(request)
+    if favorites is None:
+        return False
+
+    if body["is_campaign"]:
+        return favorites.filter(campaign_id=body["campaign_id"]).exists()
+    return favorites.filter(quote_id=body["id"]).exists()
+
+
+def payload_response(request, payload):
+    """
+    キャッシュ済みの Payload に liked を上乗せして返す。
+    ETag は本体のバージョンと liked から作るので、一致すれば本体に触れずに 304
+    """
+    liked = is_liked(request, payload.body)
+    etag = make_etag(payload.version, liked)
+    if etag_matches(request, etag):
+        return not_modified(etag, payload.last_modified)
+
+    data = dict(payload.body)
+    data["liked"] = liked
+    return set_validators(Response(data), etag, payload.last_modified)
+
+
 class AppleSignInView(APIView):
     """
     Apple Sign-In の結果を受け取り、User を作成または取得:
     POST /api/auth/signin/
-    body: { "apple_id": "001234.xxx", "id_token": "eyJxxx...", "email": "user@example.com" }
+    body: { "apple_id": "001234.xxx", "id_token": "eyJxxx...", "email": "user@example.com", "client_id": "端末UUID" }
+
+    client_id を送ると、その端末で匿名で付けたいいねを User に引き継ぐ。
     """
     permission_classes = []  # 認証不要
 
@@ -61,11 +133,22 @@ class AppleSignInView(APIView):
             serializer = UserSerializer(user)
             
             logger.info(f"User {'created' if created else 'retrieved'}: {user.id} (Apple ID: {apple_id})")
+
+            # 匿名のいいねの引き継ぎ（失敗してもサインインは成功させる）
+            merged = 0
+            client_id = request.data.get("client_id") or get_client_id_from_request(request)
+            if client_id:
+                try:
+                    link_client(user, client_id)
+                    merged, _ = merge_client_favorites([client_id])
+                except Exception as e:
+                    logger.error(f"Favorite merge error: {str(e)} (client_id: {client_id})")
             
             return Response({
                 "token": token.key,
                 "user": serializer.data,
                 "created": created,
+                "merged_favorites": merged,
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -153,62 +236,14 @@ class TodayQuoteView(APIView):
     permission_classes = []  # 認証不要
 
     def get(self, request, format=None):
-        from tracking.models import Campaign
-        
-        client_id = get_client_id_from_request(request)
         today = timezone.localdate()
 
-        # Campaign チェック（今日が範囲内か）
-        campaign = Campaign.objects.filter(
-            start_date__lte=today,
-            end_date__gte=today
-        ).first()
-        
-        if campaign:
-            # Campaign を Quote として返す
-            liked = False
-            if request.user.is_authenticated:
-                liked = Favorite.objects.filter(campaign_id=campaign.id, user=request.user).exists()
-            elif client_id:
-                liked = Favorite.objects.filter(campaign_id=campaign.id, client_id=client_id).exists()
-            
-            return Response({
-                "id": None,
-                "campaign_id": campaign.id,
-                "text": campaign.text,
-                "client_name": campaign.client_name,
-                "url": campaign.url,
-                "sns_url": campaign.sns_url,
-                "is_campaign": True,
-                "liked": liked,
-                "like_count": Favorite.objects.filter(campaign_id=campaign.id).count(),
-            })
-
-        # 通常の Quote
-        try:
-            quote = Quote.objects.get(publish_date=today)
-        except Quote.DoesNotExist:
-            # なければ一番近い過去 or ランダム
-            quote = (
-                Quote.objects.filter(publish_date__lte=today).order_by("-publish_date").first()
-                or Quote.objects.order_by("?").first()
-            )
-            if not quote:
-                return Response({"detail": "No quotes available"}, status=status.HTTP_404_NOT_FOUND)
-
-        # liked 判定: user 優先、なければ client_id
-        liked = False
-        if request.user.is_authenticated:
-            liked = Favorite.objects.filter(quote=quote, user=request.user).exists()
-        elif client_id:
-            liked = Favorite.objects.filter(quote=quote, client_id=client_id).exists()
+        # 本体は全ユーザー共通なのでキャッシュから取り、liked だけ上乗せ
+        payload = payload_cache.get_payload_for_date(today, fallback=True)
+        if payload is None:
+            return Response({"detail": "No quotes available"}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = QuoteSerializer(quote, context={"request": request})
-        data = serializer.data
-        data["liked"] = liked
-        data["is_campaign"] = False
-
-        return Response(data)
+        return payload_response(request, payload)
 
 
 class ToggleFavoriteView(APIView):
@@ -218,135 +253,127 @@ class ToggleFavoriteView(APIView):
     または POST /api/campaigns/<id>/toggle-favorite/ (campaign_id を指定)
     認証済み → user に紐づけ
     未認証 → client_id に紐づけ（後方互換）
+
+    切り替えと like_count の更新は PostgreSQL なら 1 文で行う（quotes/favorites.py）。
     """
     permission_classes = []  # 認証不要
 
     def post(self, request, pk, format=None):
         # Campaign のお気に入りか確認
         is_campaign = request.data.get('is_campaign', False)
-        
+
         if is_campaign:
-            # Campaign のお気に入り
-            campaign_id = pk
-            
-            with transaction.atomic():
-                # 認証済みユーザーの場合
-                if request.user.is_authenticated:
-                    fav, created = Favorite.objects.get_or_create(
-                        campaign_id=campaign_id,
-                        user=request.user,
-                        defaults={'quote': None}
-                    )
-                    liked = created
-                    if not created:
-                        fav.delete()
-                        liked = False
-                        
-                # 未認証の場合（client_id を使用）
-                else:
-                    client_id = (
-                        request.data.get("client_id")
-                        or request.headers.get("X-Client-Id")
-                        or request.query_params.get("client_id")
-                    )
-                    if not client_id:
-                        return Response({"detail": "client_id or authentication required"}, status=status.HTTP_400_BAD_REQUEST)
-
-                    fav, created = Favorite.objects.get_or_create(
-                        campaign_id=campaign_id,
-                        client_id=client_id,
-                        user=None,
-                        defaults={'quote': None}
-                    )
-                    liked = created
-                    if not created:
-                        fav.delete()
-                        liked = False
-
-                like_count = Favorite.objects.filter(campaign_id=campaign_id).count()
-
-            return Response({"liked": liked, "like_count": like_count})
-        
-        # Quote のお気に入り（既存ロジック）
-        try:
-            quote = Quote.objects.get(pk=pk)
-        except Quote.DoesNotExist:
-            return Response({"detail": "Quote not found"}, status=status.HTTP_404_NOT_FOUND)
+            from tracking import campaign_index
 
-        with transaction.atomic():
-            # 認証済みユーザーの場合
-            if request.user.is_authenticated:
-                fav, created = Favorite.objects.get_or_create(
-                    quote=quote,
-                    user=request.user,
-                )
-                if created:
-                    Quote.objects.filter(pk=quote.pk).update(like_count=models.F("like_count") + 1)
-                    liked = True
-                else:
-                    fav.delete()
-                    Quote.objects.filter(pk=quote.pk).update(like_count=models.F("like_count") - 1)
-                    liked = False
-                    
-            # 未認証の場合（client_id を使用）
-            else:
-                client_id = (
-                    request.data.get("client_id")
-                    or request.headers.get("X-Client-Id")
-                    or request.query_params.get("client_id")
-                )
-                if not client_id:
-                    return Response({"detail": "client_id or authentication required"}, status=status.HTTP_400_BAD_REQUEST)
+            # 存在確認はインデックスで（DB に問い合わせない）
+            if pk not in campaign_index.get_index().by_id:
+                return Response({"detail": "Campaign not found"}, status=status.HTTP_404_NOT_FOUND)
+            kind = payload_cache.CAMPAIGN
+        else:
+            kind = payload_cache.QUOTE
 
-                fav, created = Favorite.objects.get_or_create(
-                    quote=quote,
-                    client_id=client_id,
-                    user=None,
-                )
-                if created:
-                    Quote.objects.filter(pk=quote.pk).update(like_count=models.F("like_count") + 1)
-                    liked = True
-                else:
-                    fav.delete()
-                    Quote.objects.filter(pk=quote.pk).update(like_count=models.F("like_count") - 1)
-                    liked = False
+        # 認証済みユーザーの場合
+        if request.user.is_authenticated:
+            result = toggle_favorite(kind, pk, user=request.user)
+        # 未認証の場合（client_id を使用）
+        else:
+            client_id = (
+                request.data.get("client_id")
+                or request.headers.get("X-Client-Id")
+                or request.query_params.get("client_id")
+            )
+            if not client_id:
+                return Response({"detail": "client_id or authentication required"}, status=status.HTTP_400_BAD_REQUEST)
+            result = toggle_favorite(kind, pk, client_id=client_id)
 
-            # 最新の like_count を再取得
-            quote.refresh_from_db(fields=["like_count"])
+        if result is None:
+            detail = "Campaign not found" if kind == payload_cache.CAMPAIGN else "Quote not found"
+            return Response({"detail": detail}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response({"liked": liked, "like_count": quote.like_count})
+        liked, like_count = result
+        return Response({"liked": liked, "like_count": like_count})
 
 
 class FavoriteListView(APIView):
     """
-    いいねした台詞一覧:
+    いいねした台詞一覧（新しい順）:
     GET /api/quotes/favorites?client_id=xxxx (未認証)
     または GET /api/quotes/favorites/ (認証済み)
     → MakuMark 内の「いいね一覧」画面で使う
+
+    ?limit=N（既定 50、最大 200）件ずつ返す。続きがある場合は
+    X-Next-Cursor ヘッダー（と Link ヘッダー）のカーソルを ?cursor= に渡す。
     """
     permission_classes = []  # 認証不要
 
     def get(self, request, format=None):
+        from tracking import campaign_index
+        from tracking.models import Campaign
+
         # 認証済みユーザーの場合
         if request.user.is_authenticated:
-            favorites = Favorite.objects.filter(user=request.user).select_related("quote").order_by("-created_at")
+            favorites = Favorite.objects.filter(user=request.user)
         # 未認証の場合（client_id を使用）
         else:
             client_id = get_client_id_from_request(request)
             if not client_id:
                 return Response({"detail": "client_id or authentication required"}, status=status.HTTP_400_BAD_REQUEST)
-            favorites = Favorite.objects.filter(client_id=client_id, user=None).select_related("quote").order_by("-created_at")
+            favorites = Favorite.objects.filter(client_id=client_id, user=None)
 
-        quotes = [f.quote for f in favorites]
-
-        # 各 quote ごとの liked フラグは true 固定（自分が押した一覧なので）
-        data = []
-        for q in quotes:
-            s = QuoteSerializer(q, context={"request": request}).data
-            s["liked"] = True
-            data.append(s)
-
-        return Response(data)
+        try:
+            limit = int(request.query_params.get("limit", FAVORITES_PAGE_SIZE))
+        except ValueError:
+            return Response({"detail": "invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, FAVORITES_MAX_PAGE_SIZE))
+
+        # ETag は一覧の状態を表す集計 1 クエリと Campaign インデックスのバージョンから作り、
+        # 一致すればページを取らずに 304。いいねの追加・削除（件数・最大 id）、
+        # Quote の更新日時、Quote / Campaign のいいね数、Campaign の追加・変更・削除のどれでも変わる
+        cursor = request.query_params.get("cursor")
+        index = campaign_index.get_index()
+        campaign_like_count = Subquery(Campaign.objects.filter(pk=OuterRef("campaign_id")).values("like_count"))
+        state = favorites.annotate(campaign_like_count=campaign_like_count).aggregate(
+            count=Count("id"),
+            last_id=Max("id"),
+            quote_updated_at=Max("quote__updated_at"),
+            quote_likes=Sum("quote__like_count"),
+            campaign_likes=Sum("campaign_like_count"),
+        )
+        etag = make_etag(cursor, limit, index.version, *state.values())
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        # 表示に使う列だけを 1 クエリで取る（Campaign のいいね数もサブクエリで同時に）
+        rows = favorites.values(
+            "id",
+            "created_at",
+            "campaign_id",
+            *(f"quote__{field}" for field in FAVORITE_QUOTE_FIELDS),
+            campaign_like_count=campaign_like_count,
+        )
+        try:
+            rows, next_cursor = keyset_page(rows, cursor, limit)
+        except InvalidCursor:
+            return Response({"detail": "invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 削除済みの Quote / Campaign を指している行は除く
+        campaigns = index.by_id
+        rows = [
+            row for row in rows
+            if (row["campaign_id"] in campaigns if row["campaign_id"] else row["quote__id"] is not None)
+        ]
+
+        # 各行の liked は true 固定（自分が押した一覧なので）
+        tags = tag_names_for([row["quote__id"] for row in rows if not row["campaign_id"]])
+        data = FavoriteRowSerializer(rows, many=True, context={"campaigns": campaigns, "tags": tags}).data
+        response = set_validators(Response(data), etag)
+
+        if next_cursor:
+            params = request.query_params.copy()
+            params["cursor"] = next_cursor
+            response["X-Next-Cursor"] = next_cursor
+            response["Link"] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+        return response
 
     
 class QuoteByDateView(APIView):
@@ -360,8 +387,6 @@ class QuoteByDateView(APIView):
     permission_classes = []  # 認証不要
 
     def get(self, request, format=None):
-        from tracking.models import Campaign
-        
         date_str = request.query_params.get("date")
         if not date_str:
             return Response({"detail": "date is required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -371,49 +396,244 @@ class QuoteByDateView(APIView):
         except ValueError:
             return Response({"detail": "invalid date"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Campaign チェック
-        campaign = Campaign.objects.filter(
-            start_date__lte=target_date,
-            end_date__gte=target_date
-        ).first()
-        
-        if campaign:
-            # Campaign を Quote として返す
-            client_id = get_client_id_from_request(request)
-            liked = False
-            if request.user.is_authenticated:
-                liked = Favorite.objects.filter(campaign_id=campaign.id, user=request.user).exists()
-            elif client_id:
-                liked = Favorite.objects.filter(campaign_id=campaign.id, client_id=client_id).exists()
-            
-            return Response({
-                "id": None,
-                "campaign_id": campaign.id,
-                "text": campaign.text,
-                "client_name": campaign.client_name,
-                "url": campaign.url,
-                "sns_url": campaign.sns_url,
-                "is_campaign": True,
-                "liked": liked,
-                "like_count": Favorite.objects.filter(campaign_id=campaign.id).count(),
-            })
-
-        # 通常の Quote
-        try:
-            quote = Quote.objects.get(publish_date=target_date)
-        except Quote.DoesNotExist:
+        payload = payload_cache.get_payload_for_date(target_date)
+        if payload is None:
             return Response({"detail": "Quote not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # liked 判定: user 優先、なければ client_id
-        liked = False
-        client_id = get_client_id_from_request(request)
+        return payload_response(request, payload)
+
+
+
+class QuoteRangeView(APIView):
+    """
+    期間内の各日の台詞をまとめて返す（カレンダー・スワイプ用）:
+    GET /api/quotes/range/?start=YYYY-MM-DD&end=YYYY-MM-DD&client_id=xxxx
+    
+    各日の中身は /by-date/ と同じ形（無い日は null）。
+    期間の長さに関係なく、Quote・Campaign・Favorite を 1 クエリずつ引くだけ。
+    """
+    permission_classes = []  # 認証不要
+
+    def get(self, request, format=None):
+        from tracking.campaign_index import CampaignIndex
+        from tracking.models import Campaign
+
+        try:
+            start = date.fromisoformat(request.query_params.get("start", ""))
+            end = date.fromisoformat(request.query_params.get("end", ""))
+        except ValueError:
+            return Response({"detail": "start and end are required (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if end < start:
+            return Response({"detail": "end must be on or after start"}, status=status.HTTP_400_BAD_REQUEST)
+
+        num_days = (end - start).days + 1
+        if num_days > QUOTE_RANGE_MAX_DAYS:
+            return Response(
+                {"detail": f"range must be at most {QUOTE_RANGE_MAX_DAYS} days"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # 期間に重なる Campaign（日ごとの選び方は TodayQuoteView と同じ）
+        campaigns = CampaignIndex(Campaign.objects.filter(start_date__lte=end, end_date__gte=start))
+
+        # 期間内の Quote（同じ日に複数あれば新しい方）
+        quotes = {}
+        for quote in Quote.objects.filter(publish_date__range=(start, end)).prefetch_related(TAGS_PREFETCH):
+            quotes.setdefault(quote.publish_date, quote)
+        quote_data = dict(zip(
+            quotes,
+            QuoteSerializer(list(quotes.values()), many=True).data,
+        ))
+
+        days = []
+        for offset in range(num_days):
+            day = start + timedelta(days=offset)
+            campaign = campaigns.campaign_for(day)
+            if campaign:
+                payload = payload_cache.campaign_body(campaign)
+            elif day in quote_data:
+                payload = payload_cache.quote_body(quote_data[day])
+            else:
+                payload = None
+            days.append({"date": day.isoformat(), "quote": payload})
+
+        # liked はまとめて 1 クエリ
+        favorites = favorites_for_request(request)
+        payloads = [d["quote"] for d in days if d["quote"]]
+        if favorites is not None and payloads:
+            quote_ids = {p["id"] for p in payloads if not p["is_campaign"]}
+            campaign_ids = {p["campaign_id"] for p in payloads if p["is_campaign"]}
+            liked = set(
+                favorites
+                .filter(models.Q(quote_id__in=quote_ids) | models.Q(campaign_id__in=campaign_ids))
+                .values_list("quote_id", "campaign_id")
+            )
+            for p in payloads:
+                key = (None, p["campaign_id"]) if p["is_campaign"] else (p["id"], None)
+                p["liked"] = key in liked
+
+        return Response({
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days": days,
+        })
+
+
+class QuoteSearchView(APIView):
+    """
+    台詞の検索:
+    GET /api/quotes/search/?q=恋 盲目&limit=20&offset=0&client_id=xxxx
+
+    空白区切りの語をすべて含む台詞（本文・原文・作者・出典・タグのどこかに部分一致）を
+    スコアの高い順に返す。各結果の highlights は列ごとの一致位置 [start, end)（文字単位）。
+    """
+    permission_classes = []  # 認証不要
+
+    def get(self, request, format=None):
+        terms = search.parse_terms(request.query_params.get("q"))
+        if not terms:
+            return Response({"detail": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.query_params.get("limit", SEARCH_PAGE_SIZE))
+            offset = int(request.query_params.get("offset", 0))
+        except ValueError:
+            return Response({"detail": "invalid limit or offset"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+        offset = max(0, offset)
+
+        page, count = search.search_quotes(terms, offset, limit)
+        quotes = [quote for quote, _, _ in page]
+        prefetch_related_objects(quotes, TAGS_PREFETCH)
+
+        # liked はまとめて 1 クエリ
+        favorites = favorites_for_request(request)
+        liked = set()
+        if favorites is not None and quotes:
+            liked = set(favorites.filter(quote_id__in=[q.pk for q in quotes]).values_list("quote_id", flat=True))
+        for quote in quotes:
+            quote.liked = quote.pk in liked
+
+        items = []
+        for data, (_, score, highlights) in zip(QuoteSerializer(quotes, many=True).data, page):
+            data["score"] = score
+            data["highlights"] = highlights
+            items.append(data)
+
+        return Response({
+            "query": " ".join(terms),
+            "count": count,
+            "next_offset": offset + limit if offset + limit < count else None,
+            "results": items,
+        })
+
+
+class QuoteListView(APIView):
+    """
+    台詞一覧（配信日の新しい順）:
+    GET /api/quotes/?tag=恋&client_id=xxxx
+
+    ?tag= を付けるとそのタグの台詞だけ（QuoteTag のインデックスを引く）。
+    ?limit=N（既定 50、最大 200）件ずつ返し、続きは X-Next-Cursor（と Link ヘッダー）の
+    カーソルを ?cursor= に渡す。
+    """
+    permission_classes = []  # 認証不要
+
+    def get(self, request, format=None):
+        quotes = Quote.objects.all()
+        tag = (request.query_params.get("tag") or "").strip()
+        if tag:
+            quotes = quotes.filter(quote_tags__tag__name=tag)
+
+        try:
+            limit = int(request.query_params.get("limit", QUOTE_LIST_PAGE_SIZE))
+        except ValueError:
+            return Response({"detail": "invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, QUOTE_LIST_MAX_PAGE_SIZE))
+
+        try:
+            quotes, next_cursor = keyset_page(
+                quotes.prefetch_related(TAGS_PREFETCH),
+                request.query_params.get("cursor"),
+                limit,
+                field="publish_date",
+            )
+        except InvalidCursor:
+            return Response({"detail": "invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # liked はまとめて 1 クエリ
+        favorites = favorites_for_request(request)
+        liked = set()
+        if favorites is not None and quotes:
+            liked = set(favorites.filter(quote_id__in=[q.pk for q in quotes]).values_list("quote_id", flat=True))
+        for quote in quotes:
+            quote.liked = quote.pk in liked
+
+        response = Response(QuoteSerializer(quotes, many=True).data)
+        if next_cursor:
+            params = request.query_params.copy()
+            params["cursor"] = next_cursor
+            response["X-Next-Cursor"] = next_cursor
+            response["Link"] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+        return response
+
+
+class FavoriteMergeView(APIView):
+    """
+    この端末で匿名（client_id）で付けたいいねを、ログイン中のユーザーに引き継ぐ:
+    POST /api/quotes/favorites/merge/
+    body: { "client_id": "端末UUID" }
+    → サインイン済みの状態で起動した端末用（サインイン時は AppleSignInView が同じことをする）
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        client_id = request.data.get("client_id") or get_client_id_from_request(request)
+        if not client_id:
+            return Response({"detail": "client_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        link_client(request.user, client_id)
+        merged, removed = merge_client_favorites([client_id])
+        return Response({"merged": merged, "removed_duplicates": removed})
+
+
+class FavoriteSyncView(APIView):
+    """
+    オフライン中に溜めたいいね操作をまとめて反映する:
+    POST /api/quotes/favorites/sync/
+    body: {
+      "client_id": "端末UUID"（未認証の場合）,
+      "changes": [{"kind": "quote" | "campaign", "id": 1, "liked": true, "ts": "2025-01-01T09:00:00+09:00"}, ...]
+    }
+    → 対象ごとに ts が最後の状態に揃え、反映後のいいね済み一覧を返す
+      { "added", "removed", "ignored": [{"kind", "id"}], "favorites": {"quotes": [...], "campaigns": [...]} }
+
+    toggle-favorite と違い「切り替え」ではなく「この状態にする」なので、
+    同じ操作を再送しても結果は変わらない。
+    """
+    permission_classes = []  # 認証不要
+
+    def post(self, request, format=None):
+        changes = request.data.get("changes")
+        if not isinstance(changes, list):
+            return Response({"detail": "changes must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(changes) > FAVORITE_SYNC_MAX_CHANGES:
+            return Response(
+                {"detail": f"too many changes (max {FAVORITE_SYNC_MAX_CHANGES})"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = FavoriteChangeSerializer(data=changes, many=True)
+        if not serializer.is_valid():
+            return Response({"detail": "invalid changes", "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 認証済みユーザーの場合
         if request.user.is_authenticated:
-            liked = Favorite.objects.filter(quote=quote, user=request.user).exists()
-        elif client_id:
-            liked = Favorite.objects.filter(quote=quote, client_id=client_id, user=None).exists()
-
-        serializer = QuoteSerializer(quote, context={"request": request})
-        data = serializer.data
-        data["liked"] = liked
-        data["is_campaign"] = False
-        return Response(data)
\ No newline at end of file
+            result = sync_favorites(serializer.validated_data, user=request.user)
+        # 未認証の場合（client_id を使用）
+        else:
+            client_id = request.data.get("client_id") or get_client_id_from_request(request)
+            if not client_id:
+                return Response({"detail": "client_id or authentication required"}, status=status.HTTP_400_BAD_REQUEST)
+            result = sync_favorites(serializer.validated_data, client_id=client_id)
+        return Response(result)
@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import Campaign, QuoteView, QuoteClick, CampaignView, CampaignClick
+from django.contrib import admin, messages
+from . import campaign_index
+from .models import Campaign, QuoteView, QuoteClick, CampaignView, CampaignClick, DailyStat, RollupState
 
 
 @admin.register(Campaign)
@@ -10,6 +11,17 @@ class CampaignAdmin(admin.ModelAdmin):
     date_hierarchy = 'start_date'
     ordering = ['-start_date']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        others = list(campaign_index.overlapping(obj))
+        if others:
+            self.message_user(
+                request,
+                f"期間が重なっている Campaign があります: {', '.join(str(c) for c in others)}。"
+                "重なった日は開始日が新しい方を配信します。",
+                messages.WARNING,
+            )
+
 
 @admin.register(QuoteView)
 class QuoteViewAdmin(admin.ModelAdmin):
@@ -49,3 +61,17 @@ class CampaignClickAdmin(admin.ModelAdmin):
     date_hierarchy = 'clicked_at'
     ordering = ['-clicked_at']
     readonly_fields = ['campaign', 'client_id', 'action', 'clicked_at']
+
+
+@admin.register(DailyStat)
+class DailyStatAdmin(admin.ModelAdmin):
+    list_display = ['date', 'entity_type', 'entity_id', 'action', 'views', 'clicks', 'unique_clients']
+    list_filter = ['entity_type', 'action', 'date']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+    readonly_fields = ['date', 'entity_type', 'entity_id', 'action', 'views', 'clicks', 'unique_clients', 'updated_at']
+
+
+@admin.register(RollupState)
+class RollupStateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'completed_through', 'updated_at']
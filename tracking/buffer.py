@@ -0,0 +1,166 @@
+"""
+トラッキングイベントの書き込みバッファ（write-behind）。
+
+リクエストはイベントをプロセス内のキューに積むだけで 202 を返し、
+バックグラウンドスレッドが件数 or 経過時間のしきい値でまとめて bulk_create する。
+ワーカー終了時（atexit）にも残りを書き出す。
+
+注意:
+- viewed_at / clicked_at は auto_now_add のため「書き込み時刻」になる（最大で flush 間隔ぶん遅れる）
+- 参照先（Quote / Campaign）の存在確認は flush 時にまとめて行い、見つからないものは捨てる
+- プロセスが強制終了（SIGKILL など）された場合、未書き込みのイベントは失われる
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .events import save_events
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    def __init__(self, max_size=10000, flush_size=500, flush_interval=2.0):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._events = []
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._atexit_registered = False
+
+        # カウンター
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0           # キュー満杯で受け付けなかった件数
+        self.invalid = 0           # flush 時に参照先が見つからず捨てた件数
+        self.failed = 0            # flush 自体が失敗して失われた件数
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_size=getattr(settings, 'TRACKING_BUFFER_MAX_SIZE', 10000),
+            flush_size=getattr(settings, 'TRACKING_BUFFER_FLUSH_SIZE', 500),
+            flush_interval=getattr(settings, 'TRACKING_BUFFER_FLUSH_INTERVAL', 2.0),
+        )
+
+    def append(self, model, target, fields):
+        """イベントを積む。満杯なら False（dropped として数える）"""
+        with self._lock:
+            if len(self._events) >= self.max_size:
+                self.dropped += 1
+                return False
+            self._events.append((None, model, target, fields))
+            self.enqueued += 1
+            size = len(self._events)
+
+        self._ensure_started()
+        if size >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """キューの中身をすべて書き出す。戻り値は書き込んだ件数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._events = self._events, []
+            if not batch:
+                return 0
+
+            started = time.monotonic()
+            try:
+                close_old_connections()
+                created, missing = save_events(batch)
+            except Exception:
+                logger.exception('Tracking buffer flush failed (%d events lost)', len(batch))
+                with self._lock:
+                    self.failed += len(batch)
+                return 0
+            finally:
+                elapsed = time.monotonic() - started
+
+            with self._lock:
+                self.written += created
+                self.invalid += len(missing)
+                self.flushes += 1
+                self.last_flush_seconds = elapsed
+                self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+                self.total_flush_seconds += elapsed
+            return created
+
+    def stop(self):
+        """flusher を止めて残りを書き出す（ワーカー終了時）"""
+        self._stopping = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'queue_depth': len(self._events),
+                'max_size': self.max_size,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'invalid': self.invalid,
+                'failed': self.failed,
+                'flushes': self.flushes,
+                'last_flush_seconds': round(self.last_flush_seconds, 6),
+                'max_flush_seconds': round(self.max_flush_seconds, 6),
+                'avg_flush_seconds': round(self.total_flush_seconds / self.flushes, 6) if self.flushes else 0.0,
+            }
+
+    def _ensure_started(self):
+        # fork 後の子プロセスにはスレッドが引き継がれないので pid も見る
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='tracking-buffer', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def buffering_enabled():
+    return getattr(settings, 'TRACKING_BUFFER_ENABLED', False)
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = EventBuffer.from_settings()
+    return _buffer
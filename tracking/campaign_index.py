@@ -0,0 +1,135 @@
+"""
+Campaign の期間インデックス（プロセス内）。
+
+Campaign は件数が少なく滅多に変わらないので、全件を開始日順に持っておき
+「日付 D を含む Campaign はどれか」を DB に問い合わせずに二分探索で答える。
+
+- 同じプロセス内の変更は post_save / post_delete で即座に作り直す（tracking/signals.py）
+- 他ワーカー・管理コマンドでの変更は、DB から読むバージョン（件数と updated_at の最大値）で検知する。
+  Django のキャッシュはプロセス内メモリのこともあるので使わない。
+  QuerySet.update() は updated_at を変えないので、期間などを変えるときは save() を使うこと
+- 期間が重なる Campaign は構築時に検出してログに出す（管理画面では保存時に警告する）。
+  重なった日は開始日が新しい方を配信する
+"""
+import bisect
+import logging
+import threading
+import time
+
+from django.db.models import Count, Max
+
+logger = logging.getLogger(__name__)
+
+# バージョンを DB に確認する間隔（秒）。この間は手元のインデックスをそのまま使う
+VERSION_CHECK_INTERVAL = 1.0
+
+
+class CampaignIndex:
+    def __init__(self, campaigns, version=None):
+        self.version = version
+        self._campaigns = sorted(campaigns, key=lambda c: (c.start_date, c.pk))
+        self._starts = [c.start_date for c in self._campaigns]
+
+        # 先頭から i 番目までの end_date の最大値（後ろ向きに走査するときの打ち切り用）
+        self._max_ends = []
+        for c in self._campaigns:
+            self._max_ends.append(max(self._max_ends[-1], c.end_date) if self._max_ends else c.end_date)
+
+        self.by_id = {c.pk: c for c in self._campaigns}
+        self.overlaps = self._find_overlaps()
+
+    def _find_overlaps(self):
+        overlaps = []
+        latest = None  # これまでで最も遅く終わる Campaign
+        for c in self._campaigns:
+            if latest is not None and c.start_date <= latest.end_date:
+                overlaps.append((latest, c))
+            if latest is None or c.end_date > latest.end_date:
+                latest = c
+        return overlaps
+
+    def covering(self, day):
+        """day を含む Campaign を開始日の新しい順に返す"""
+        found = []
+        for i in range(bisect.bisect_right(self._starts, day) - 1, -1, -1):
+            if self._max_ends[i] < day:
+                break
+            c = self._campaigns[i]
+            if c.end_date >= day:
+                found.append(c)
+        return found
+
+    def campaign_for(self, day):
+        """day に配信する Campaign（重なっている場合は開始日が新しい方）"""
+        found = self.covering(day)
+        return found[0] if found else None
+
+    def __len__(self):
+        return len(self._campaigns)
+
+
+_index = None
+_index_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _current_version():
+    """件数と updated_at の最大値から作る文字列。追加・削除・save() のどれでも変わる"""
+    from .models import Campaign
+
+    stats = Campaign.objects.aggregate(n=Count('id'), latest=Max('updated_at'))
+    latest = stats['latest'].timestamp() if stats['latest'] else 0
+    return f"{stats['n']}-{latest:.6f}"
+
+
+def _build(version):
+    from .models import Campaign
+
+    index = CampaignIndex(list(Campaign.objects.all()), version)
+    for a, b in index.overlaps:
+        logger.warning('Campaign periods overlap: %s / %s', a, b)
+    return index
+
+
+def get_index():
+    global _index, _index_version, _checked_at
+
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return _index
+
+    version = _current_version()
+    with _lock:
+        if _index is None or _index_version != version:
+            _index = _build(version)
+            _index_version = version
+        _checked_at = now
+        return _index
+
+
+def overlapping(campaign):
+    """campaign と期間が重なる他の Campaign（DB から引く）"""
+    from .models import Campaign
+
+    return (
+        Campaign.objects
+        .filter(start_date__lte=campaign.end_date, end_date__gte=campaign.start_date)
+        .exclude(pk=campaign.pk)
+        .order_by('start_date', 'pk')
+    )
+
+
+def invalidate():
+    """手元のインデックスを捨てる（他ワーカーは次のバージョン確認で気付く）"""
+    global _index
+    with _lock:
+        _index = None
+
+
+def campaign_for(day):
+    return get_index().campaign_for(day)
+
+
+def active_campaigns(day):
+    return get_index().covering(day)
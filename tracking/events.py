@@ -0,0 +1,128 @@
+"""
+トラッキングイベントの検証とまとめ書き込み。
+バッチ受付 API と書き込みバッファ（buffer.py）から使う。
+"""
+from django.db import transaction
+
+from quotes.models import Quote
+from .models import Campaign, QuoteView, QuoteClick, CampaignView, CampaignClick
+
+
+# type -> (モデル, 対象の種類, action の既定値)
+EVENT_TYPES = {
+    'quote_view': (QuoteView, 'quote', None),
+    'quote_click': (QuoteClick, 'quote', None),
+    'campaign_view': (CampaignView, 'campaign', None),
+    'campaign_click': (CampaignClick, 'campaign', 'official'),
+}
+
+TARGET_MODELS = {
+    'quote': Quote,
+    'campaign': Campaign,
+}
+
+CLIENT_ID_MAX_LENGTH = QuoteView._meta.get_field('client_id').max_length
+
+
+class EventError(ValueError):
+    """1件分のイベントが不正"""
+
+
+def parse_event(raw, default_client_id=None):
+    """
+    1件分の dict を検証して (モデル, 対象の種類, フィールド) を返す。
+    対象 ID の存在確認はここではしない（まとめて existing_ids で行う）。
+    """
+    if not isinstance(raw, dict):
+        raise EventError('event must be an object')
+
+    event_type = raw.get('type')
+    if event_type not in EVENT_TYPES:
+        raise EventError(f"type must be one of {', '.join(EVENT_TYPES)}")
+    model, target, default_action = EVENT_TYPES[event_type]
+
+    id_field = f'{target}_id'
+    target_id = raw.get(id_field)
+    client_id = raw.get('client_id') or default_client_id
+    if not target_id or not client_id:
+        raise EventError(f'{id_field} and client_id are required')
+
+    try:
+        target_id = int(target_id)
+    except (TypeError, ValueError):
+        raise EventError(f'{id_field} must be an integer')
+
+    client_id = str(client_id)
+    if len(client_id) > CLIENT_ID_MAX_LENGTH:
+        raise EventError(f'client_id must be at most {CLIENT_ID_MAX_LENGTH} characters')
+
+    fields = {id_field: target_id, 'client_id': client_id}
+
+    if hasattr(model, 'ACTION_CHOICES'):
+        action = raw.get('action') or default_action
+        actions = [value for value, _ in model.ACTION_CHOICES]
+        if action not in actions:
+            raise EventError(f"action must be one of {', '.join(actions)}")
+        fields['action'] = action
+
+    return model, target, fields
+
+
+def existing_ids(target, ids):
+    """対象の種類ごとに 1 クエリで存在する ID だけを返す"""
+    if not ids:
+        return set()
+    model = TARGET_MODELS[target]
+    return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def save_events(parsed):
+    """
+    検証済みイベント [(key, モデル, 対象の種類, フィールド)] を、参照先の存在確認
+    （種類ごとに 1 クエリ）のうえモデルごとに bulk_create する。
+    戻り値: (作成件数, 参照先が見つからなかったイベントの key のリスト)
+    """
+    found = {
+        target: existing_ids(target, {fields[f'{target}_id'] for _, _, t, fields in parsed if t == target})
+        for target in TARGET_MODELS
+    }
+
+    missing = []
+    objs_by_model = {}
+    for key, model, target, fields in parsed:
+        if fields[f'{target}_id'] not in found[target]:
+            missing.append(key)
+            continue
+        objs_by_model.setdefault(model, []).append(model(**fields))
+
+    created = 0
+    with transaction.atomic():
+        for model, objs in objs_by_model.items():
+            model.objects.bulk_create(objs)
+            created += len(objs)
+
+    return created, missing
+
+
+def record_events(raw_events, default_client_id=None):
+    """
+    イベント配列を検証して保存する。
+    戻り値: (作成件数, [{'index': i, 'error': '...'}])
+    """
+    errors = []
+    parsed = []
+    for index, raw in enumerate(raw_events):
+        try:
+            parsed.append((index, *parse_event(raw, default_client_id)))
+        except EventError as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    created, missing = save_events(parsed)
+    targets = {index: target for index, _, target, _ in parsed}
+    errors.extend(
+        {'index': index, 'error': f'{targets[index].capitalize()} not found'}
+        for index in missing
+    )
+
+    errors.sort(key=lambda e: e['index'])
+    return created, errors
@@ -0,0 +1,152 @@
+"""
+生ログ（QuoteView / QuoteClick / CampaignView / CampaignClick）を CSV にするときの列の定義。
+アーカイブ（archive_tracking_events / restore_tracking_archive）と CSV エクスポート API で共通。
+
+行は values_list(*spec.fields) をそのまま使い、encode_row() で文字列にする。
+日時は UTC の ISO 8601（例: 2025-01-01T00:00:00.123456+00:00）。
+"""
+import contextlib
+import csv
+import datetime
+import gzip
+import json
+import os
+import zlib
+from collections import namedtuple
+
+from .models import CampaignClick, CampaignView, QuoteClick, QuoteView
+
+# name: ファイル名・URL に使う名前、target: 対象の種類（quote / campaign）
+ExportSpec = namedtuple('ExportSpec', ['name', 'model', 'ts_field', 'target', 'fields'])
+
+SPECS = [
+    ExportSpec('quote_views', QuoteView, 'viewed_at', 'quote',
+               ['id', 'quote_id', 'client_id', 'viewed_at']),
+    ExportSpec('quote_clicks', QuoteClick, 'clicked_at', 'quote',
+               ['id', 'quote_id', 'client_id', 'action', 'clicked_at']),
+    ExportSpec('campaign_views', CampaignView, 'viewed_at', 'campaign',
+               ['id', 'campaign_id', 'client_id', 'viewed_at']),
+    ExportSpec('campaign_clicks', CampaignClick, 'clicked_at', 'campaign',
+               ['id', 'campaign_id', 'client_id', 'action', 'clicked_at']),
+]
+
+BY_NAME = {spec.name: spec for spec in SPECS}
+BY_MODEL = {spec.model: spec for spec in SPECS}
+_BY_HEADER = {tuple(spec.fields): spec for spec in SPECS}
+
+_INT_FIELDS = {'id', 'quote_id', 'campaign_id'}
+
+
+def encode_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return value.astimezone(datetime.timezone.utc).isoformat()
+    return str(value)
+
+
+def encode_row(row):
+    return [encode_value(value) for value in row]
+
+
+def decode_row(spec, row):
+    """CSV の 1 行（encode_row の出力）を values_list と同じ型のタプルに戻す"""
+    if len(row) != len(spec.fields):
+        raise ValueError(f'{spec.name}: 列の数が違います（{len(row)} != {len(spec.fields)}）')
+    values = []
+    for field, value in zip(spec.fields, row):
+        if field in _INT_FIELDS:
+            values.append(int(value))
+        elif field == spec.ts_field:
+            values.append(datetime.datetime.fromisoformat(value))
+        else:
+            values.append(value)
+    return tuple(values)
+
+
+# archive_tracking_events が書き出したファイルを 1 行ずつ記録する（出力先の直下）
+MANIFEST = 'manifest.jsonl'
+
+
+def archived_rows(directory):
+    """manifest から {(テーブル名, 日付): 書き出した行数の合計} を返す（manifest が無ければ空）"""
+    totals = {}
+    try:
+        f = open(os.path.join(directory, MANIFEST), encoding='utf-8')
+    except FileNotFoundError:
+        return totals
+    with f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            key = (entry['table'], datetime.date.fromisoformat(entry['date']))
+            totals[key] = totals.get(key, 0) + entry['rows']
+    return totals
+
+
+def rows(spec, queryset, chunk_size=5000):
+    """queryset の行を values_list().iterator() で少しずつ読む（id 順）"""
+    return queryset.order_by('id').values_list(*spec.fields).iterator(chunk_size=chunk_size)
+
+
+@contextlib.contextmanager
+def open_csv(path):
+    """
+    gzip 圧縮（拡張子 .gz）または非圧縮の CSV を開き、(spec, 行のイテレータ) を返す。
+    spec は 1 行目のヘッダーから決める
+    """
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        spec = _BY_HEADER.get(tuple(header or ()))
+        if spec is None:
+            raise ValueError(f'{path}: ヘッダーが tracking のどの列定義とも一致しません（{header}）')
+        yield spec, (decode_row(spec, row) for row in reader)
+
+
+class _Lines:
+    """csv.writer の書き込み先。書かれた文字列を溜めておくだけ"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+    def take(self):
+        data, self.parts = ''.join(self.parts), []
+        return data
+
+
+def stream_csv(spec, queryset, compress=False, chunk_size=5000):
+    """
+    queryset をヘッダー付きの CSV（compress なら gzip）にして少しずつ返すジェネレーター。
+    StreamingHttpResponse にそのまま渡す。行は iterator で読むので、件数が増えてもメモリは一定
+    """
+    lines = _Lines()
+    writer = csv.writer(lines)
+    # wbits=31: gzip 形式（.gz としてそのまま保存・展開できる）
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    pending = 0
+
+    def emit(data):
+        encoded = data.encode('utf-8')
+        return compressor.compress(encoded) if compressor else encoded
+
+    writer.writerow(spec.fields)
+    for row in rows(spec, queryset, chunk_size):
+        writer.writerow(encode_row(row))
+        pending += 1
+        if pending >= 1000:
+            pending = 0
+            # 圧縮時は compressobj が内部に溜めるので、出てきた分だけ返す
+            data = emit(lines.take())
+            if data:
+                yield data
+    tail = emit(lines.take())
+    if compressor:
+        tail += compressor.flush()
+    if tail:
+        yield tail
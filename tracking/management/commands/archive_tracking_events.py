@@ -0,0 +1,198 @@
+#management/commands/archive_tracking_events.py
+
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tracking.exports import BY_NAME, MANIFEST, SPECS, encode_row, open_csv, rows
+from tracking.rollup import completed_through, day_bounds
+
+
+class Command(BaseCommand):
+    help = (
+        "古いトラッキングの生ログ（QuoteView / QuoteClick / CampaignView / CampaignClick）を"
+        "テーブル・日ごとの CSV.gz（<出力先>/<テーブル>/<年>/<日付>.csv.gz）に書き出し、"
+        "書き出した行数を確かめてから少しずつ削除する。"
+        "行はサーバーサイドカーソル（iterator）で読むので、件数が増えてもメモリは一定。"
+        "日別集計（rollup_tracking_stats）が確定した日だけを対象にする。"
+        "戻すときは restore_tracking_archive を使う。"
+    )
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group()
+        cutoff.add_argument(
+            "--older-than-days",
+            type=int,
+            default=90,
+            help="今日から何日より前のログを対象にするか（既定: 90）",
+        )
+        cutoff.add_argument(
+            "--before",
+            type=datetime.date.fromisoformat,
+            help="この日 (YYYY-MM-DD) より前のログを対象にする",
+        )
+        parser.add_argument(
+            "--table",
+            action="append",
+            choices=sorted(BY_NAME),
+            help="対象のテーブル（複数指定可。省略時はすべて）",
+        )
+        parser.add_argument(
+            "--output-dir",
+            default=settings.TRACKING_ARCHIVE_DIR,
+            help="書き出し先（既定: settings.TRACKING_ARCHIVE_DIR）",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000, help="1 回に読む行数（既定: 5000）")
+        parser.add_argument(
+            "--delete-batch-size",
+            type=int,
+            default=1000,
+            help="1 回の DELETE で消す行数（既定: 1000）",
+        )
+        parser.add_argument("--no-delete", action="store_true", help="書き出すだけで削除しない")
+        parser.add_argument("--dry-run", action="store_true", help="対象の日と行数を表示するだけにする")
+
+    def handle(self, *args, **options):
+        for name in ("chunk_size", "delete_batch_size"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} は 1 以上で指定してください。")
+        if options["older_than_days"] < 1:
+            raise CommandError("--older-than-days は 1 以上で指定してください。")
+
+        cutoff = options["before"] or timezone.localdate() - datetime.timedelta(days=options["older_than_days"])
+
+        # 集計前のログを消すと DailyStat を作り直せなくなるので、確定済みの日までに限る
+        done = completed_through()
+        if done is None:
+            raise CommandError("日別集計がまだ確定していません。先に rollup_tracking_stats を実行してください。")
+        if done < cutoff - datetime.timedelta(days=1):
+            cutoff = done + datetime.timedelta(days=1)
+            self.stdout.write(self.style.WARNING(f"集計が確定している {done} までに限ります。"))
+
+        self.output_dir = Path(options["output_dir"])
+        self.options = options
+        specs = [BY_NAME[name] for name in options["table"]] if options["table"] else SPECS
+        self.stdout.write(f"{cutoff} より前のログが対象です。")
+
+        for spec in specs:
+            first = spec.model.objects.order_by(spec.ts_field).values_list(spec.ts_field, flat=True).first()
+            if first is None or timezone.localdate(first) >= cutoff:
+                self.stdout.write(f"{spec.name}: 対象のログはありません")
+                continue
+            day = timezone.localdate(first)
+            while day < cutoff:
+                self._archive_day(spec, day)
+                day += datetime.timedelta(days=1)
+
+    # ------------------------------------------------------------------
+
+    def _archive_day(self, spec, day):
+        directory = self.output_dir / spec.name / f"{day.year:04d}"
+        parts = sorted(directory.glob(f"{day.isoformat()}*.csv.gz"))
+        start, end = day_bounds(day)
+        queryset = spec.model.objects.filter(**{f"{spec.ts_field}__gte": start, f"{spec.ts_field}__lt": end})
+        label = f"{spec.name} {day}"
+
+        if self.options["dry_run"]:
+            count = queryset.count()
+            if count:
+                self.stdout.write(f"{label}: {count} 行")
+            return
+
+        if parts and self.options["no_delete"]:
+            self.stdout.write(self.style.WARNING(f"[SKIP] {label}: 書き出し済みです（{parts[-1].name}）"))
+            return
+
+        # 前回、書き出したあとの削除が途中で止まっていた分
+        for part in parts:
+            deleted = self._delete_archived(part)
+            if deleted:
+                self.stdout.write(self.style.WARNING(f"[OK] {label}: {part.name} の残り {deleted} 行を削除"))
+
+        if not queryset.exists():
+            return
+
+        name = f"{day.isoformat()}.{len(parts)}.csv.gz" if parts else f"{day.isoformat()}.csv.gz"
+        path = directory / name
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{name}")
+        try:
+            written, min_id, max_id = self._write(spec, queryset, tmp)
+            # 書き出したファイルを読み直し、ファイルの行数・DB の行数と合っているか確かめる
+            in_file = self._count(tmp)
+            in_db = queryset.filter(id__lte=max_id).count()
+            if not written == in_file == in_db:
+                raise CommandError(
+                    f"{label}: 行数が合いません（書き出し {written} / ファイル {in_file} / DB {in_db}）。削除せずに中止します。"
+                )
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        self._append_manifest({
+            "table": spec.name,
+            "date": day.isoformat(),
+            "file": path.relative_to(self.output_dir).as_posix(),
+            "rows": written,
+            "min_id": min_id,
+            "max_id": max_id,
+            "sha256": self._sha256(path),
+            "archived_at": timezone.now().isoformat(),
+        })
+
+        if self.options["no_delete"]:
+            self.stdout.write(self.style.SUCCESS(f"[OK] {label}: {written} 行 → {path}"))
+            return
+        deleted = self._delete_archived(path)
+        self.stdout.write(self.style.SUCCESS(f"[OK] {label}: {written} 行 → {path}（{deleted} 行を削除）"))
+
+    def _write(self, spec, queryset, path):
+        written, min_id, max_id = 0, None, None
+        with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(spec.fields)
+            for row in rows(spec, queryset, self.options["chunk_size"]):
+                writer.writerow(encode_row(row))
+                written += 1
+                # id 順に読んでいる
+                min_id = row[0] if min_id is None else min_id
+                max_id = row[0]
+        return written, min_id, max_id
+
+    def _count(self, path):
+        with open_csv(path) as (_, reader):
+            return sum(1 for _ in reader)
+
+    def _delete_archived(self, path):
+        """ファイルに書き出した行を --delete-batch-size 件ずつ削除する"""
+        size = self.options["delete_batch_size"]
+        deleted = 0
+        with open_csv(path) as (spec, reader):
+            batch = []
+            for row in reader:
+                batch.append(row[0])
+                if len(batch) >= size:
+                    deleted += spec.model.objects.filter(pk__in=batch).delete()[0]
+                    batch = []
+            if batch:
+                deleted += spec.model.objects.filter(pk__in=batch).delete()[0]
+        return deleted
+
+    def _sha256(self, path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _append_manifest(self, entry):
+        with open(self.output_dir / MANIFEST, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
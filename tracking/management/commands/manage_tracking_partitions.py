@@ -0,0 +1,113 @@
+#management/commands/manage_tracking_partitions.py
+
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking.partitions import (
+    TABLES,
+    PartitionError,
+    convert,
+    drop_partitions_before,
+    ensure_partitions,
+    is_partitioned,
+    month_start,
+    partitions,
+)
+
+
+def _month(value):
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+class Command(BaseCommand):
+    help = (
+        "トラッキングの生ログテーブル（QuoteView / QuoteClick / CampaignView / CampaignClick）の"
+        "月別パーティションを管理する（PostgreSQL のみ）。"
+        "--convert で既存のテーブルをパーティションテーブルにし、以後は cron 等で定期的に実行して"
+        "先の月のパーティションを作っておく。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="まだパーティションテーブルでないものを置き換える（既存の行は来月 1 日までのパーティションに残る）",
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="今月から何か月先までのパーティションを作っておくか（既定: 3）",
+        )
+        parser.add_argument(
+            "--drop-before",
+            type=_month,
+            metavar="YYYY-MM",
+            help=(
+                "この月より前にしか行の無いパーティションを DETACH して DROP する。"
+                "日別集計が確定していて、残っている行が archive_tracking_events で書き出し済みのものに限る"
+            ),
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=settings.TRACKING_ARCHIVE_DIR,
+            help="--drop-before で書き出し済みか確かめる archive_tracking_events の出力先（既定: settings.TRACKING_ARCHIVE_DIR）",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="--drop-before で書き出し済みかを確かめない（日別集計の確認は行う）",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="--drop-before で消すパーティションを表示するだけにする",
+        )
+        parser.add_argument(
+            "--list",
+            action="store_true",
+            help="パーティションの一覧を表示するだけにする",
+        )
+
+    def handle(self, *args, **options):
+        if options["months_ahead"] < 0:
+            raise CommandError("--months-ahead は 0 以上で指定してください。")
+
+        try:
+            for model, ts_field in TABLES:
+                self._handle_table(model, ts_field, options)
+        except PartitionError as e:
+            raise CommandError(str(e))
+
+    def _handle_table(self, model, ts_field, options):
+        table = model._meta.db_table
+        log = self.stdout.write
+
+        if options["list"]:
+            if not is_partitioned(model):
+                self.stdout.write(f"{table}: パーティションテーブルではありません")
+                return
+            for name, upper in partitions(model):
+                self.stdout.write(f"{table}: {name}（〜{upper.isoformat() if upper else 'DEFAULT'}）")
+            return
+
+        if not is_partitioned(model):
+            if not options["convert"]:
+                self.stdout.write(self.style.WARNING(f"[SKIP] {table}: パーティションテーブルではありません（--convert で置き換え）"))
+                return
+            convert(model, ts_field, log=log)
+            self.stdout.write(self.style.SUCCESS(f"[OK] {table}: パーティションテーブルに置き換えました"))
+
+        created = ensure_partitions(model, ts_field, options["months_ahead"], log=log)
+        self.stdout.write(self.style.SUCCESS(f"[OK] {table}: パーティションを {len(created)} 個作成"))
+
+        if options["drop_before"]:
+            cutoff = month_start(options["drop_before"])
+            dropped = drop_partitions_before(
+                model, ts_field, cutoff, options["archive_dir"],
+                dry_run=options["dry_run"], force=options["force"], log=log,
+            )
+            label = "削除予定" if options["dry_run"] else "削除"
+            self.stdout.write(self.style.SUCCESS(f"[OK] {table}: {len(dropped)} 個を{label}"))
@@ -0,0 +1,169 @@
+#management/commands/restore_tracking_archive.py
+
+import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.constants import OnConflict
+
+from quotes.models import Quote
+from tracking.exports import BY_NAME, open_csv
+from tracking.models import Campaign
+
+TARGETS = {"quote": Quote, "campaign": Campaign}
+
+
+def _file_date(path):
+    """<日付>.csv.gz / <日付>.<N>.csv.gz の日付（読めなければ None）"""
+    try:
+        return datetime.date.fromisoformat(path.name[:10])
+    except ValueError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "archive_tracking_events で書き出した CSV.gz を生ログのテーブルに戻す（分析用の DB に入れる場合は --database）。"
+        "id ごと戻し、すでにある id は飛ばすので何度実行しても同じ。"
+        "対象の Quote / Campaign が消えている行は戻さない。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="ファイルまたはディレクトリ（省略時は settings.TRACKING_ARCHIVE_DIR）",
+        )
+        parser.add_argument(
+            "--table",
+            action="append",
+            choices=sorted(BY_NAME),
+            help="戻すテーブル（複数指定可。省略時はすべて）",
+        )
+        parser.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat, help="この日 (YYYY-MM-DD) から")
+        parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat, help="この日 (YYYY-MM-DD) まで")
+        parser.add_argument("--batch-size", type=int, default=1000, help="1 回に INSERT する行数（既定: 1000）")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="戻し先の DB（既定: default）")
+        parser.add_argument("--dry-run", action="store_true", help="対象のファイルを表示するだけにする")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size は 1 以上で指定してください。")
+        self.options = options
+        self.connection = connections[options["database"]]
+
+        files = self._files(options["paths"] or [settings.TRACKING_ARCHIVE_DIR])
+        if not files:
+            self.stdout.write(self.style.WARNING("対象のファイルがありません。"))
+            return
+
+        restored = set()
+        for path in files:
+            if options["dry_run"]:
+                self.stdout.write(str(path))
+                continue
+            try:
+                spec, inserted, skipped = self._restore(path)
+            except ValueError as e:
+                raise CommandError(str(e))
+            if spec is None:
+                continue
+            restored.add(spec.model)
+            message = f"[OK] {path}: {inserted} 行を追加"
+            if skipped:
+                message += f"（対象が無い {skipped} 行は飛ばしました）"
+            self.stdout.write(self.style.SUCCESS(message))
+
+        # id を指定して入れたので、以後の INSERT で id がぶつからないようシーケンスを進める
+        sequence_sql = self.connection.ops.sequence_reset_sql(no_style(), sorted(restored, key=str))
+        if sequence_sql:
+            with self.connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+    def _files(self, paths):
+        files = []
+        for value in paths:
+            path = Path(value)
+            if path.is_dir():
+                files.extend(sorted(path.rglob("*.csv.gz")))
+            elif path.is_file():
+                files.append(path)
+            else:
+                raise CommandError(f"{path} がありません。")
+
+        date_from, date_to = self.options["date_from"], self.options["date_to"]
+        if date_from or date_to:
+            files = [
+                f for f in files
+                if (day := _file_date(f)) is not None
+                and (date_from is None or day >= date_from)
+                and (date_to is None or day <= date_to)
+            ]
+        # 書き出し途中の一時ファイル（.<日付>.csv.gz）は除く
+        return [f for f in files if not f.name.startswith(".")]
+
+    def _restore(self, path):
+        tables = self.options["table"]
+        size = self.options["batch_size"]
+        inserted = skipped = 0
+        with open_csv(path) as (spec, reader):
+            if tables and spec.name not in tables:
+                return None, 0, 0
+            batch = []
+            for row in reader:
+                batch.append(row)
+                if len(batch) >= size:
+                    added, missing = self._insert(spec, batch)
+                    inserted, skipped = inserted + added, skipped + missing
+                    batch = []
+            if batch:
+                added, missing = self._insert(spec, batch)
+                inserted, skipped = inserted + added, skipped + missing
+        return spec, inserted, skipped
+
+    def _insert(self, spec, batch):
+        """
+        batch を INSERT ... ON CONFLICT DO NOTHING（バックエンドごとの書き方）で入れる。
+        auto_now_add の列にも元の時刻を入れたいので bulk_create は使わない
+        """
+        connection = self.connection
+        ops = connection.ops
+        meta = spec.model._meta
+        target_ids = {row[1] for row in batch}
+        existing = set(
+            TARGETS[spec.target].objects.using(self.options["database"])
+            .filter(pk__in=target_ids).values_list("pk", flat=True)
+        )
+        rows = [row for row in batch if row[1] in existing]
+        if not rows:
+            return 0, len(batch)
+
+        fields = [meta.get_field(name) for name in spec.fields]
+        ts_index = spec.fields.index(spec.ts_field)
+        params = []
+        for row in rows:
+            row = list(row)
+            row[ts_index] = ops.adapt_datetimefield_value(row[ts_index])
+            params.append(row)
+
+        columns = ", ".join(ops.quote_name(field.column) for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql = (
+            f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(meta.db_table)} "
+            f"({columns}) VALUES ({placeholders})"
+        )
+        suffix = ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+        if suffix:
+            sql += " " + suffix
+
+        # executemany の rowcount はバックエンドによって当てにならないので、前後の件数で数える
+        existing_rows = spec.model.objects.using(self.options["database"]).filter(pk__in=[row[0] for row in rows])
+        with transaction.atomic(using=self.options["database"]), connection.cursor() as cursor:
+            before = existing_rows.count()
+            cursor.executemany(sql, params)
+            after = existing_rows.count()
+        return after - before, len(batch) - len(rows)
@@ -0,0 +1,81 @@
+#management/commands/rollup_tracking_stats.py
+
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tracking.rollup import (
+    completed_through,
+    earliest_event_date,
+    first_rebuildable_date,
+    mark_completed,
+    rollup_range,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "トラッキングの生ログを日別集計（DailyStat）にまとめる。"
+        "確定済みの日の翌日から昨日までを集計して確定させ、今日の分は毎回集計し直す。"
+        "cron 等で数分おきに実行する想定。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=datetime.date.fromisoformat,
+            help=(
+                "この日 (YYYY-MM-DD) から集計し直す。省略時は確定済みの翌日から。"
+                "生ログを書き出し・削除した日やログが残っていない日は集計し直さない。"
+            ),
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=settings.TRACKING_ARCHIVE_DIR,
+            help="--since で書き出し済みの日か確かめる archive_tracking_events の出力先（既定: settings.TRACKING_ARCHIVE_DIR）",
+        )
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=31,
+            help="1回の集計クエリで扱う日数（既定: 31）",
+        )
+
+    def handle(self, *args, **options):
+        chunk_days = options["chunk_days"]
+        if chunk_days < 1:
+            raise CommandError("--chunk-days は 1 以上で指定してください。")
+
+        today = timezone.localdate()
+        yesterday = today - datetime.timedelta(days=1)
+
+        if options["since"]:
+            start = options["since"]
+            # 生ログが消えている日を集計し直すと DailyStat まで消えるので、残っている日からにする
+            first = first_rebuildable_date(options["archive_dir"])
+            if first is None or start < first:
+                start = first or today
+                self.stdout.write(self.style.WARNING(
+                    f"{options['since']} 〜 {start - datetime.timedelta(days=1)} は生ログが残っていないので集計し直しません。"
+                ))
+        else:
+            done = completed_through()
+            start = done + datetime.timedelta(days=1) if done else earliest_event_date()
+
+        if start is None:
+            self.stdout.write(self.style.WARNING("集計対象のログがありません。"))
+            return
+
+        # 過去の日は確定（以後集計し直さない）
+        while start <= yesterday:
+            end = min(start + datetime.timedelta(days=chunk_days - 1), yesterday)
+            created = rollup_range(start, end)
+            mark_completed(end)
+            self.stdout.write(self.style.SUCCESS(f"[OK] {start} 〜 {end}: {created} 行"))
+            start = end + datetime.timedelta(days=1)
+
+        # 今日はまだ途中なので毎回置き換える
+        created = rollup_range(today, today)
+        self.stdout.write(self.style.SUCCESS(f"[OK] {today}（途中集計）: {created} 行"))
@@ -0,0 +1,442 @@
+#management/commands/seed_synthetic_data.py
+
+import bisect
+import datetime
+import io
+import itertools
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from quotes import cache as payload_cache
+from quotes.favorites import recount_campaign_likes, recount_quote_likes
+from quotes.indexes import update_quote_indexes
+from quotes.models import Favorite, Quote, User
+from tracking import campaign_index
+from tracking.models import Campaign, CampaignClick, CampaignView, QuoteClick, QuoteView
+
+TAGS = ["愛", "家族", "雨", "旅", "復讐", "嫉妬", "死", "希望", "孤独", "友情", "運命", "夢"]
+CATEGORIES = [value for value, _ in Quote.CATEGORY_CHOICES]
+
+# QuoteView / QuoteClick のうち、その日の「今日の1本」に付く割合（残りはいいね一覧などからの閲覧）
+TODAY_SHARE = 0.7
+
+
+class Zipf:
+    """values から Zipf 分布（人気 rank 番目の重みが 1 / rank^s）で選ぶ。人気の順番も rng で決める"""
+
+    def __init__(self, values, s, rng):
+        self.values = list(values)
+        rng.shuffle(self.values)
+        self.weights = [1 / rank ** s for rank in range(1, len(self.values) + 1)]
+        self.cum_weights = list(itertools.accumulate(self.weights))
+        self.rng = rng
+
+    def sample(self, k):
+        return self.rng.choices(self.values, cum_weights=self.cum_weights, k=k)
+
+    def one(self):
+        return self.values[bisect.bisect(self.cum_weights, self.rng.random() * self.cum_weights[-1])]
+
+
+def _allocate(weights, total, cap, rng):
+    """
+    合計が total になるよう、重みに比例した件数（1 つあたり最大 cap）を割り振る。
+    比例定数を二分探索で決めるので、上限に当たった分は他に回る
+    """
+    if total > cap * len(weights):
+        raise CommandError(f"{total} 件は割り振れません（最大 {cap * len(weights)} 件）。")
+    low, high = 0.0, total / min(weights) + 1
+    for _ in range(60):
+        scale = (low + high) / 2
+        if sum(min(cap, w * scale) for w in weights) < total:
+            low = scale
+        else:
+            high = scale
+    counts = []
+    for w in weights:
+        expected = min(cap, w * high)
+        n = int(expected)
+        if n < cap and rng.random() < expected - n:
+            n += 1
+        counts.append(n)
+    return counts
+
+
+class _Clock:
+    """
+    期間 [start, start + days) の中の秒オフセットを DB にそのまま渡せる時刻文字列（UTC）にする。
+    datetime を 1 行ずつ作ると遅いので、日付部分は前もって文字列にしておく
+    """
+
+    def __init__(self, start, days, suffix):
+        self.start = start
+        # 今日の分は今の時刻まで（未来の時刻のログを作らない）
+        self.seconds = max(1, min(days * 86400, int((timezone.now() - start).total_seconds())))
+        self.suffix = suffix
+        self._days = [(start + datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days + 1)]
+
+    def format(self, offset):
+        day, sec = divmod(int(offset), 86400)
+        hour, rest = divmod(sec, 3600)
+        minute, second = divmod(rest, 60)
+        return f"{self._days[day]} {hour:02d}:{minute:02d}:{second:02d}{self.suffix}"
+
+    def offset_of(self, moment):
+        return (moment - self.start).total_seconds()
+
+
+class _Writer:
+    """
+    モデルのテーブルに行（タプル）をまとめて書き込む。
+    PostgreSQL（psycopg2）は COPY、それ以外は executemany。
+    auto_now_add の列にも生成した時刻を入れたいので bulk_create は使わない
+    """
+
+    def __init__(self, model, fields, use_copy):
+        quote = connection.ops.quote_name
+        self.table = quote(model._meta.db_table)
+        self.columns = ", ".join(quote(model._meta.get_field(f).column) for f in fields)
+        self.use_copy = use_copy
+        self.written = 0
+
+    def write(self, rows):
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            if self.use_copy:
+                # 生成する値にタブ・改行・バックスラッシュは含まれない
+                buf = io.StringIO()
+                for row in rows:
+                    buf.write("\t".join("\\N" if v is None else str(v) for v in row))
+                    buf.write("\n")
+                buf.seek(0)
+                cursor.copy_expert(f"COPY {self.table} ({self.columns}) FROM STDIN", buf)
+            else:
+                placeholders = ", ".join(["%s"] * len(rows[0]))
+                with transaction.atomic():
+                    cursor.executemany(
+                        f"INSERT INTO {self.table} ({self.columns}) VALUES ({placeholders})", rows
+                    )
+        self.written += len(rows)
+
+
+class Command(BaseCommand):
+    help = (
+        "負荷の再現用に、合成データ（Quote・Campaign・User・匿名 client_id・いいね・閲覧/クリックログ）を投入する。"
+        "いいねとログの対象・端末は Zipf 分布で偏らせる。同じ --seed なら同じデータになる。"
+        "PostgreSQL では COPY、それ以外は executemany で --chunk-size 行ずつ書くので、件数が増えてもメモリは一定。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quotes", type=int, default=365, help="作る Quote の数（1 日 1 本。既定: 365）")
+        parser.add_argument(
+            "--start-date",
+            type=datetime.date.fromisoformat,
+            help="Quote の最初の配信日 (YYYY-MM-DD)。省略時は今日で終わるように逆算。埋まっている日は飛ばす",
+        )
+        parser.add_argument("--campaigns", type=int, default=24, help="作る Campaign の数（既定: 24）")
+        parser.add_argument("--clients", type=int, default=100_000, help="匿名 client_id の数（既定: 100000）")
+        parser.add_argument("--users", type=int, default=5_000, help="作る User の数（既定: 5000）")
+        parser.add_argument("--favorites", type=int, default=200_000, help="いいねの数（既定: 200000）")
+        parser.add_argument(
+            "--max-favorites-per-owner",
+            type=int,
+            default=500,
+            help="1 人（1 端末）あたりのいいねの上限（既定: 500）",
+        )
+        parser.add_argument("--quote-views", type=int, default=1_000_000, help="QuoteView の数（既定: 1000000）")
+        parser.add_argument("--quote-clicks", type=int, default=100_000, help="QuoteClick の数（既定: 100000）")
+        parser.add_argument("--campaign-views", type=int, default=100_000, help="CampaignView の数（既定: 100000）")
+        parser.add_argument("--campaign-clicks", type=int, default=10_000, help="CampaignClick の数（既定: 10000）")
+        parser.add_argument("--days", type=int, default=90, help="ログを散らす期間（今日までの日数。既定: 90）")
+        parser.add_argument("--zipf", type=float, default=1.1, help="Zipf 分布の指数（既定: 1.1）")
+        parser.add_argument("--seed", type=int, default=0, help="乱数の seed（既定: 0）")
+        parser.add_argument("--prefix", default="synthetic", help="username・client_id・Campaign 名の接頭辞")
+        parser.add_argument("--chunk-size", type=int, default=50_000, help="1 回に書き込む行数（既定: 50000）")
+        parser.add_argument(
+            "--method",
+            choices=["auto", "copy", "insert"],
+            default="auto",
+            help="書き込み方法（auto: PostgreSQL なら COPY）",
+        )
+        parser.add_argument("--force", action="store_true", help="DEBUG=False の環境でも実行する")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["force"]:
+            raise CommandError("本番データに混ざらないよう、DEBUG=False では --force を付けたときだけ実行します。")
+        for name in ("quotes", "days", "chunk_size", "max_favorites_per_owner"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} は 1 以上で指定してください。")
+        if options["clients"] < 1 and options["users"] < 1:
+            raise CommandError("--clients か --users のどちらかは 1 以上にしてください。")
+
+        can_copy = connection.vendor == "postgresql" and connection.Database.__name__ == "psycopg2"
+        if options["method"] == "copy" and not can_copy:
+            raise CommandError("COPY は PostgreSQL（psycopg2）でのみ使えます。")
+        self.use_copy = can_copy and options["method"] != "insert"
+        self.chunk_size = options["chunk_size"]
+        self.rng = random.Random(options["seed"])
+        self.zipf_s = options["zipf"]
+
+        prefix = f"{options['prefix']}-{options['seed']}"
+        if User.objects.filter(username__startswith=f"{prefix}-").exists():
+            raise CommandError(f"{prefix} のデータは投入済みです。--seed か --prefix を変えてください。")
+
+        today = timezone.localdate()
+        window_start = today - datetime.timedelta(days=options["days"] - 1)
+        utc_start = datetime.datetime.combine(window_start, datetime.time(), tzinfo=datetime.timezone.utc)
+        self.clock = _Clock(utc_start, options["days"], "+00" if connection.vendor == "postgresql" else "")
+
+        started = time.monotonic()
+        quotes_by_date = self._create_quotes(options, today)
+        campaigns = self._create_campaigns(options, prefix, window_start)
+        users = self._create_users(options, prefix)
+        client_ids = [f"{prefix}-{i:08d}" for i in range(options["clients"])]
+
+        quote_ids = list(Quote.objects.values_list("pk", flat=True))
+        self.quotes = Zipf(quote_ids, self.zipf_s, self.rng)
+        self.campaigns = Zipf([c.pk for c in campaigns], self.zipf_s, self.rng) if campaigns else None
+        self.clients = Zipf(client_ids, self.zipf_s, self.rng) if client_ids else None
+        self.today_quotes = [
+            quotes_by_date.get(window_start + datetime.timedelta(days=i)) for i in range(options["days"])
+        ]
+        self.campaign_ranges = {c.pk: self._campaign_range(c) for c in campaigns}
+
+        self._create_favorites(options, users, client_ids, quote_ids, [c.pk for c in campaigns])
+
+        if self.clients is None:
+            self.stdout.write(self.style.WARNING("client_id が無いのでログは作りません。"))
+        else:
+            self._create_quote_events(QuoteView, ["quote", "client_id", "viewed_at"], options["quote_views"], None)
+            self._create_quote_events(
+                QuoteClick, ["quote", "client_id", "action", "clicked_at"], options["quote_clicks"],
+                [value for value, _ in QuoteClick.ACTION_CHOICES],
+            )
+            if self.campaigns is not None:
+                self._create_campaign_events(
+                    CampaignView, ["campaign", "client_id", "viewed_at"], options["campaign_views"], None
+                )
+                self._create_campaign_events(
+                    CampaignClick, ["campaign", "client_id", "action", "clicked_at"], options["campaign_clicks"],
+                    [value for value, _ in CampaignClick.ACTION_CHOICES],
+                )
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                for model in (Favorite, QuoteView, QuoteClick, CampaignView, CampaignClick):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+        self.stdout.write(self.style.SUCCESS(f"完了（{time.monotonic() - started:.1f} 秒）"))
+        self.stdout.write("日別集計が必要なら rollup_tracking_stats --since を実行してください。")
+
+    # ------------------------------------------------------------------
+
+    def _report(self, label, written, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(f"[OK] {label}: {written} 行（{elapsed:.1f} 秒, {written / elapsed:,.0f} 行/秒）"))
+
+    def _create_quotes(self, options, today):
+        """Quote を 1 日 1 本作り、{配信日: id} を返す（既存の Quote も含む）"""
+        started = time.monotonic()
+        count = options["quotes"]
+        start = options["start_date"] or today - datetime.timedelta(days=count - 1)
+        occupied = set(Quote.objects.filter(publish_date__gte=start).values_list("publish_date", flat=True))
+
+        dates = []
+        day = start
+        while len(dates) < count:
+            if day not in occupied:
+                dates.append(day)
+            day += datetime.timedelta(days=1)
+
+        rng = self.rng
+        for offset in range(0, len(dates), 1000):
+            chunk = dates[offset:offset + 1000]
+            objs = [
+                Quote(
+                    text=f"合成データの台詞 {publish_date.isoformat()} " + "".join(rng.choices("あいうえおかきくけこさしすせそ", k=rng.randint(10, 60))),
+                    original_text=f"Synthetic line {publish_date.isoformat()}",
+                    author_name=f"作者 {rng.randint(1, 300)}",
+                    source=f"作品 {rng.randint(1, 1000)}",
+                    category=rng.choice(CATEGORIES),
+                    tags=",".join(rng.sample(TAGS, rng.randint(0, 3))),
+                    publish_date=publish_date,
+                )
+                for publish_date in chunk
+            ]
+            with transaction.atomic():
+                created = Quote.objects.bulk_create(objs)
+                if created and created[0].pk is None:
+                    created = list(Quote.objects.filter(publish_date__in=chunk))
+                update_quote_indexes(created)
+                # bulk_create では post_save が飛ばないので、日付 → 表示対象のキャッシュはここで捨てる
+                transaction.on_commit(payload_cache.invalidate_dates)
+        self._report("Quote", len(dates), started)
+
+        return dict(Quote.objects.values_list("publish_date", "pk"))
+
+    def _create_campaigns(self, options, prefix, window_start):
+        """ログの期間に重ならないよう並べた Campaign を作る（最後の 1 本は今日を含む）"""
+        count = options["campaigns"]
+        if count < 1:
+            return []
+        days = options["days"]
+        slot = days // count
+        if slot < 2:
+            raise CommandError("--campaigns が --days に対して多すぎます（1 本あたり 2 日以上必要）。")
+
+        rng = self.rng
+        campaigns = []
+        for i in range(count):
+            length = rng.randint(1, min(10, slot - 1))
+            end = window_start + datetime.timedelta(days=(i + 1) * slot - 1)
+            if i == count - 1:
+                end = window_start + datetime.timedelta(days=days - 1)
+            campaigns.append(Campaign(
+                name=f"{prefix}-{i:04d}",
+                client_name=f"クライアント {i}",
+                text=f"合成キャンペーン {i}",
+                url="https://example.com/",
+                start_date=end - datetime.timedelta(days=length - 1),
+                end_date=end,
+            ))
+        with transaction.atomic():
+            Campaign.objects.bulk_create(campaigns)
+            # post_save が飛ばないので、Campaign のインデックスと日付 → 表示対象のキャッシュもここで捨てる
+            transaction.on_commit(campaign_index.invalidate)
+            transaction.on_commit(payload_cache.invalidate_dates)
+        campaigns = list(Campaign.objects.filter(name__startswith=f"{prefix}-"))
+        self.stdout.write(self.style.SUCCESS(f"[OK] Campaign: {len(campaigns)} 件"))
+        return campaigns
+
+    def _create_users(self, options, prefix):
+        started = time.monotonic()
+        count = options["users"]
+        for offset in range(0, count, self.chunk_size):
+            User.objects.bulk_create(
+                [
+                    User(username=f"{prefix}-{i:08d}", password=f"{UNUSABLE_PASSWORD_PREFIX}{prefix}")
+                    for i in range(offset, min(count, offset + self.chunk_size))
+                ],
+                batch_size=5000,
+            )
+        self._report("User", count, started)
+        return list(User.objects.filter(username__startswith=f"{prefix}-").values_list("pk", flat=True))
+
+    def _campaign_range(self, campaign):
+        """Campaign の配信期間のうち、ログの期間に入る部分の秒オフセット [lo, hi)"""
+        start = datetime.datetime.combine(campaign.start_date, datetime.time(), tzinfo=datetime.timezone.utc)
+        lo = max(0, self.clock.offset_of(start))
+        hi = min(self.clock.seconds, self.clock.offset_of(start + datetime.timedelta(days=(campaign.end_date - campaign.start_date).days + 1)))
+        return (lo, hi) if lo < hi else None
+
+    def _create_favorites(self, options, users, client_ids, quote_ids, campaign_ids):
+        """
+        端末・ユーザーごとのいいね数を Zipf の重みで割り振り、各自の対象も Zipf で選ぶ。
+        重複の確認は 1 人分の中だけで済むので、全体の集合をメモリに持たない
+        """
+        total = options["favorites"]
+        if total < 1 or not quote_ids:
+            return
+        started = time.monotonic()
+        rng = self.rng
+
+        owners = [(None, client_id) for client_id in client_ids] + [(user_id, None) for user_id in users]
+        rng.shuffle(owners)
+        activity = [1 / rank ** self.zipf_s for rank in range(1, len(owners) + 1)]
+        cap = min(options["max_favorites_per_owner"], len(quote_ids) + len(campaign_ids))
+        counts = _allocate(activity, total, cap, rng)
+
+        all_targets = [(pk, None) for pk in quote_ids] + [(None, pk) for pk in campaign_ids]
+
+        writer = _Writer(Favorite, ["user", "quote", "campaign_id", "client_id", "created_at"], self.use_copy)
+        rows = []
+        for (user_id, client_id), n in zip(owners, counts):
+            if not n:
+                continue
+            # 選んだ順に時刻を振るので、set ではなく（順序が id のハッシュによらない）dict で重複を除く
+            chosen = {}
+            # 人気の対象ほど重なりやすいので、足りなければ数回まで引き直す
+            for _ in range(5):
+                for target in self._favorite_targets(n - len(chosen)):
+                    chosen[target] = None
+                if len(chosen) >= n:
+                    break
+            else:
+                # それでも足りない（いいねの多い人）分は、まだ選んでいない対象から一様に選ぶ
+                rest = [t for t in all_targets if t not in chosen]
+                chosen.update(dict.fromkeys(rng.sample(rest, min(len(rest), n - len(chosen)))))
+            for quote_id, campaign_id in chosen:
+                rows.append((user_id, quote_id, campaign_id, client_id, self.clock.format(rng.random() * self.clock.seconds)))
+            if len(rows) >= self.chunk_size:
+                writer.write(rows)
+                rows = []
+        writer.write(rows)
+
+        with transaction.atomic():
+            recount_quote_likes()
+            recount_campaign_likes()
+        self._report("Favorite", writer.written, started)
+
+    def _favorite_targets(self, n):
+        targets = []
+        for _ in range(n):
+            if self.campaigns is not None and self.rng.random() < 0.1:
+                targets.append((None, self.campaigns.one()))
+            else:
+                targets.append((self.quotes.one(), None))
+        return targets
+
+    def _create_quote_events(self, model, fields, total, actions):
+        """時刻を期間内に散らし、TODAY_SHARE の割合でその日の Quote、残りは Zipf で選んだ Quote に付ける"""
+        if total < 1:
+            return
+        started = time.monotonic()
+        rng = self.rng
+        clock = self.clock
+        writer = _Writer(model, fields, self.use_copy)
+        for offset in range(0, total, self.chunk_size):
+            n = min(self.chunk_size, total - offset)
+            clients = self.clients.sample(n)
+            rows = []
+            for client_id in clients:
+                moment = rng.random() * clock.seconds
+                quote_id = self.today_quotes[int(moment // 86400)] if rng.random() < TODAY_SHARE else None
+                if quote_id is None:
+                    quote_id = self.quotes.one()
+                row = (quote_id, client_id, clock.format(moment))
+                if actions:
+                    row = row[:2] + (rng.choice(actions),) + row[2:]
+                rows.append(row)
+            writer.write(rows)
+        self._report(model.__name__, writer.written, started)
+
+    def _create_campaign_events(self, model, fields, total, actions):
+        """Zipf で選んだ Campaign の配信期間内に時刻を散らす"""
+        ranges = {pk: r for pk, r in self.campaign_ranges.items() if r}
+        if total < 1 or not ranges:
+            return
+        started = time.monotonic()
+        rng = self.rng
+        writer = _Writer(model, fields, self.use_copy)
+        for offset in range(0, total, self.chunk_size):
+            n = min(self.chunk_size, total - offset)
+            clients = self.clients.sample(n)
+            rows = []
+            for client_id in clients:
+                campaign_id = self.campaigns.one()
+                while campaign_id not in ranges:
+                    campaign_id = self.campaigns.one()
+                lo, hi = ranges[campaign_id]
+                row = (campaign_id, client_id, self.clock.format(lo + rng.random() * (hi - lo)))
+                if actions:
+                    row = row[:2] + (rng.choice(actions),) + row[2:]
+                rows.append(row)
+            writer.write(rows)
+        self._report(model.__name__, writer.written, started)
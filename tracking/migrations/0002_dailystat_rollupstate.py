@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('completed_through', models.DateField(help_text='この日までの DailyStat は確定済み')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '集計の進捗',
+                'verbose_name_plural': '集計の進捗',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='集計日（TIME_ZONE 基準）')),
+                ('entity_type', models.CharField(choices=[('quote', 'Quote'), ('campaign', 'Campaign')], max_length=20)),
+                ('entity_id', models.BigIntegerField(help_text='Quote / Campaign の ID')),
+                ('action', models.CharField(blank=True, help_text='クリックのアクション（表示行は空）', max_length=20)),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('clicks', models.PositiveIntegerField(default=0)),
+                ('unique_clients', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '日別集計',
+                'verbose_name_plural': '日別集計',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['entity_type', 'entity_id', 'date'], name='tracking_da_entity__37ed5b_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'entity_type', 'entity_id', 'action'), name='tracking_dailystat_unique_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 14:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    Campaign = apps.get_model('tracking', 'Campaign')
+    Favorite = apps.get_model('quotes', 'Favorite')
+
+    counts = (
+        Favorite.objects
+        .filter(campaign_id=OuterRef('pk'))
+        .order_by()
+        .values('campaign_id')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    Campaign.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0002_favorite_campaign_id_alter_favorite_quote_and_more'),
+        ('tracking', '0002_dailystat_rollupstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, help_text='いいね数（Favorite から集計した値を保持）'),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
@@ -13,6 +13,8 @@ class Campaign(models.Model):
     start_date = models.DateField(help_text="配信開始日")
     end_date = models.DateField(help_text="配信終了日")
     
+    like_count = models.PositiveIntegerField(default=0, help_text="いいね数（Favorite から集計した値を保持）")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -113,3 +115,57 @@ class CampaignClick(models.Model):
     
     def __str__(self):
         return f"Campaign#{self.campaign_id} {self.action} at {self.clicked_at}"
+
+
+class DailyStat(models.Model):
+    """
+    日別集計（rollup_tracking_stats コマンドが生ログから作る）
+    表示行は action が空、クリック行は action ごとに 1 行
+    """
+    ENTITY_CHOICES = [
+        ('quote', 'Quote'),
+        ('campaign', 'Campaign'),
+    ]
+    
+    date = models.DateField(help_text="集計日（TIME_ZONE 基準）")
+    entity_type = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    entity_id = models.BigIntegerField(help_text="Quote / Campaign の ID")
+    action = models.CharField(max_length=20, blank=True, help_text="クリックのアクション（表示行は空）")
+    views = models.PositiveIntegerField(default=0)
+    clicks = models.PositiveIntegerField(default=0)
+    unique_clients = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'entity_type', 'entity_id', 'action'],
+                name='tracking_dailystat_unique_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['entity_type', 'entity_id', 'date']),
+        ]
+        verbose_name = "日別集計"
+        verbose_name_plural = "日別集計"
+    
+    def __str__(self):
+        label = f"{self.entity_type}#{self.entity_id}"
+        if self.action:
+            label += f" {self.action}"
+        return f"{self.date} {label}: views={self.views} clicks={self.clicks}"
+
+
+class RollupState(models.Model):
+    """集計の進捗（どの日まで確定済みか）"""
+    name = models.CharField(max_length=50, unique=True)
+    completed_through = models.DateField(help_text="この日までの DailyStat は確定済み")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "集計の進捗"
+        verbose_name_plural = "集計の進捗"
+    
+    def __str__(self):
+        return f"{self.name}: {self.completed_through}"
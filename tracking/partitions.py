@@ -0,0 +1,331 @@
+"""
+トラッキングの生ログテーブルの月別パーティション（PostgreSQL のみ・任意）。
+
+QuoteView / QuoteClick / CampaignView / CampaignClick を、日時列（viewed_at / clicked_at）の
+月ごとの RANGE パーティションに分ける。日付で絞るクエリ（rollup・stats）は該当する月だけを読み、
+古い月は DETACH + DROP で消せる（DELETE しない。集計と書き出しが済んだ月だけ）。
+
+convert() で既存のテーブルをパーティションテーブルに置き換える:
+
+1. （ロックの軽い準備）元のテーブルに (id, 日時列) の UNIQUE INDEX を CONCURRENTLY で作り、
+   「日時列 < 来月 1 日」の CHECK 制約を NOT VALID で付けてから VALIDATE する
+2. （1 トランザクション）元のテーブルを <テーブル>_legacy に改名し、同じ名前でパーティションテーブルを作って
+   legacy を [MINVALUE, 来月 1 日) のパーティションとして ATTACH する。
+   1 の準備があるので、ATTACH で全行を読み直したりインデックスを作り直したりしない
+3. 来月以降の月のパーティションと、どの月にも入らない行の受け皿（DEFAULT パーティション）を作る
+
+注意:
+- パーティションテーブルの主キーは分割キーを含む必要があるので (id, 日時列) になる。
+  Django からは今まで通り id が主キーに見え、id の採番も変わらない
+- 月の区切りは settings.TIME_ZONE の 0 時
+- DEFAULT パーティションに行が入っている月のパーティションは作れない。
+  ensure_partitions() を月に 1 回以上（数か月先まで）実行しておく
+- 置き換えた後のテーブルに対する migration は、パーティションテーブルで使える操作
+  （AddIndex など。CONCURRENTLY は不可）に限る
+"""
+import datetime
+import logging
+import re
+import zoneinfo
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .exports import BY_MODEL, archived_rows
+from .models import CampaignClick, CampaignView, QuoteClick, QuoteView
+from .rollup import completed_through
+
+logger = logging.getLogger(__name__)
+
+# (モデル, 日時フィールド)
+TABLES = [
+    (QuoteView, 'viewed_at'),
+    (QuoteClick, 'clicked_at'),
+    (CampaignView, 'viewed_at'),
+    (CampaignClick, 'clicked_at'),
+]
+
+LEGACY_SUFFIX = '_legacy'
+DEFAULT_SUFFIX = '_default'
+
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+class PartitionError(Exception):
+    pass
+
+
+def _tz():
+    return zoneinfo.ZoneInfo(settings.TIME_ZONE)
+
+
+def month_start(day):
+    """day を含む月の 1 日 0 時（settings.TIME_ZONE）"""
+    return datetime.datetime(day.year, day.month, 1, tzinfo=_tz())
+
+
+def add_months(moment, months):
+    index = moment.year * 12 + moment.month - 1 + months
+    return moment.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, start):
+    return f'{table}_p{start.year:04d}{start.month:02d}'
+
+
+def _q(name):
+    return connection.ops.quote_name(name)
+
+
+def _literal(moment):
+    return f"'{moment.isoformat()}'"
+
+
+def _columns(model, ts_field):
+    return model._meta.db_table, model._meta.get_field(ts_field).column
+
+
+def _check_vendor():
+    if connection.vendor != 'postgresql':
+        raise PartitionError('パーティションは PostgreSQL でのみ使えます。')
+
+
+def is_partitioned(model):
+    _check_vendor()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def partitions(model):
+    """
+    [(パーティション名, 上限)] を上限の古い順に返す。
+    上限は datetime（DEFAULT パーティションは None で末尾）
+    """
+    _check_vendor()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [model._meta.db_table],
+        )
+        rows = cursor.fetchall()
+
+    result = []
+    for name, bound in rows:
+        match = _UPPER_BOUND.search(bound)
+        upper = None
+        if match:
+            value = match.group(1)
+            if re.search(r'[+-]\d\d$', value):
+                value += ':00'
+            upper = datetime.datetime.fromisoformat(value)
+        result.append((name, upper))
+    return sorted(result, key=lambda p: (p[1] is None, p[1] or datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)))
+
+
+def convert(model, ts_field, boundary=None, log=logger.info):
+    """
+    既存のテーブルを月別のパーティションテーブルに置き換える（モジュールの docstring の手順）。
+    boundary（既定: 来月 1 日）より前の行は legacy パーティションに残る
+    """
+    _check_vendor()
+    if is_partitioned(model):
+        raise PartitionError(f'{model._meta.db_table} は既にパーティションテーブルです。')
+    if connection.in_atomic_block:
+        raise PartitionError('CREATE INDEX CONCURRENTLY を使うため、トランザクションの外で実行してください。')
+
+    table, ts_column = _columns(model, ts_field)
+    legacy = table + LEGACY_SUFFIX
+    boundary = boundary or add_months(month_start(datetime.datetime.now(_tz())), 1)
+    unique_index = f'{table}_id_{ts_column}_uniq'
+    check_name = f'{table}_{ts_column}_bound'
+
+    # 1. 準備（書き込みは止めない）
+    with connection.cursor() as cursor:
+        log(f'{table}: (id, {ts_column}) の UNIQUE INDEX を作成')
+        cursor.execute(
+            f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {_q(unique_index)} '
+            f'ON {_q(table)} ({_q("id")}, {_q(ts_column)})'
+        )
+        log(f'{table}: {ts_column} < {boundary.isoformat()} の CHECK 制約を検証')
+        cursor.execute(f'ALTER TABLE {_q(table)} DROP CONSTRAINT IF EXISTS {_q(check_name)}')
+        cursor.execute(
+            f'ALTER TABLE {_q(table)} ADD CONSTRAINT {_q(check_name)} '
+            f'CHECK ({_q(ts_column)} < {_literal(boundary)}) NOT VALID'
+        )
+        cursor.execute(f'ALTER TABLE {_q(table)} VALIDATE CONSTRAINT {_q(check_name)}')
+
+    # 2. 置き換え
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {_q(table)} IN ACCESS EXCLUSIVE MODE')
+
+        cursor.execute(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = %s
+            """,
+            [table],
+        )
+        index_defs = {name: definition for name, definition in cursor.fetchall()}
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid), contype FROM pg_constraint
+            WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'f')
+            """,
+            [table],
+        )
+        constraints = cursor.fetchall()
+        primary_key = next(name for name, _, contype in constraints if contype == 'p')
+        foreign_keys = [(name, definition) for name, definition, contype in constraints if contype == 'f']
+
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT COALESCE(MAX({_q("id")}), 0) FROM {_q(table)}')
+        next_id = cursor.fetchone()[0] + 1
+        if sequence:
+            cursor.execute(f'SELECT last_value FROM {sequence}')
+            next_id = max(next_id, cursor.fetchone()[0] + 1)
+
+        # 元のテーブルを legacy に。インデックス名はスキーマ内で一意なので付け替える
+        cursor.execute(f'ALTER TABLE {_q(table)} RENAME TO {_q(legacy)}')
+        for name in index_defs:
+            if name not in (primary_key, unique_index):
+                cursor.execute(f'ALTER INDEX {_q(name)} RENAME TO {_q(name[:63 - len(LEGACY_SUFFIX)] + LEGACY_SUFFIX)}')
+        cursor.execute(
+            f'ALTER TABLE {_q(legacy)} DROP CONSTRAINT {_q(primary_key)}, '
+            f'ADD CONSTRAINT {_q(legacy + "_pkey")} PRIMARY KEY USING INDEX {_q(unique_index)}'
+        )
+        # パーティションには IDENTITY / 独自の採番を持たせない（採番は親のシーケンスで行う）
+        cursor.execute(f'ALTER TABLE {_q(legacy)} ALTER COLUMN {_q("id")} DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE {_q(legacy)} ALTER COLUMN {_q("id")} DROP DEFAULT')
+        cursor.execute('SELECT to_regclass(%s)', [f'{table}_id_seq'])
+        if cursor.fetchone()[0]:
+            cursor.execute(f'ALTER SEQUENCE {_q(table + "_id_seq")} RENAME TO {_q(legacy + "_id_seq")}')
+
+        # 同じ名前・同じ列のパーティションテーブル
+        log(f'{table}: パーティションテーブルを作成')
+        cursor.execute(
+            f'CREATE TABLE {_q(table)} (LIKE {_q(legacy)} INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMMENTS) '
+            f'PARTITION BY RANGE ({_q(ts_column)})'
+        )
+        cursor.execute(f'CREATE SEQUENCE {_q(table + "_id_seq")} START WITH {int(next_id)} OWNED BY {_q(table)}.{_q("id")}')
+        cursor.execute(
+            f'ALTER TABLE {_q(table)} ALTER COLUMN {_q("id")} '
+            f"SET DEFAULT nextval('{table}_id_seq'::regclass)"
+        )
+        cursor.execute(
+            f'ALTER TABLE {_q(table)} ADD CONSTRAINT {_q(table + "_pkey")} '
+            f'PRIMARY KEY ({_q("id")}, {_q(ts_column)})'
+        )
+        # 外部キーは legacy 側の同じ定義のものがそのまま使われる（検証し直さない）
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {_q(table)} ADD CONSTRAINT {_q(name)} {definition}')
+        # インデックスは元の名前で親に作る。ATTACH で legacy 側の同じ定義のものが子になる
+        for name, definition in index_defs.items():
+            if name not in (primary_key, unique_index):
+                cursor.execute(definition)
+
+        log(f'{table}: {legacy} を〜{boundary.isoformat()} のパーティションとして ATTACH')
+        cursor.execute(
+            f'ALTER TABLE {_q(table)} ATTACH PARTITION {_q(legacy)} '
+            f'FOR VALUES FROM (MINVALUE) TO ({_literal(boundary)})'
+        )
+        cursor.execute(f'ALTER TABLE {_q(legacy)} DROP CONSTRAINT {_q(check_name)}')
+        cursor.execute(
+            f'CREATE TABLE {_q(table + DEFAULT_SUFFIX)} PARTITION OF {_q(table)} DEFAULT'
+        )
+
+
+def ensure_partitions(model, ts_field, months_ahead=3, log=logger.info):
+    """今月から months_ahead か月先までの月のうち、まだどのパーティションにも入らない月のパーティションを作る"""
+    table, _ = _columns(model, ts_field)
+    if not is_partitioned(model):
+        raise PartitionError(f'{table} はパーティションテーブルではありません（先に --convert）。')
+
+    covered_until = max((upper for _, upper in partitions(model) if upper), default=None)
+    start = month_start(datetime.datetime.now(_tz()))
+    created = []
+    for i in range(months_ahead + 1):
+        lower = add_months(start, i)
+        upper = add_months(start, i + 1)
+        if covered_until is not None and upper <= covered_until:
+            continue
+        if covered_until is not None and lower < covered_until:
+            lower = covered_until.astimezone(_tz())
+        name = partition_name(table, lower)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {_q(name)} PARTITION OF {_q(table)} '
+                f'FOR VALUES FROM ({_literal(lower)}) TO ({_literal(upper)})'
+            )
+        log(f'{table}: {name} を作成（{lower.date()} 〜 {upper.date()}）')
+        created.append(name)
+        covered_until = upper
+    return created
+
+
+def _rows_per_day(name, column):
+    """パーティション name の {日付（settings.TIME_ZONE）: 行数}"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT ({_q(column)} AT TIME ZONE %s)::date, count(*) FROM {_q(name)} GROUP BY 1',
+            [settings.TIME_ZONE],
+        )
+        return dict(cursor.fetchall())
+
+
+def drop_partitions_before(model, ts_field, cutoff, archive_dir, dry_run=False, force=False, log=logger.info):
+    """
+    上限が cutoff 以前の（= 中身がすべて cutoff より前の）パーティションを DETACH して DROP する。
+    行を 1 件ずつ消さないので、件数によらずすぐ終わる。
+
+    archive_tracking_events と同じく、日別集計（rollup）が確定していない日を含むものは消さない。
+    また、残っている行の日がすべて archive_dir の manifest に同じ行数以上書き出されていなければ
+    消さない（force なら確かめない）。消せないものがあれば、それより新しいものも消さない
+    """
+    table, column = _columns(model, ts_field)
+    if not is_partitioned(model):
+        raise PartitionError(f'{table} はパーティションテーブルではありません。')
+
+    done = completed_through()
+    if done is None:
+        raise PartitionError('日別集計がまだ確定していません。先に rollup_tracking_stats を実行してください。')
+    archived = None if force else archived_rows(archive_dir)
+    spec_name = BY_MODEL[model].name
+
+    dropped = []
+    for name, upper in partitions(model):
+        if upper is None or upper > cutoff:
+            break
+        label = f'{table}: {name}（〜{upper.isoformat()}）'
+        # 上限は月初の 0 時なので、前日までが集計済みなら中身はすべて集計済み
+        if upper.astimezone(_tz()).date() - datetime.timedelta(days=1) > done:
+            log(f'{label} は集計が確定していない日を含むので残します（確定済み: {done}）')
+            break
+        if archived is not None:
+            missing = sorted(
+                day for day, count in _rows_per_day(name, column).items()
+                if archived.get((spec_name, day), 0) < count
+            )
+            if missing:
+                log(
+                    f'{label} は書き出していない日の行が残っているので残します'
+                    f'（{missing[0]} など {len(missing)} 日。archive_tracking_events で書き出すか --force）'
+                )
+                break
+        log(f'{label} を{"削除予定" if dry_run else "削除"}')
+        if not dry_run:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {_q(table)} DETACH PARTITION {_q(name)}')
+                cursor.execute(f'DROP TABLE {_q(name)}')
+        dropped.append(name)
+    return dropped
@@ -0,0 +1,110 @@
+"""
+生ログ（QuoteView / QuoteClick / CampaignView / CampaignClick）から DailyStat を作る。
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .exports import archived_rows
+from .models import (
+    CampaignClick,
+    CampaignView,
+    DailyStat,
+    QuoteClick,
+    QuoteView,
+    RollupState,
+)
+
+ROLLUP_NAME = 'daily_stats'
+
+# (モデル, 対象の種類, 日時フィールド, クリックか)
+SOURCES = [
+    (QuoteView, 'quote', 'viewed_at', False),
+    (QuoteClick, 'quote', 'clicked_at', True),
+    (CampaignView, 'campaign', 'viewed_at', False),
+    (CampaignClick, 'campaign', 'clicked_at', True),
+]
+
+
+def day_bounds(start_date, end_date=None):
+    """[start_date の 0:00, end_date 翌日の 0:00) を現在のタイムゾーンで返す"""
+    end_date = end_date or start_date
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime.combine(start_date, datetime.time.min, tzinfo=tz)
+    end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+    return start, end
+
+
+def rollup_range(start_date, end_date):
+    """
+    [start_date, end_date] の各日を集計し直し、その期間の DailyStat を置き換える。
+    ログの種類ごとに GROUP BY 1 回。戻り値は作成した DailyStat の件数
+    """
+    start, end = day_bounds(start_date, end_date)
+
+    stats = []
+    for model, target, ts_field, is_click in SOURCES:
+        group_by = ['day', f'{target}_id'] + (['action'] if is_click else [])
+        rows = (
+            model.objects
+            .filter(**{f'{ts_field}__gte': start, f'{ts_field}__lt': end})
+            .annotate(day=TruncDate(ts_field))
+            .values(*group_by)
+            .annotate(n=Count('id'), uniq=Count('client_id', distinct=True))
+            .order_by()
+        )
+        for row in rows:
+            stats.append(DailyStat(
+                date=row['day'],
+                entity_type=target,
+                entity_id=row[f'{target}_id'],
+                action=row['action'] if is_click else '',
+                views=0 if is_click else row['n'],
+                clicks=row['n'] if is_click else 0,
+                unique_clients=row['uniq'],
+            ))
+
+    with transaction.atomic():
+        DailyStat.objects.filter(date__range=(start_date, end_date)).delete()
+        DailyStat.objects.bulk_create(stats, batch_size=1000)
+    return len(stats)
+
+
+def completed_through():
+    """確定済みの最終日（まだ一度も集計していなければ None）"""
+    state = RollupState.objects.filter(name=ROLLUP_NAME).first()
+    return state.completed_through if state else None
+
+
+def mark_completed(through):
+    RollupState.objects.update_or_create(
+        name=ROLLUP_NAME,
+        defaults={'completed_through': through},
+    )
+
+
+def earliest_event_date():
+    """生ログの最も古い日付（ログが無ければ None）"""
+    firsts = []
+    for model, _, ts_field, _ in SOURCES:
+        first = model.objects.order_by(ts_field).values_list(ts_field, flat=True).first()
+        if first:
+            firsts.append(timezone.localdate(first))
+    return min(firsts) if firsts else None
+
+
+def first_rebuildable_date(archive_dir):
+    """
+    生ログから集計し直せる最初の日（ログも書き出しの記録も無ければ None）。
+    archive_tracking_events で書き出した日（archive_dir の manifest にある日）と
+    残っている最も古いログより前の日は、生ログが消えているので集計し直すと DailyStat が失われる
+    """
+    first = earliest_event_date()
+    archived = [day for _, day in archived_rows(archive_dir)]
+    if archived:
+        after_archive = max(archived) + datetime.timedelta(days=1)
+        first = max(first, after_archive) if first else after_archive
+    return first
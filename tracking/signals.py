@@ -0,0 +1,11 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import campaign_index
+from .models import Campaign
+
+
+@receiver([post_save, post_delete], sender=Campaign)
+def rebuild_campaign_index(sender, instance, **kwargs):
+    transaction.on_commit(campaign_index.invalidate)
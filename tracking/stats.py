@@ -0,0 +1,149 @@
+"""
+期間指定の集計（ダッシュボード用）。
+確定済みの日は DailyStat を GROUP BY する 1 クエリ、確定前の日（今日など）は
+ログの種類ごとに TruncDate で GROUP BY する 4 クエリで、期間の長さに関係なく集計する。
+確定済みの日の生ログは archive_tracking_events で削除されていることがあるので数えない。
+"""
+import datetime
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from .models import DailyStat
+from .rollup import SOURCES, completed_through, day_bounds
+
+GRANULARITIES = ('day', 'week', 'month')
+GROUP_BYS = ('quote', 'campaign', 'action')
+
+
+def period_start(day, granularity):
+    """day が属するバケットの開始日（週は月曜始まり）"""
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _periods(start_date, end_date, granularity):
+    periods = []
+    day = start_date
+    while day <= end_date:
+        period = period_start(day, granularity)
+        if not periods or periods[-1] != period:
+            periods.append(period)
+        day += datetime.timedelta(days=1)
+    return periods
+
+
+def _ctr(clicks, views):
+    return round(clicks / views * 100, 2) if views > 0 else 0
+
+
+def _daily_stat_rows(start_date, end_date, group_by):
+    """DailyStat から (日付, 対象の種類, 表示かクリックか, 件数, グループキー) を返す"""
+    key_field = {'quote': 'entity_id', 'campaign': 'entity_id', 'action': 'action'}.get(group_by)
+    rows = (
+        DailyStat.objects
+        .filter(date__range=(start_date, end_date))
+        .values('date', 'entity_type', *([key_field] if key_field else []))
+        .annotate(views=Sum('views'), clicks=Sum('clicks'))
+        .order_by()
+    )
+    for row in rows:
+        target = row['entity_type']
+        for kind in ('views', 'clicks'):
+            if not row[kind]:
+                continue
+            if group_by == target:
+                key = row['entity_id']
+            elif group_by == 'action' and kind == 'clicks':
+                key = row['action']
+            else:
+                key = None
+            yield row['date'], target, kind, row[kind], key
+
+
+def _raw_rows(start_date, end_date, group_by):
+    """生ログから (日付, 対象の種類, 表示かクリックか, 件数, グループキー) を返す"""
+    start, end = day_bounds(start_date, end_date)
+    for model, target, ts_field, is_click in SOURCES:
+        if group_by == target:
+            key_fields = [f'{target}_id']
+        elif group_by == 'action' and is_click:
+            key_fields = ['action']
+        else:
+            key_fields = []
+
+        rows = (
+            model.objects
+            .filter(**{f'{ts_field}__gte': start, f'{ts_field}__lt': end})
+            .annotate(day=TruncDate(ts_field))
+            .values('day', *key_fields)
+            .annotate(n=Count('id'))
+            .order_by()
+        )
+
+        kind = 'clicks' if is_click else 'views'
+        for row in rows:
+            yield row['day'], target, kind, row['n'], row[key_fields[0]] if key_fields else None
+
+
+def range_stats(start_date, end_date, granularity='day', group_by=None):
+    buckets = {
+        period: {
+            'period': period.isoformat(),
+            'quote_views': 0,
+            'quote_clicks': 0,
+            'campaign_views': 0,
+            'campaign_clicks': 0,
+        }
+        for period in _periods(start_date, end_date, granularity)
+    }
+    # (period, グループキー) -> {'views': n, 'clicks': n}
+    groups = {}
+
+    sources = []
+    raw_start = start_date
+    done = completed_through()
+    if done is not None and done >= start_date:
+        sources.append(_daily_stat_rows(start_date, min(end_date, done), group_by))
+        raw_start = done + datetime.timedelta(days=1)
+    if raw_start <= end_date:
+        sources.append(_raw_rows(raw_start, end_date, group_by))
+
+    for rows in sources:
+        for day, target, kind, n, key in rows:
+            period = period_start(day, granularity)
+            buckets[period][f'{target}_{kind}'] += n
+            if key is not None:
+                counts = groups.setdefault(period, {}).setdefault((target, key), {'views': 0, 'clicks': 0})
+                counts[kind] += n
+
+    result = []
+    for period, bucket in buckets.items():
+        bucket['ctr_quote'] = _ctr(bucket['quote_clicks'], bucket['quote_views'])
+        bucket['ctr_campaign'] = _ctr(bucket['campaign_clicks'], bucket['campaign_views'])
+
+        if group_by:
+            items = []
+            for (target, key), counts in sorted(groups.get(period, {}).items()):
+                if group_by == 'action':
+                    items.append({
+                        'target': target,
+                        'action': key,
+                        'clicks': counts['clicks'],
+                        # アクション別の CTR は対象種別全体の表示数に対する割合
+                        'ctr': _ctr(counts['clicks'], bucket[f'{target}_views']),
+                    })
+                else:
+                    items.append({
+                        f'{target}_id': key,
+                        'views': counts['views'],
+                        'clicks': counts['clicks'],
+                        'ctr': _ctr(counts['clicks'], counts['views']),
+                    })
+            bucket['groups'] = items
+
+        result.append(bucket)
+    return result
@@ -1,3 +1,744 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import buffer, campaign_index, partitions
+from .exports import BY_NAME, MANIFEST, stream_csv
+from .models import Campaign, CampaignClick, CampaignView, DailyStat, QuoteClick, QuoteView
+from quotes import cache as payload_cache
+from quotes.models import Favorite, Quote, User
+
+from .rollup import completed_through, mark_completed, rollup_range
+from .stats import range_stats
+
+
+def at(day, hour=12):
+    return datetime.datetime.combine(day, datetime.time(hour), tzinfo=timezone.get_current_timezone())
+
+
+def make_event(model, when, **fields):
+    """日時を指定してログを作る（auto_now_add なので作ってから書き換える）"""
+    event = model.objects.create(**fields)
+    ts_field = 'viewed_at' if hasattr(event, 'viewed_at') else 'clicked_at'
+    model.objects.filter(pk=event.pk).update(**{ts_field: when})
+    return event
+
+
+class TrackingTestCase(TestCase):
+    def setUp(self):
+        self.quote = Quote.objects.create(text='台詞', author_name='作者', publish_date=datetime.date(2025, 1, 1))
+        self.campaign = Campaign.objects.create(
+            name='campaign', client_name='client', text='キャンペーン', url='https://example.com/',
+            start_date=datetime.date(2025, 1, 1), end_date=datetime.date(2025, 1, 7),
+        )
+
+    def view(self, when, client_id='c1'):
+        return make_event(QuoteView, when, quote=self.quote, client_id=client_id)
+
+    def click(self, when, action='wiki', client_id='c1'):
+        return make_event(QuoteClick, when, quote=self.quote, client_id=client_id, action=action)
+
+
+class RollupTests(TrackingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.days = [self.today - datetime.timedelta(days=n) for n in (3, 2, 1)]
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def rollup(self, *args):
+        call_command('rollup_tracking_stats', '--archive-dir', self.archive_dir, *args, stdout=StringIO())
+
+    def stats(self, day):
+        return {
+            (row.entity_type, row.entity_id, row.action): (row.views, row.clicks, row.unique_clients)
+            for row in DailyStat.objects.filter(date=day)
+        }
+
+    def test_rollup_range_groups_by_entity_and_action(self):
+        day = self.days[0]
+        self.view(at(day, 0), 'c1')
+        self.view(at(day, 23), 'c1')
+        self.view(at(day, 12), 'c2')
+        self.click(at(day), 'wiki', 'c1')
+        self.click(at(day), 'wiki', 'c2')
+        self.click(at(day), 'share', 'c1')
+        make_event(CampaignView, at(day), campaign=self.campaign, client_id='c1')
+        make_event(CampaignClick, at(day), campaign=self.campaign, client_id='c1', action='sns')
+        # 前後の日は含めない
+        self.view(at(day - datetime.timedelta(days=1), 23))
+        self.view(at(day + datetime.timedelta(days=1), 0))
+
+        self.assertEqual(rollup_range(day, day), 5)
+        self.assertEqual(self.stats(day), {
+            ('quote', self.quote.pk, ''): (3, 0, 2),
+            ('quote', self.quote.pk, 'wiki'): (0, 2, 2),
+            ('quote', self.quote.pk, 'share'): (0, 1, 1),
+            ('campaign', self.campaign.pk, ''): (1, 0, 1),
+            ('campaign', self.campaign.pk, 'sns'): (0, 1, 1),
+        })
+
+    def test_command_finalizes_past_days_and_reaggregates_today(self):
+        for day in self.days:
+            self.view(at(day))
+        self.view(timezone.now())
+
+        self.rollup()
+        self.assertEqual(completed_through(), self.days[-1])
+        self.assertEqual(self.stats(self.today), {('quote', self.quote.pk, ''): (1, 0, 1)})
+
+        # 2 回目は今日だけ集計し直す
+        self.view(timezone.now(), 'c2')
+        self.view(at(self.days[0]), 'c2')
+        self.rollup()
+        self.assertEqual(self.stats(self.today), {('quote', self.quote.pk, ''): (2, 0, 2)})
+        self.assertEqual(self.stats(self.days[0]), {('quote', self.quote.pk, ''): (1, 0, 1)})
+
+    def test_since_skips_archived_days(self):
+        for day in self.days:
+            self.view(at(day))
+        make_event(CampaignView, at(self.days[0]), campaign=self.campaign, client_id='c1')
+        self.rollup()
+        expected = self.stats(self.days[0])
+
+        # 最初の日の quote_views だけを書き出して削除した（campaign_views は残っている）
+        with open(Path(self.archive_dir) / MANIFEST, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'table': 'quote_views', 'date': self.days[0].isoformat(), 'rows': 1}) + '\n')
+        QuoteView.objects.filter(viewed_at__lt=at(self.days[1], 0)).delete()
+        self.view(at(self.days[1]), 'c2')
+
+        self.rollup('--since', self.days[0].isoformat())
+        self.assertEqual(len(expected), 2)
+        self.assertEqual(self.stats(self.days[0]), expected)
+        self.assertEqual(self.stats(self.days[1]), {('quote', self.quote.pk, ''): (2, 0, 2)})
+
+    def test_since_skips_days_before_earliest_event(self):
+        for day in self.days:
+            self.view(at(day))
+        self.rollup()
+        QuoteView.objects.filter(viewed_at__lt=at(self.days[2], 0)).delete()
+
+        self.rollup('--since', self.days[0].isoformat())
+        for day in self.days:
+            self.assertEqual(self.stats(day), {('quote', self.quote.pk, ''): (1, 0, 1)})
+
+
+class StatsOverviewTests(TrackingTestCase):
+    def overview(self, day):
+        response = APIClient().get('/api/tracking/stats/overview/', {'date': day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_unfinalized_day_counts_raw_events(self):
+        today = timezone.localdate()
+        self.view(timezone.now(), 'c1')
+        self.view(timezone.now(), 'c2')
+        self.click(timezone.now())
+
+        data = self.overview(today)
+        self.assertFalse(data['finalized'])
+        self.assertEqual((data['total_quote_views'], data['total_quote_clicks']), (2, 1))
+        self.assertEqual(data['ctr_quote'], 50.0)
+
+    def test_finalized_day_reads_daily_stats(self):
+        day = datetime.date(2025, 1, 10)
+        self.view(at(day))
+        rollup_range(day, day)
+        mark_completed(day)
+        # 確定後に届いたログは数えない
+        self.view(at(day), 'c2')
+
+        data = self.overview(day)
+        self.assertTrue(data['finalized'])
+        self.assertEqual(data['total_quote_views'], 1)
+        self.assertFalse(self.overview(day + datetime.timedelta(days=1))['finalized'])
+
+
+class DropPartitionsGuardTests(TestCase):
+    """drop_partitions_before が集計・書き出しの済んでいないパーティションを消さないこと（DB の操作は差し替える）"""
+
+    def setUp(self):
+        tz = partitions._tz()
+        self.legacy = ('tracking_quoteview_legacy', datetime.datetime(2025, 2, 1, tzinfo=tz))
+        self.feb = ('tracking_quoteview_p202502', datetime.datetime(2025, 3, 1, tzinfo=tz))
+        self.mar = ('tracking_quoteview_p202503', datetime.datetime(2025, 4, 1, tzinfo=tz))
+        self.rows = {
+            self.legacy[0]: {datetime.date(2025, 1, 30): 3, datetime.date(2025, 1, 31): 2},
+            self.feb[0]: {datetime.date(2025, 2, 10): 5},
+            self.mar[0]: {},
+        }
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.cutoff = datetime.datetime(2025, 4, 1, tzinfo=tz)
+
+        patches = [
+            mock.patch.object(partitions, 'is_partitioned', return_value=True),
+            mock.patch.object(partitions, 'partitions', return_value=[self.legacy, self.feb, self.mar, ('default', None)]),
+            mock.patch.object(partitions, '_rows_per_day', side_effect=lambda name, column: self.rows[name]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def archive(self, day, rows):
+        with open(Path(self.archive_dir) / MANIFEST, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'table': 'quote_views', 'date': day.isoformat(), 'rows': rows}) + '\n')
+
+    def drop(self, **kwargs):
+        return partitions.drop_partitions_before(
+            QuoteView, 'viewed_at', self.cutoff, self.archive_dir, dry_run=True, log=lambda message: None, **kwargs
+        )
+
+    def test_requires_rollup(self):
+        with self.assertRaises(partitions.PartitionError):
+            self.drop(force=True)
+
+    def test_stops_at_days_not_rolled_up(self):
+        mark_completed(datetime.date(2025, 2, 27))
+        self.assertEqual(self.drop(force=True), [self.legacy[0]])
+        mark_completed(datetime.date(2025, 3, 31))
+        self.assertEqual(self.drop(force=True), [self.legacy[0], self.feb[0], self.mar[0]])
+
+    def test_logs_to_module_logger_by_default(self):
+        mark_completed(datetime.date(2025, 2, 27))
+        with self.assertLogs('tracking.partitions', 'INFO') as logs:
+            partitions.drop_partitions_before(
+                QuoteView, 'viewed_at', self.cutoff, self.archive_dir, dry_run=True, force=True
+            )
+        self.assertIn('tracking_quoteview_legacy', logs.output[0])
+        self.assertIn('集計が確定していない日を含む', logs.output[1])
+
+    def test_command_writes_to_stdout(self):
+        mark_completed(datetime.date(2025, 2, 27))
+        out = StringIO()
+        command = 'tracking.management.commands.manage_tracking_partitions'
+        with mock.patch(f'{command}.is_partitioned', return_value=True), \
+                mock.patch(f'{command}.ensure_partitions', return_value=[]):
+            call_command('manage_tracking_partitions', '--drop-before', '2025-04', '--dry-run', '--force', stdout=out)
+        self.assertIn('tracking_quoteview_legacy（〜', out.getvalue())
+
+    def test_requires_archived_rows(self):
+        mark_completed(datetime.date(2025, 3, 31))
+        self.assertEqual(self.drop(), [])
+
+        self.archive(datetime.date(2025, 1, 30), 3)
+        self.archive(datetime.date(2025, 1, 31), 1)
+        self.assertEqual(self.drop(), [])
+
+        # 同じ日を分けて書き出した分は合計する
+        self.archive(datetime.date(2025, 1, 31), 1)
+        self.assertEqual(self.drop(), [self.legacy[0]])
+
+        self.archive(datetime.date(2025, 2, 10), 5)
+        self.assertEqual(self.drop(), [self.legacy[0], self.feb[0], self.mar[0]])
+
+
+class RangeStatsTests(TrackingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.days = [datetime.date(2025, 1, 6), datetime.date(2025, 1, 7), datetime.date(2025, 1, 13)]
+        for n, day in enumerate(self.days):
+            for i in range(n + 2):
+                self.view(at(day), f'c{i}')
+            self.click(at(day), 'wiki')
+            self.click(at(day), 'share', 'c2')
+            make_event(CampaignView, at(day), campaign=self.campaign, client_id='c1')
+            make_event(CampaignClick, at(day), campaign=self.campaign, client_id='c1', action='official')
+
+    def get(self, **params):
+        return APIClient().get('/api/tracking/stats/range/', params)
+
+    def test_finalized_days_match_raw_counts(self):
+        start, end = self.days[0], self.days[-1]
+        raw = {
+            (granularity, group_by): range_stats(start, end, granularity, group_by)
+            for granularity in ('day', 'week', 'month')
+            for group_by in (None, 'quote', 'campaign', 'action')
+        }
+
+        rollup_range(start, end)
+        mark_completed(self.days[1])
+        # 確定済みの日の生ログは書き出して削除されていても DailyStat から数える
+        QuoteView.objects.filter(viewed_at__lt=at(self.days[2], 0)).delete()
+        QuoteClick.objects.filter(clicked_at__lt=at(self.days[2], 0)).delete()
+
+        for (granularity, group_by), expected in raw.items():
+            with self.assertNumQueries(6):
+                self.assertEqual(range_stats(start, end, granularity, group_by), expected, (granularity, group_by))
+
+    def test_endpoint(self):
+        response = self.get(start='2025-01-06', end='2025-01-12', granularity='week', group_by='action')
+        self.assertEqual(response.status_code, 200)
+        [bucket] = response.json()['buckets']
+        self.assertEqual(bucket['period'], '2025-01-06')
+        self.assertEqual((bucket['quote_views'], bucket['quote_clicks']), (5, 4))
+        self.assertEqual(bucket['ctr_quote'], 80.0)
+        self.assertEqual(bucket['groups'], [
+            {'target': 'campaign', 'action': 'official', 'clicks': 2, 'ctr': 100.0},
+            {'target': 'quote', 'action': 'share', 'clicks': 2, 'ctr': 40.0},
+            {'target': 'quote', 'action': 'wiki', 'clicks': 2, 'ctr': 40.0},
+        ])
+
+        response = self.get(start='2025-01-06', end='2025-01-13', group_by='quote')
+        buckets = response.json()['buckets']
+        self.assertEqual(len(buckets), 8)
+        self.assertEqual(buckets[1]['groups'], [{'quote_id': self.quote.pk, 'views': 3, 'clicks': 2, 'ctr': 66.67}])
+        self.assertEqual(buckets[2]['groups'], [])
+
+    def test_invalid_params(self):
+        for params in (
+            {'start': '2025-01-06'},
+            {'start': '2025-01-06', 'end': '2025-01-05'},
+            {'start': '2024-01-01', 'end': '2025-01-01'},
+            {'start': '2025-01-06', 'end': '2025-01-07', 'granularity': 'hour'},
+            {'start': '2025-01-06', 'end': '2025-01-07', 'group_by': 'client'},
+        ):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+
+class EventBufferTests(SimpleTestCase):
+    """EventBuffer の flush のきっかけ（件数・経過時間・atexit）。書き込み自体は差し替える"""
+
+    def setUp(self):
+        self.saved = []
+        self.saved_event = threading.Event()
+
+        def save_events(batch):
+            self.saved.append(len(batch))
+            self.saved_event.set()
+            return len(batch), []
+
+        self.registered = []
+        patches = [
+            mock.patch.object(buffer, 'save_events', side_effect=save_events),
+            mock.patch.object(buffer, 'close_old_connections'),
+            mock.patch.object(buffer.atexit, 'register', side_effect=self.registered.append),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def make_buffer(self, **kwargs):
+        buf = buffer.EventBuffer(**kwargs)
+        self.addCleanup(buf.stop)
+        return buf
+
+    def append(self, buf, n=1):
+        return [buf.append(QuoteView, 'quote', {'quote_id': 1, 'client_id': 'c1'}) for _ in range(n)]
+
+    def test_flushes_when_flush_size_is_reached(self):
+        buf = self.make_buffer(flush_size=3, flush_interval=60)
+        self.append(buf, 2)
+        self.assertFalse(self.saved_event.wait(0.2))
+
+        self.append(buf)
+        self.assertTrue(self.saved_event.wait(5))
+        self.assertEqual(self.saved, [3])
+        self.assertEqual(buf.snapshot()['written'], 3)
+
+    def test_flushes_after_flush_interval(self):
+        buf = self.make_buffer(flush_size=100, flush_interval=0.05)
+        started = time.monotonic()
+        self.append(buf, 2)
+        self.assertTrue(self.saved_event.wait(5))
+        self.assertEqual(self.saved, [2])
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+    def test_atexit_flushes_the_rest(self):
+        buf = self.make_buffer(flush_size=100, flush_interval=60)
+        self.append(buf, 5)
+        self.assertEqual(self.registered, [buf.stop])
+
+        self.registered[0]()
+        self.assertEqual(self.saved, [5])
+        self.assertFalse(buf._thread.is_alive())
+        self.assertEqual(buf.snapshot()['queue_depth'], 0)
+
+    def test_drops_when_full_and_counts_failures(self):
+        buf = self.make_buffer(max_size=2, flush_size=100, flush_interval=60)
+        self.assertEqual(self.append(buf, 3), [True, True, False])
+        buffer.save_events.side_effect = RuntimeError
+        with self.assertLogs('tracking.buffer', 'ERROR'):
+            self.assertEqual(buf.flush(), 0)
+        snapshot = buf.snapshot()
+        self.assertEqual((snapshot['dropped'], snapshot['failed'], snapshot['written']), (1, 2, 0))
+
+
+class BufferStatsTests(TestCase):
+    def test_staff_only(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/tracking/stats/buffer/').status_code, 401)
+        client.force_authenticate(User.objects.create(username='alice'))
+        self.assertEqual(client.get('/api/tracking/stats/buffer/').status_code, 403)
+        client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+        response = client.get('/api/tracking/stats/buffer/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('queue_depth', response.json())
+
+
+def make_campaign(start, end, name='campaign'):
+    return Campaign.objects.create(
+        name=name, client_name='client', text=name, url='https://example.com/', start_date=start, end_date=end,
+    )
+
+
+class CampaignIndexTests(TestCase):
+    def setUp(self):
+        campaign_index.invalidate()
+        self.addCleanup(campaign_index.invalidate)
+
+    def unsaved(self, pk, start, end):
+        return Campaign(pk=pk, name=f'c{pk}', start_date=datetime.date(2025, 1, start), end_date=datetime.date(2025, 1, end))
+
+    def test_interval_lookup(self):
+        # 1: 1〜10 日、2: 3〜4 日（1 の中）、3: 8〜12 日（1 と重なる）、4: 20 日だけ
+        c1, c2, c3, c4 = (self.unsaved(1, 1, 10), self.unsaved(2, 3, 4), self.unsaved(3, 8, 12), self.unsaved(4, 20, 20))
+        index = campaign_index.CampaignIndex([c4, c3, c2, c1])
+
+        def covering(day):
+            return [c.pk for c in index.covering(datetime.date(2025, 1, day))]
+
+        self.assertEqual(covering(1), [1])
+        self.assertEqual(covering(3), [2, 1])
+        self.assertEqual(covering(5), [1])
+        self.assertEqual(covering(9), [3, 1])
+        self.assertEqual(covering(11), [3])
+        self.assertEqual(covering(13), [])
+        self.assertEqual(covering(20), [4])
+        self.assertEqual(covering(31), [])
+        # 重なった日は開始日が新しい方
+        self.assertEqual(index.campaign_for(datetime.date(2025, 1, 4)), c2)
+        self.assertEqual(index.campaign_for(datetime.date(2025, 1, 10)), c3)
+        self.assertIsNone(index.campaign_for(datetime.date(2024, 12, 31)))
+
+        self.assertEqual(index.overlaps, [(c1, c2), (c1, c3)])
+
+    def test_overlaps_are_logged(self):
+        make_campaign(datetime.date(2025, 1, 1), datetime.date(2025, 1, 10), 'a')
+        make_campaign(datetime.date(2025, 1, 10), datetime.date(2025, 1, 12), 'b')
+        with self.assertLogs('tracking.campaign_index', 'WARNING') as logs:
+            campaign_index.get_index()
+        self.assertIn('overlap', logs.output[0])
+
+    def test_version_poll_rebuilds_after_change_elsewhere(self):
+        first = make_campaign(datetime.date(2025, 1, 1), datetime.date(2025, 1, 7))
+        index = campaign_index.get_index()
+        self.assertEqual(index.campaign_for(datetime.date(2025, 1, 3)), first)
+
+        # 他のワーカーでの変更（このプロセスの on_commit による作り直しは走らない）
+        with self.captureOnCommitCallbacks(execute=False):
+            first.end_date = datetime.date(2025, 1, 2)
+            first.save()
+            second = make_campaign(datetime.date(2025, 1, 3), datetime.date(2025, 1, 5), 'second')
+
+        with mock.patch.object(campaign_index, 'VERSION_CHECK_INTERVAL', float('inf')):
+            with self.assertNumQueries(0):
+                self.assertIs(campaign_index.get_index(), index)
+        with mock.patch.object(campaign_index, 'VERSION_CHECK_INTERVAL', 0):
+            rebuilt = campaign_index.get_index()
+            self.assertIsNot(rebuilt, index)
+            self.assertEqual(rebuilt.campaign_for(datetime.date(2025, 1, 3)), second)
+            self.assertEqual(rebuilt.by_id[first.pk].end_date, datetime.date(2025, 1, 2))
+            # 変わっていなければバージョンの確認 1 クエリだけで作り直さない
+            with self.assertNumQueries(1):
+                self.assertIs(campaign_index.get_index(), rebuilt)
+
+    def test_save_in_this_process_rebuilds_on_commit(self):
+        with mock.patch.object(campaign_index, 'VERSION_CHECK_INTERVAL', float('inf')):
+            self.assertEqual(len(campaign_index.get_index()), 0)
+            with self.captureOnCommitCallbacks(execute=True):
+                make_campaign(datetime.date(2025, 1, 1), datetime.date(2025, 1, 7))
+            self.assertEqual(len(campaign_index.get_index()), 1)
+
+    def test_admin_warns_about_overlaps(self):
+        make_campaign(datetime.date(2025, 1, 1), datetime.date(2025, 1, 10), 'existing')
+        self.client.force_login(User.objects.create(username='admin', is_staff=True, is_superuser=True))
+        response = self.client.post('/admin/tracking/campaign/add/', {
+            'name': 'new', 'client_name': 'client', 'text': 'text', 'url': 'https://example.com/',
+            'start_date': '2025-01-05', 'end_date': '2025-01-15', 'like_count': 0,
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('existing', ' '.join(str(m) for m in response.context['messages']))
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret', DEBUG=False)
+class ServerTimingTests(TestCase):
+    def test_only_sent_with_token(self):
+        client = APIClient()
+        self.assertNotIn('Server-Timing', client.get('/api/tracking/campaigns/active/'))
+        self.assertNotIn('Server-Timing', client.get('/api/tracking/campaigns/active/', headers={'X-Metrics-Token': 'wrong'}))
+        response = client.get('/api/tracking/campaigns/active/', headers={'X-Metrics-Token': 'secret'})
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+    def test_not_sent_for_streaming_export(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+        response = client.get(
+            '/api/tracking/export/quote_views/',
+            {'start': '2025-01-01', 'end': '2025-01-31'},
+            headers={'X-Metrics-Token': 'secret'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'id,quote_id,client_id,viewed_at\r\n')
+        self.assertNotIn('Server-Timing', response)
+
+
+class SeedSyntheticDataTests(TestCase):
+    # ログの時刻は「今」までに散らすので、2 回の実行で同じになるよう固定する
+    NOW = datetime.datetime(2025, 3, 1, 3, tzinfo=datetime.timezone.utc)
+
+    def seed(self, seed=1):
+        with mock.patch('django.utils.timezone.now', return_value=self.NOW):
+            call_command(
+                'seed_synthetic_data', '--force', '--seed', str(seed), '--quotes', '20', '--campaigns', '2',
+                '--days', '10', '--clients', '30', '--users', '10', '--favorites', '100',
+                '--quote-views', '300', '--quote-clicks', '50', '--campaign-views', '40', '--campaign-clicks', '10',
+                '--chunk-size', '64', stdout=StringIO(),
+            )
+
+    def snapshot(self):
+        """id によらない形で投入したデータを並べる"""
+        campaigns = dict(Campaign.objects.values_list('pk', 'name'))
+        return {
+            'quotes': list(
+                Quote.objects.order_by('publish_date')
+                .values_list('publish_date', 'text', 'author_name', 'category', 'tags', 'like_count')
+            ),
+            'campaigns': list(Campaign.objects.order_by('name').values_list('name', 'start_date', 'end_date', 'like_count')),
+            'favorites': sorted(
+                (user or '', client_id or '', str(day), campaigns.get(campaign_id, ''), str(created_at))
+                for user, client_id, day, campaign_id, created_at in Favorite.objects.values_list(
+                    'user__username', 'client_id', 'quote__publish_date', 'campaign_id', 'created_at'
+                )
+            ),
+            'quote_views': sorted(QuoteView.objects.values_list('quote__publish_date', 'client_id', 'viewed_at')),
+            'quote_clicks': sorted(
+                QuoteClick.objects.values_list('quote__publish_date', 'client_id', 'action', 'clicked_at')
+            ),
+            'campaign_views': sorted(CampaignView.objects.values_list('campaign__name', 'client_id', 'viewed_at')),
+            'campaign_clicks': sorted(
+                CampaignClick.objects.values_list('campaign__name', 'client_id', 'action', 'clicked_at')
+            ),
+        }
+
+    def clear(self):
+        for model in (Favorite, QuoteView, QuoteClick, CampaignView, CampaignClick, Campaign, Quote, User):
+            model.objects.all().delete()
+
+    def test_same_seed_gives_same_rows(self):
+        self.seed()
+        first = self.snapshot()
+        self.assertEqual(len(first['quotes']), 20)
+        self.assertEqual(len(first['quote_views']), 300)
+
+        self.clear()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+
+        self.clear()
+        self.seed(seed=2)
+        self.assertNotEqual(self.snapshot()['favorites'], first['favorites'])
+
+    def test_invalidates_caches_on_commit(self):
+        with mock.patch.object(payload_cache, 'invalidate_dates') as invalidate_dates, \
+                mock.patch.object(campaign_index, 'invalidate') as invalidate_index, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.seed()
+        self.assertTrue(invalidate_dates.called)
+        self.assertTrue(invalidate_index.called)
+
+
+class ArchiveTests(TrackingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.archive_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.day = datetime.date(2025, 1, 2)
+        self.views = [self.view(at(self.day, hour), f'c{hour}') for hour in (9, 12, 15)]
+        self.clicks = [self.click(at(self.day + datetime.timedelta(days=1)), action) for action in ('wiki', 'amazon')]
+        # 対象の期間より後のログは残る
+        self.later = self.view(at(datetime.date(2025, 1, 10)))
+        mark_completed(datetime.date(2025, 1, 31))
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command(
+            'archive_tracking_events', '--before', '2025-01-05', '--output-dir', str(self.archive_dir),
+            '--delete-batch-size', '2', *args, stdout=out,
+        )
+        return out.getvalue()
+
+    def restore(self, *args):
+        out = StringIO()
+        call_command('restore_tracking_archive', str(self.archive_dir), *args, stdout=out)
+        return out.getvalue()
+
+    def rows(self, model):
+        spec = BY_NAME['quote_views' if model is QuoteView else 'quote_clicks']
+        return list(model.objects.order_by('id').values_list(*spec.fields))
+
+    def manifest(self):
+        with open(self.archive_dir / MANIFEST, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_archive_then_restore_round_trip(self):
+        views, clicks = self.rows(QuoteView), self.rows(QuoteClick)
+
+        self.archive()
+
+        path = self.archive_dir / 'quote_views' / '2025' / '2025-01-02.csv.gz'
+        self.assertTrue(path.exists())
+        self.assertTrue((self.archive_dir / 'quote_clicks' / '2025' / '2025-01-03.csv.gz').exists())
+        self.assertEqual(list(QuoteView.objects.values_list('pk', flat=True)), [self.later.pk])
+        self.assertFalse(QuoteClick.objects.exists())
+
+        entries = {entry['table']: entry for entry in self.manifest()}
+        self.assertEqual(sorted(entries), ['quote_clicks', 'quote_views'])
+        entry = entries['quote_views']
+        self.assertEqual(entry['file'], 'quote_views/2025/2025-01-02.csv.gz')
+        self.assertEqual((entry['date'], entry['rows']), ('2025-01-02', 3))
+        self.assertEqual((entry['min_id'], entry['max_id']), (self.views[0].pk, self.views[-1].pk))
+        self.assertEqual(entry['sha256'], hashlib.sha256(path.read_bytes()).hexdigest())
+
+        self.restore()
+        self.assertEqual(self.rows(QuoteView), views)
+        self.assertEqual(self.rows(QuoteClick), clicks)
+
+        # 2 回目は何も増えない
+        self.assertIn('0 行を追加', self.restore())
+        self.assertEqual(self.rows(QuoteView), views)
+
+        # 戻した id の後から採番される
+        self.assertGreater(self.view(at(self.day)).pk, max(pk for pk, *_ in views))
+
+    def test_mismatched_count_aborts_without_deleting(self):
+        command = 'tracking.management.commands.archive_tracking_events.Command'
+        with mock.patch(f'{command}._count', return_value=0), self.assertRaises(CommandError):
+            self.archive('--table', 'quote_views')
+
+        self.assertEqual(QuoteView.objects.count(), 4)
+        self.assertEqual(list((self.archive_dir / 'quote_views' / '2025').iterdir()), [])
+        self.assertFalse((self.archive_dir / MANIFEST).exists())
+
+    def test_resumes_partially_deleted_file(self):
+        self.archive('--table', 'quote_views', '--no-delete')
+        self.assertEqual(QuoteView.objects.count(), 4)
+        # 2 回目の --no-delete は書き出し済みの日を飛ばす
+        self.assertIn('[SKIP]', self.archive('--table', 'quote_views', '--no-delete'))
+
+        # 削除が 1 行だけで止まり、そのあとで同じ日のログが遅れて届いた
+        QuoteView.objects.filter(pk=self.views[0].pk).delete()
+        late = self.view(at(self.day, 20))
+
+        output = self.archive('--table', 'quote_views')
+
+        self.assertIn('残り 2 行を削除', output)
+        self.assertEqual(list(QuoteView.objects.values_list('pk', flat=True)), [self.later.pk])
+        self.assertEqual(
+            [(entry['file'], entry['rows']) for entry in self.manifest()],
+            [('quote_views/2025/2025-01-02.csv.gz', 3), ('quote_views/2025/2025-01-02.1.csv.gz', 1)],
+        )
+
+        self.restore('--table', 'quote_views')
+        self.assertEqual(
+            sorted(QuoteView.objects.values_list('pk', flat=True)),
+            sorted([view.pk for view in self.views] + [late.pk, self.later.pk]),
+        )
+
+    def test_stops_at_last_rolled_up_day(self):
+        mark_completed(datetime.date(2025, 1, 2))
+        self.archive()
+        self.assertFalse(QuoteView.objects.filter(viewed_at__lt=at(self.day + datetime.timedelta(days=1), 0)).exists())
+        self.assertEqual(QuoteClick.objects.count(), 2)
+
+    def test_restore_filters(self):
+        self.archive()
+        self.restore('--from', '2025-01-03', '--to', '2025-01-03')
+        self.assertEqual(QuoteView.objects.count(), 1)
+        self.assertEqual(QuoteClick.objects.count(), 2)
+
+        # 対象の Quote が消えている行は戻さない
+        QuoteClick.objects.all().delete()
+        Quote.objects.filter(pk=self.quote.pk).delete()
+        self.assertIn('対象が無い 3 行は飛ばしました', self.restore('--table', 'quote_views'))
+
+
+class ExportTests(TrackingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+        self.day = datetime.date(2025, 1, 2)
+        self.other_quote = Quote.objects.create(text='別の台詞', author_name='作者', publish_date=datetime.date(2025, 1, 2))
+        self.click(at(self.day, 9), 'wiki', 'c1')
+        self.click(at(self.day, 10), 'amazon', 'c2')
+        make_event(QuoteClick, at(self.day, 11), quote=self.other_quote, client_id='c1', action='wiki')
+        # 期間外
+        self.click(at(self.day + datetime.timedelta(days=1), 0), 'wiki', 'c1')
+
+    def export(self, table='quote_clicks', **params):
+        return self.client.get(f'/api/tracking/export/{table}/', {'start': '2025-01-02', 'end': '2025-01-02', **params})
+
+    def read(self, response):
+        content = b''.join(response.streaming_content)
+        if response['Content-Type'] == 'application/gzip':
+            content = gzip.decompress(content)
+        return list(csv.reader(StringIO(content.decode('utf-8'))))
+
+    def test_plain_and_gzip_match(self):
+        response = self.export()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="quote_clicks_2025-01-02_2025-01-02.csv"')
+        plain = self.read(response)
+        self.assertEqual(plain[0], ['id', 'quote_id', 'client_id', 'action', 'clicked_at'])
+        self.assertEqual(len(plain), 4)
+        self.assertEqual(plain[1][4], '2025-01-02T00:00:00+00:00')
+
+        response = self.export(gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.csv.gz"'))
+        self.assertEqual(self.read(response), plain)
+
+    def test_filters(self):
+        self.assertEqual(len(self.read(self.export(quote=self.other_quote.pk))), 2)
+        self.assertEqual([row[3] for row in self.read(self.export(action='wiki'))[1:]], ['wiki', 'wiki'])
+        self.assertEqual([row[2] for row in self.read(self.export(client_id='c2'))[1:]], ['c2'])
+        self.assertEqual(len(self.read(self.export(quote=self.quote.pk, action='wiki', client_id='c1'))), 2)
+
+    def test_invalid_params(self):
+        self.assertEqual(self.export(table='nope').status_code, 404)
+        self.assertEqual(self.export(start='').status_code, 400)
+        self.assertEqual(self.export(end='2025-01-01').status_code, 400)
+        self.assertEqual(self.export(quote='x').status_code, 400)
+        self.assertEqual(self.export('quote_views', action='wiki').status_code, 400)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.create(username='alice'))
+        self.assertEqual(self.export().status_code, 403)
+
+    def test_stream_csv_yields_chunks(self):
+        QuoteView.objects.bulk_create([QuoteView(quote=self.quote, client_id=f'c{n}') for n in range(2500)])
+        queryset = QuoteView.objects.all()
+        spec = BY_NAME['quote_views']
+
+        plain = list(stream_csv(spec, queryset, chunk_size=700))
+        self.assertEqual(len(plain), 3)
+        compressed = list(stream_csv(spec, queryset, compress=True, chunk_size=700))
+        self.assertEqual(gzip.decompress(b''.join(compressed)), b''.join(plain))
+        self.assertEqual(b''.join(plain).decode('utf-8').count('\r\n'), 2501)
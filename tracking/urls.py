@@ -7,5 +7,9 @@ urlpatterns = [
     path('campaigns/click/', views.track_campaign_click, name='track_campaign_click'),
     path('quotes/view/', views.track_quote_view, name='track_quote_view'),
     path('quotes/click/', views.track_quote_click, name='track_quote_click'),
+    path('events/batch/', views.track_events_batch, name='track_events_batch'),
     path('stats/overview/', views.stats_overview, name='stats_overview'),
+    path('stats/range/', views.stats_range, name='stats_range'),
+    path('stats/buffer/', views.buffer_stats, name='buffer_stats'),
+    path('export/<str:table>/', views.export_events, name='export_events'),
 ]
@@ -1,10 +1,18 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from datetime import date
-from .models import Campaign, QuoteView, QuoteClick, CampaignView, CampaignClick
+from . import campaign_index
+from .buffer import buffering_enabled, get_buffer
+from .events import EventError, parse_event, record_events
+from .exports import BY_NAME, stream_csv
+from .models import Campaign, QuoteView, QuoteClick, CampaignView, CampaignClick, DailyStat
+from .rollup import completed_through, day_bounds
+from .stats import GRANULARITIES, GROUP_BYS, range_stats
 from .serializers import (
     CampaignSerializer,
     QuoteViewSerializer,
@@ -14,15 +22,40 @@ from .serializers import (
 )
 
 
+# バッチ受付 1 リクエストあたりの最大イベント数
+BATCH_MAX_EVENTS = 500
+
+# 期間集計で指定できる最大日数
+STATS_RANGE_MAX_DAYS = 366
+
+
+def _enqueue_event(raw):
+    """
+    書き込みバッファが有効ならイベントを積んで 202 を返す。
+    無効なら None（呼び出し側で同期的に書き込む）
+    """
+    if not buffering_enabled():
+        return None
+
+    try:
+        model, target, fields = parse_event(raw)
+    except EventError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not get_buffer().append(model, target, fields):
+        return Response(
+            {'error': 'Tracking buffer is full'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return Response({'status': 'accepted'}, status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def active_campaigns(request):
     """今日有効なキャンペーン一覧"""
     today = date.today()
-    campaigns = Campaign.objects.filter(
-        start_date__lte=today,
-        end_date__gte=today
-    )
+    campaigns = campaign_index.active_campaigns(today)
     serializer = CampaignSerializer(campaigns, many=True)
     return Response(serializer.data)
 
@@ -40,6 +73,10 @@ def track_campaign_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    buffered = _enqueue_event({'type': 'campaign_view', 'campaign_id': campaign_id, 'client_id': client_id})
+    if buffered is not None:
+        return buffered
+    
     try:
         campaign = Campaign.objects.get(pk=campaign_id)
         CampaignView.objects.create(
@@ -68,6 +105,12 @@ def track_campaign_click(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    buffered = _enqueue_event({
+        'type': 'campaign_click', 'campaign_id': campaign_id, 'client_id': client_id, 'action': action
+    })
+    if buffered is not None:
+        return buffered
+    
     try:
         campaign = Campaign.objects.get(pk=campaign_id)
         CampaignClick.objects.create(
@@ -98,6 +141,10 @@ def track_quote_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    buffered = _enqueue_event({'type': 'quote_view', 'quote_id': quote_id, 'client_id': client_id})
+    if buffered is not None:
+        return buffered
+    
     try:
         quote = Quote.objects.get(pk=quote_id)
         QuoteView.objects.create(
@@ -134,6 +181,12 @@ def track_quote_click(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    buffered = _enqueue_event({
+        'type': 'quote_click', 'quote_id': quote_id, 'client_id': client_id, 'action': action
+    })
+    if buffered is not None:
+        return buffered
+    
     try:
         quote = Quote.objects.get(pk=quote_id)
         QuoteClick.objects.create(
@@ -149,6 +202,55 @@ def track_quote_click(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def track_events_batch(request):
+    """
+    複数イベントをまとめて記録
+    body: {
+      "client_id": "xxx",  # 各イベントで省略した場合の既定値
+      "events": [
+        {"type": "quote_view", "quote_id": 1},
+        {"type": "quote_click", "quote_id": 1, "action": "wiki"},
+        {"type": "campaign_view", "campaign_id": 2},
+        {"type": "campaign_click", "campaign_id": 2, "action": "sns"}
+      ]
+    }
+    不正なイベントはスキップし、errors に index 付きで返す
+    """
+    events = request.data.get('events')
+    client_id = request.data.get('client_id')
+
+    if not isinstance(events, list) or not events:
+        return Response(
+            {'error': 'events must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if len(events) > BATCH_MAX_EVENTS:
+        return Response(
+            {'error': f'events must contain at most {BATCH_MAX_EVENTS} items'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    created, errors = record_events(events, default_client_id=client_id)
+
+    return Response(
+        {'status': 'ok' if created else 'error', 'created': created, 'errors': errors},
+        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def buffer_stats(request):
+    """書き込みバッファのカウンター（キュー長・flush 時間・破棄件数など。スタッフのみ）"""
+    return Response({
+        'enabled': buffering_enabled(),
+        **get_buffer().snapshot(),
+    })
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def stats_overview(request):
@@ -164,19 +266,32 @@ def stats_overview(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
     else:
-        target = date.today()
-    
-    # その日の開始・終了時刻
-    start = timezone.datetime.combine(target, timezone.datetime.min.time())
-    end = timezone.datetime.combine(target, timezone.datetime.max.time())
+        target = timezone.localdate()
     
-    # Quote stats
-    quote_views = QuoteView.objects.filter(viewed_at__range=(start, end)).count()
-    quote_clicks = QuoteClick.objects.filter(clicked_at__range=(start, end)).count()
+    done = completed_through()
+    finalized = done is not None and target <= done
     
-    # Campaign stats
-    campaign_views = CampaignView.objects.filter(viewed_at__range=(start, end)).count()
-    campaign_clicks = CampaignClick.objects.filter(clicked_at__range=(start, end)).count()
+    if finalized:
+        # 確定済みの日は日別集計（rollup_tracking_stats）から読む
+        totals = {
+            row['entity_type']: row
+            for row in DailyStat.objects.filter(date=target)
+            .values('entity_type')
+            .annotate(views=Sum('views'), clicks=Sum('clicks'))
+            .order_by()
+        }
+        empty = {'views': 0, 'clicks': 0}
+        quote_views = totals.get('quote', empty)['views']
+        quote_clicks = totals.get('quote', empty)['clicks']
+        campaign_views = totals.get('campaign', empty)['views']
+        campaign_clicks = totals.get('campaign', empty)['clicks']
+    else:
+        # 今日など確定前の日は集計を待たずに生ログを数える（1 日分なので日時のインデックスで絞れる）
+        start, end = day_bounds(target)
+        quote_views = QuoteView.objects.filter(viewed_at__gte=start, viewed_at__lt=end).count()
+        quote_clicks = QuoteClick.objects.filter(clicked_at__gte=start, clicked_at__lt=end).count()
+        campaign_views = CampaignView.objects.filter(viewed_at__gte=start, viewed_at__lt=end).count()
+        campaign_clicks = CampaignClick.objects.filter(clicked_at__gte=start, clicked_at__lt=end).count()
     
     # CTR 計算
     ctr_quote = (quote_clicks / quote_views * 100) if quote_views > 0 else 0
@@ -184,6 +299,7 @@ def stats_overview(request):
     
     return Response({
         'date': target.isoformat(),
+        'finalized': finalized,
         'total_quote_views': quote_views,
         'total_quote_clicks': quote_clicks,
         'total_campaign_views': campaign_views,
@@ -191,3 +307,128 @@ def stats_overview(request):
         'ctr_quote': round(ctr_quote, 2),
         'ctr_campaign': round(ctr_campaign, 2),
     })
+
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def stats_range(request):
+    """
+    期間集計
+    GET /api/tracking/stats/range/?start=YYYY-MM-DD&end=YYYY-MM-DD
+        &granularity=day|week|month&group_by=quote|campaign|action
+    """
+    try:
+        start = date.fromisoformat(request.query_params.get('start', ''))
+        end = date.fromisoformat(request.query_params.get('end', ''))
+    except ValueError:
+        return Response(
+            {'error': 'start and end are required. Use YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if end < start:
+        return Response(
+            {'error': 'end must be on or after start'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if (end - start).days + 1 > STATS_RANGE_MAX_DAYS:
+        return Response(
+            {'error': f'range must be at most {STATS_RANGE_MAX_DAYS} days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    granularity = request.query_params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return Response(
+            {'error': f"granularity must be one of {', '.join(GRANULARITIES)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    group_by = request.query_params.get('group_by') or None
+    if group_by is not None and group_by not in GROUP_BYS:
+        return Response(
+            {'error': f"group_by must be one of {', '.join(GROUP_BYS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'group_by': group_by,
+        'buckets': range_stats(start, end, granularity, group_by),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_events(request, table):
+    """
+    生ログの CSV エクスポート（スタッフのみ）
+    GET /api/tracking/export/<quote_views|quote_clicks|campaign_views|campaign_clicks>/
+        ?start=YYYY-MM-DD&end=YYYY-MM-DD&quote=<id>|campaign=<id>&action=...&client_id=...&gzip=1
+    行は少しずつ読んで返すので、期間が長くてもメモリは増えない
+    """
+    spec = BY_NAME.get(table)
+    if spec is None:
+        return Response(
+            {'error': f"table must be one of {', '.join(BY_NAME)}"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        start = date.fromisoformat(request.query_params.get('start', ''))
+        end = date.fromisoformat(request.query_params.get('end', ''))
+    except ValueError:
+        return Response(
+            {'error': 'start and end are required. Use YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if end < start:
+        return Response(
+            {'error': 'end must be on or after start'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    range_start, range_end = day_bounds(start, end)
+    queryset = spec.model.objects.filter(**{
+        f'{spec.ts_field}__gte': range_start,
+        f'{spec.ts_field}__lt': range_end,
+    })
+
+    entity_id = request.query_params.get(spec.target)
+    if entity_id:
+        try:
+            queryset = queryset.filter(**{f'{spec.target}_id': int(entity_id)})
+        except ValueError:
+            return Response(
+                {'error': f'{spec.target} must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    action = request.query_params.get('action')
+    if action:
+        if 'action' not in spec.fields:
+            return Response(
+                {'error': f'action is not available for {spec.name}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = queryset.filter(action=action)
+
+    client_id = request.query_params.get('client_id')
+    if client_id:
+        queryset = queryset.filter(client_id=client_id)
+
+    compress = request.query_params.get('gzip') in ('1', 'true')
+    filename = f'{spec.name}_{start.isoformat()}_{end.isoformat()}.csv'
+    if compress:
+        filename += '.gz'
+    response = StreamingHttpResponse(
+        stream_csv(spec, queryset, compress=compress),
+        content_type='application/gzip' if compress else 'text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response